@@ -0,0 +1,54 @@
+"""Add spatial, B-tree and BRIN indexes to sightings
+
+Revision ID: 2f6c1d9a8e47
+Revises: 64bcc71b9495
+Create Date: 2025-09-20 10:12:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f6c1d9a8e47'
+down_revision: Union[str, Sequence[str], None] = '64bcc71b9495'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The indexes declared in models.Sighting.__table_args__:
+# (name, columns, access method, storage parameters).
+SIGHTINGS_INDEXES = [
+    ('ix_sightings_location', ['location'], 'gist', {}),
+    ('ix_sightings_species_id_sighting_date', ['species_id', 'sighting_date'], 'btree', {}),
+    ('ix_sightings_sighting_date_brin', ['sighting_date'], 'brin', {'pages_per_range': 32}),
+    ('ix_sightings_created_at_brin', ['created_at'], 'brin', {'pages_per_range': 32}),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction, and does not
+    # block writes to sightings while the indexes are built.
+    with op.get_context().autocommit_block():
+        # The spatial index GeoAlchemy2 created implicitly is replaced by the
+        # explicitly named one below.
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS idx_sightings_location')
+        for name, columns, using, options in SIGHTINGS_INDEXES:
+            op.create_index(
+                name, 'sightings', columns,
+                postgresql_using=using,
+                postgresql_with=options,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+    op.execute('ANALYZE sightings')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, _, _, _ in reversed(SIGHTINGS_INDEXES):
+            op.drop_index(name, table_name='sightings', postgresql_concurrently=True, if_exists=True)
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sightings_location ON sightings USING gist (location)')
@@ -0,0 +1,41 @@
+"""Add an indexed image digest column to otoliths
+
+Revision ID: 7c3e5b2a9d14
+Revises: 2f6c1d9a8e47
+Create Date: 2025-09-27 09:41:05.218734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3e5b2a9d14'
+down_revision: Union[str, Sequence[str], None] = '2f6c1d9a8e47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('otoliths', sa.Column('image_digest', sa.String(length=64), nullable=True))
+    # Objects are stored as <folder>/<sha256 hex>.<extension>; take the
+    # digest of the rows recorded before the column existed from their path.
+    op.execute(
+        r"UPDATE otoliths SET image_digest = substring(minio_path from '/([0-9a-f]{64})\.[^/]*$') "
+        "WHERE image_digest IS NULL"
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_otoliths_image_digest', 'otoliths', ['image_digest'],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_otoliths_image_digest', table_name='otoliths', postgresql_concurrently=True, if_exists=True)
+    op.drop_column('otoliths', 'image_digest')
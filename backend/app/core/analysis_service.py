@@ -1,6 +1,122 @@
-import pandas as pd
+import asyncio
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, localcontext
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
 from .. import models
+from ..database import without_statement_timeout
+
+# The environmental variables that are correlated against species presence.
+ENV_VARS = ["sea_surface_temp_c", "salinity_psu", "chlorophyll_mg_m3"]
+
+# How often the background job folds new sightings into the stored statistics,
+# and how often it rebuilds them from scratch (which also picks up updates,
+# deletes and rows from transactions that committed after their created_at
+# fell behind the watermark).
+REFRESH_INTERVAL_SECONDS = float(os.getenv("CORRELATION_REFRESH_SECONDS", "30"))
+FULL_REBUILD_SECONDS = float(os.getenv("CORRELATION_FULL_REBUILD_SECONDS", "3600"))
+# Rows are only folded in once they are this old, to give in-flight
+# transactions time to commit before the watermark moves past them. The
+# refresh reads from the replica when one is configured, so keep this above
+# its replication lag.
+INGEST_LAG_SECONDS = float(os.getenv("CORRELATION_INGEST_LAG_SECONDS", "5"))
+
+def query_species_moments(db: Session, *criteria) -> dict:
+    """
+    Computes, in a single GROUP BY query, the sufficient statistics needed for
+    the correlation analysis: for every species and environmental variable, the
+    number of non-null values, their sum and their sum of squares.
+
+    Returns {species_id: {variable: [count, sum, sum_of_squares]}}. Sums are
+    exact Decimals, as returned by PostgreSQL's numeric aggregates.
+    """
+    columns = [models.Sighting.species_id]
+    for env_var in ENV_VARS:
+        column = getattr(models.Sighting, env_var)
+        columns += [func.count(column), func.sum(column), func.sum(column * column)]
+
+    query = db.query(*columns)
+    if criteria:
+        query = query.filter(*criteria)
+    rows = query.group_by(models.Sighting.species_id).all()
+
+    moments = {}
+    for row in rows:
+        species_moments = {}
+        for i, env_var in enumerate(ENV_VARS):
+            count, total, total_sq = row[1 + 3 * i: 4 + 3 * i]
+            species_moments[env_var] = [count, Decimal(total or 0), Decimal(total_sq or 0)]
+        moments[row[0]] = species_moments
+    return moments
+
+def merge_moments(into: dict, delta: dict) -> dict:
+    """
+    Adds the statistics in `delta` to `into`, in place, and returns `into`.
+    """
+    for species_id, species_delta in delta.items():
+        species_moments = into.setdefault(
+            species_id, {env_var: [0, Decimal(0), Decimal(0)] for env_var in ENV_VARS}
+        )
+        for env_var, (count, total, total_sq) in species_delta.items():
+            species_moments[env_var][0] += count
+            species_moments[env_var][1] += total
+            species_moments[env_var][2] += total_sq
+    return into
+
+def strongest_correlation_from_moments(moments: dict) -> dict:
+    """
+    Finds the strongest point-biserial correlation between a species' presence
+    and an environmental variable using only per-species sufficient statistics.
+
+    For a presence indicator y of species s and a variable x, over the n rows
+    where x is not null:
+        r = (n * sum_s(x) - sum(x) * n_s) / sqrt((n * sum(x^2) - sum(x)^2) * (n * n_s - n_s^2))
+    This is exactly the Pearson coefficient pandas computes on one-hot encoded
+    species columns with pairwise-complete observations.
+    """
+    if not moments:
+        return {"error": "Not enough data to perform analysis."}
+
+    # 1. Totals over all rows (including sightings without a species).
+    totals = {
+        env_var: [sum(m[env_var][i] for m in moments.values()) for i in range(3)]
+        for env_var in ENV_VARS
+    }
+
+    strongest_corr = {"correlation": 0, "variable": None, "species_id": None}
+
+    # 2. Walk species in ascending id order and variables in declared order, the
+    #    same order the one-hot encoded columns were scanned in before, so ties
+    #    resolve identically.
+    with localcontext() as ctx:
+        ctx.prec = 60
+        species_ids = sorted(sid for sid in moments if sid is not None)
+        for species_id in species_ids:
+            for env_var in ENV_VARS:
+                n, sum_x, sum_xx = totals[env_var]
+                n_s, sum_x_s, _ = moments[species_id][env_var]
+
+                # All intermediate products are exact, so there is no
+                # catastrophic cancellation in the variance terms.
+                numerator = n * sum_x_s - sum_x * n_s
+                var_x = n * sum_xx - sum_x * sum_x
+                var_y = n * n_s - n_s * n_s
+                if var_x <= 0 or var_y <= 0:
+                    continue # Undefined correlation (constant column).
+
+                current_corr = float(numerator) / (math.sqrt(float(var_x)) * math.sqrt(float(var_y)))
+                if abs(current_corr) > abs(strongest_corr["correlation"]):
+                    strongest_corr = {
+                        "correlation": current_corr,
+                        "variable": env_var,
+                        "species_id": int(species_id),
+                    }
+
+    return strongest_corr
 
 def find_strongest_correlation(db: Session) -> dict:
     """
@@ -8,49 +124,116 @@ def find_strongest_correlation(db: Session) -> dict:
     environmental variable and the presence of a specific species.
     """
     print("--- Running Correlation Analysis ---")
-    
-    # 2. Query all sightings data from the database.
-    sightings = db.query(models.Sighting).all()
-    if not sightings:
-        return {"error": "Not enough data to perform analysis."}
 
-    # 3. Convert the list of SQLAlchemy objects into a Pandas DataFrame.
-    data = [
-        {
-            "species_id": s.species_id,
-            "sea_surface_temp_c": s.sea_surface_temp_c,
-            "salinity_psu": s.salinity_psu,
-            "chlorophyll_mg_m3": s.chlorophyll_mg_m3,
-        }
-        for s in sightings
-    ]
-    df = pd.DataFrame(data)
+    # 1. Aggregate the sightings into per-species sufficient statistics in SQL.
+    moments = query_species_moments(db)
 
-    # 4. One-hot encode the species_id to analyze each species separately.
-    # This creates a new column for each species (e.g., 'species_1', 'species_2')
-    # with a 1 if that species was present and 0 otherwise.
-    df = pd.get_dummies(df, columns=['species_id'], prefix='species')
+    # 2. Derive every species x variable correlation from those statistics.
+    strongest_corr = strongest_correlation_from_moments(moments)
 
-    # 5. Calculate the correlation matrix.
-    # This computes the Pearson correlation between every column in the DataFrame.
-    corr_matrix = df.corr()
+    print(f"--- Strongest Correlation Found: {strongest_corr} ---")
+    return strongest_corr
 
-    # 6. Find the strongest correlation between an environmental variable and a species.
-    strongest_corr = {"correlation": 0, "variable": None, "species_id": None}
-    
-    env_vars = ["sea_surface_temp_c", "salinity_psu", "chlorophyll_mg_m3"]
-    species_cols = [col for col in df.columns if col.startswith('species_')]
-
-    for s_col in species_cols:
-        for env_var in env_vars:
-            # Get the absolute correlation value
-            current_corr = abs(corr_matrix.loc[s_col, env_var])
-            if current_corr > abs(strongest_corr["correlation"]):
-                strongest_corr = {
-                    "correlation": corr_matrix.loc[s_col, env_var],
-                    "variable": env_var,
-                    "species_id": int(s_col.split('_')[-1]) # Extract the ID (e.g., from 'species_1')
-                }
 
-    print(f"--- Strongest Correlation Found: {strongest_corr} ---")
-    return strongest_corr
\ No newline at end of file
+class CorrelationStatsStore:
+    """
+    Keeps the per-species sufficient statistics in memory and maintains them
+    incrementally: each refresh only aggregates sightings whose `created_at`
+    is newer than the watermark of the previous one. Readers get the
+    precomputed finding in constant time, along with how stale it is.
+    """
+    def __init__(self):
+        self._refresh_lock = threading.Lock()
+        self._moments = {}
+        self._watermark = None
+        self._last_rebuild = None
+        self._last_refresh = None
+        self._finding = None
+        self.refreshes = 0
+        self.rebuilds = 0
+
+    def refresh(self, db: Session, full: bool = False) -> dict:
+        """
+        Folds sightings newer than the watermark into the stored statistics
+        (or rebuilds them from scratch) and recomputes the strongest finding.
+        """
+        with self._refresh_lock:
+            # 1. Use the database clock so the watermark compares consistently
+            #    with the server-side `created_at` defaults.
+            upper = db.query(func.now()).scalar() - timedelta(seconds=INGEST_LAG_SECONDS)
+            full = (
+                full
+                or self._watermark is None
+                or time.monotonic() - self._last_rebuild > FULL_REBUILD_SECONDS
+            )
+
+            # 2. Aggregate only the rows in (watermark, upper]. A full rebuild
+            #    also takes rows without a created_at.
+            if full:
+                criteria = [or_(models.Sighting.created_at <= upper, models.Sighting.created_at.is_(None))]
+            else:
+                criteria = [models.Sighting.created_at > self._watermark, models.Sighting.created_at <= upper]
+            delta = query_species_moments(db, *criteria)
+
+            # 3. Merge into a copy, so readers never see half-applied statistics.
+            base = {} if full else {
+                sid: {env_var: list(values) for env_var, values in m.items()}
+                for sid, m in self._moments.items()
+            }
+            moments = merge_moments(base, delta)
+            finding = strongest_correlation_from_moments(moments)
+
+            self._moments = moments
+            self._finding = (finding, upper)
+            self._watermark = upper
+            self._last_refresh = time.monotonic()
+            self.refreshes += 1
+            if full:
+                self._last_rebuild = self._last_refresh
+                self.rebuilds += 1
+            return finding
+
+    def get(self, db: Session) -> dict:
+        """
+        Returns the strongest correlation from the stored statistics, with
+        `stats_as_of` (the newest data included) and `staleness_seconds`.
+        Refreshes inline only if the background job has never run or has
+        fallen well behind.
+        """
+        if self._finding is None or time.monotonic() - self._last_refresh > 2 * REFRESH_INTERVAL_SECONDS:
+            self.refresh(db)
+
+        finding, as_of = self._finding
+        result = dict(finding)
+        result["stats_as_of"] = as_of.isoformat()
+        result["staleness_seconds"] = round((datetime.now(timezone.utc) - as_of).total_seconds(), 1)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "species": len(self._moments),
+            "watermark": self._watermark.isoformat() if self._watermark else None,
+            "refreshes": self.refreshes,
+            "rebuilds": self.rebuilds,
+        }
+
+# Create a single, global store used by the API and the background job.
+correlation_store = CorrelationStatsStore()
+
+async def refresh_periodically(session_factory, interval: float = REFRESH_INTERVAL_SECONDS):
+    """
+    Background job: refreshes `correlation_store` every `interval` seconds.
+    """
+    def refresh_once():
+        db = without_statement_timeout(session_factory())
+        try:
+            correlation_store.refresh(db)
+        finally:
+            db.close()
+
+    while True:
+        try:
+            await asyncio.to_thread(refresh_once)
+        except Exception as e:
+            print(f"Error refreshing correlation statistics: {e}")
+        await asyncio.sleep(interval)
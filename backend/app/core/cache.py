@@ -0,0 +1,212 @@
+# 1. Import necessary libraries.
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# A sentinel so that `None` can be cached as a real value.
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    A small thread-safe, in-process LRU cache with an optional time-to-live.
+    Hits, misses and evictions are counted so they can be reported on /metrics.
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class SQLiteCache:
+    """
+    A persistent key/value cache backed by a SQLite file, so entries survive
+    restarts and are shared by every worker on the host. Entries expire after
+    `ttl` seconds and the least recently used ones are evicted beyond `maxsize`.
+    Values are stored as text.
+    """
+    def __init__(self, path: str, maxsize: int = 10000, ttl: float = None):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+
+    def get(self, key: str, default=None):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and (row[1] is None or row[1] > now):
+                self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+                self.hits += 1
+                return row[0]
+            if row is not None:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self.misses += 1
+            return default
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, expires_at, now),
+            )
+            self._conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                " SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.maxsize,),
+            )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return {"path": self.path, "size": size, "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+class SingleFlight:
+    """
+    De-duplicates concurrent coroutine calls: while a call for a key is in
+    flight, other callers asking for the same key await it and share its
+    result instead of starting their own.
+    """
+    def __init__(self):
+        self._calls = {}
+        self.shared = 0
+
+    async def do(self, key, fn):
+        """
+        Awaits `fn()` for `key`, or joins the call already in flight for it.
+        """
+        call = self._calls.get(key)
+        if call is not None:
+            self.shared += 1
+            # Shield the shared call so one caller going away doesn't cancel
+            # it for everybody else.
+            return await asyncio.shield(call)
+
+        call = asyncio.ensure_future(fn())
+        self._calls[key] = call
+        call.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(call)
+
+
+class VersionProbe:
+    """
+    A cheap data version of a table, read with `read(db)` and reused for
+    `ttl` seconds. Caches key their entries on it, so writes made by other
+    processes are picked up within `ttl`.
+    """
+    def __init__(self, read, ttl: float):
+        self._read = read
+        self._cached = LRUCache(maxsize=1, ttl=ttl)
+
+    def get(self, db):
+        version = self._cached.get("version")
+        if version is None:
+            version = self._read(db)
+            self._cached.set("version", version)
+        return version
+
+    def clear(self):
+        self._cached.clear()
+
+
+# 2. Invalidation on commit. Callbacks are registered per model and run after
+#    a session commits new, changed or deleted rows of that model.
+_invalidators = {}
+
+
+def invalidate_on_commit(model, callback):
+    """
+    Registers `callback` to run whenever a session commits writes to `model`.
+    """
+    _invalidators.setdefault(model, []).append(callback)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        for model in _invalidators:
+            if isinstance(obj, model):
+                session.info.setdefault("changed_models", set()).add(model)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    for model in session.info.pop("changed_models", ()):
+        for callback in _invalidators[model]:
+            callback()
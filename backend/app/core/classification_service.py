@@ -0,0 +1,312 @@
+# 1. Import necessary libraries.
+import asyncio
+import json
+import mimetypes
+import os
+import tarfile
+import zipfile
+from itertools import islice
+
+from .. import models
+from ..ml import preprocessing
+from ..ml.classifier import otolith_batcher, BATCH_MAX_SIZE
+from . import minio_client, prediction_cache
+from .embedding_index import embedding_index
+from .executors import preprocess_pool, storage_pool
+from .upload_queue import upload_queue
+
+# 2. Batch classification configuration. Images are decoded and classified in
+#    fixed-size chunks, so memory stays bounded however large the upload is.
+BATCH_CLASSIFY_SIZE = int(os.getenv("OTOLITH_BATCH_CLASSIFY_SIZE", str(BATCH_MAX_SIZE)))
+BATCH_MAX_IMAGES = int(os.getenv("OTOLITH_BATCH_MAX_IMAGES", "10000"))
+# Archive members larger than this are reported as errors instead of being
+# read into memory (guards against decompression bombs).
+MAX_IMAGE_BYTES = int(os.getenv("OTOLITH_MAX_IMAGE_BYTES", str(20 * 1024 * 1024)))
+# What happens to images whose prediction is flagged low confidence:
+#   "review" - stored under review/ without a species, for manual checking,
+#   "skip"   - not stored at all,
+#   "store"  - stored under the predicted species like any other image.
+LOW_CONFIDENCE_ACTION = os.getenv("OTOLITH_LOW_CONFIDENCE_ACTION", "review")
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff", ".webp"}
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+class EmbeddingUnavailable(Exception):
+    pass
+
+
+def is_image_name(name: str) -> bool:
+    basename = os.path.basename(name)
+    return not basename.startswith(".") and os.path.splitext(basename)[1].lower() in IMAGE_EXTENSIONS
+
+
+def is_archive_name(name: str) -> bool:
+    return (name or "").lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def guess_content_type(name: str) -> str:
+    return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+
+def iter_archive_images(fileobj, filename: str):
+    """
+    Yields (name, bytes) for every image in a zip or tar archive, one member
+    at a time. Nothing is extracted to disk, and tar archives (compressed or
+    not) are read as a forward-only stream.
+    """
+    try:
+        if filename.lower().endswith(".zip"):
+            with zipfile.ZipFile(fileobj) as archive:
+                for info in archive.infolist():
+                    if info.is_dir() or not is_image_name(info.filename):
+                        continue
+                    if info.file_size > MAX_IMAGE_BYTES:
+                        yield info.filename, ImageTooLarge(f"Image exceeds {MAX_IMAGE_BYTES} bytes.")
+                        continue
+                    yield info.filename, archive.read(info)
+        else:
+            with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+                for member in archive:
+                    if not member.isfile() or not is_image_name(member.name):
+                        continue
+                    if member.size > MAX_IMAGE_BYTES:
+                        yield member.name, ImageTooLarge(f"Image exceeds {MAX_IMAGE_BYTES} bytes.")
+                        continue
+                    yield member.name, archive.extractfile(member).read()
+    finally:
+        fileobj.close()
+
+
+def iter_uploaded_images(uploads):
+    """
+    Yields (name, bytes) for a list of (filename, file object) uploads,
+    closing each file once it has been read, and the unread ones when the
+    generator is closed early.
+    """
+    try:
+        for filename, fileobj in uploads:
+            try:
+                yield filename, fileobj.read()
+            finally:
+                fileobj.close()
+    finally:
+        for _, fileobj in uploads:
+            fileobj.close()
+
+
+async def queue_image_upload(filename: str, data: bytes, content_type: str, prediction: dict,
+                             digest: str, cached: bool = False) -> dict:
+    """
+    Makes sure a classified image is stored under its predicted species and
+    returns its upload id (the image's content hash) and status.
+
+    Objects are content-addressed, so an image that is already queued or
+    stored is not uploaded again; one whose earlier upload failed is.
+    Low-confidence predictions are routed by LOW_CONFIDENCE_ACTION.
+    """
+    review = prediction.get("low_confidence") and LOW_CONFIDENCE_ACTION != "store"
+    if review and LOW_CONFIDENCE_ACTION == "skip":
+        return {"upload_id": None, "upload_status": "skipped"}
+
+    status = upload_queue.status(digest, lookup_db=False)
+    if status is None and cached:
+        # Known image, but not uploaded by this process: check the database.
+        status = await asyncio.to_thread(upload_queue.status, digest)
+    if status is not None and status["status"] != "failed":
+        return {"upload_id": digest, "upload_status": status["status"]}
+
+    file_extension = filename.split('.')[-1]
+    species_name = None if review else prediction["predicted_species"]
+    folder = "review" if review else species_name.replace(' ', '_')
+    object_name = f"{folder}/{digest}.{file_extension}"
+
+    upload = await upload_queue.submit(digest, object_name, data, content_type, species_name)
+    return {"upload_id": digest, "upload_status": upload["status"]}
+
+
+async def classify_image(filename: str, data: bytes, content_type: str) -> dict:
+    """
+    Classifies one uploaded image through the micro-batcher, unless the same
+    bytes were classified before, and queues it for storage.
+    """
+    digest = await asyncio.to_thread(prediction_cache.content_hash, data)
+    prediction = await prediction_cache.get(digest)
+    cached = prediction is not None
+    if not cached:
+        # Concurrent uploads of the same image share a single prediction.
+        prediction = await prediction_cache.single_flight.do(digest, lambda: _predict_and_cache(digest, data))
+
+    upload = await queue_image_upload(filename, data, content_type, prediction, digest, cached)
+    return {**prediction, **upload, "cached": cached}
+
+
+async def _predict_and_cache(digest: str, data: bytes) -> dict:
+    prediction, embedding = await otolith_batcher.submit(data, with_embedding=True)
+    await prediction_cache.put(digest, prediction)
+    await index_embedding(digest, embedding)
+    return prediction
+
+
+async def index_embedding(digest: str, embedding):
+    """
+    Adds an image's embedding to the similarity index, if the backend gave
+    one. Indexing problems are logged, never passed on to the classification.
+    """
+    if embedding is None:
+        return
+    try:
+        await asyncio.to_thread(embedding_index.add, digest, embedding)
+    except Exception as e:
+        print(f"Error indexing the embedding of {digest}: {e}")
+
+
+async def classify_images(images):
+    """
+    Classifies a stream of (name, bytes) images and yields one NDJSON line per
+    image as soon as its chunk is done:
+      - the next chunk is read (and decompressed) off the event loop,
+      - images classified before are answered from the prediction cache,
+      - the others are decoded in parallel on the preprocessing pool,
+      - the decodable ones go through the model with the micro-batcher, so
+        they share its forward passes with single uploads,
+      - each classified image is queued for storage in MinIO.
+    Images that cannot be decoded get an `error` line instead of failing the batch.
+    """
+    images = iter(images)
+    seen = 0
+    try:
+        while True:
+            # 1. Read the next chunk, never more than the configured limit.
+            take = min(BATCH_CLASSIFY_SIZE, BATCH_MAX_IMAGES - seen)
+            chunk = await asyncio.to_thread(lambda: list(islice(images, take))) if take > 0 else []
+            if not chunk:
+                if take <= 0 and await asyncio.to_thread(next, images, None) is not None:
+                    yield _dumps({"error": f"Batch limit of {BATCH_MAX_IMAGES} images reached; remaining images were skipped."})
+                break
+            seen += len(chunk)
+
+            # 2. Serve images classified before from the prediction cache.
+            digests = await asyncio.to_thread(
+                lambda: [None if isinstance(data, Exception) else prediction_cache.content_hash(data) for _, data in chunk]
+            )
+            predictions = {}
+            for i, digest in enumerate(digests):
+                if digest is not None:
+                    prediction = await prediction_cache.get(digest)
+                    if prediction is not None:
+                        predictions[i] = prediction
+            cached = set(predictions)
+            misses = [i for i in range(len(chunk)) if i not in cached]
+
+            # 3. Decode the other images concurrently.
+            outcomes = await asyncio.gather(
+                *(_decode(chunk[i][1]) for i in misses),
+                return_exceptions=True
+            )
+            decoded = [j for j, outcome in enumerate(outcomes) if not isinstance(outcome, Exception)]
+            errors = {misses[j]: outcome for j, outcome in enumerate(outcomes) if isinstance(outcome, Exception)}
+
+            # 4. Classify the decodable ones through the micro-batcher.
+            if decoded:
+                classified = await otolith_batcher.submit_many([outcomes[j] for j in decoded])
+                for j, (prediction, embedding) in zip(decoded, classified):
+                    predictions[misses[j]] = prediction
+                    await prediction_cache.put(digests[misses[j]], prediction)
+                    await index_embedding(digests[misses[j]], embedding)
+
+            # 5. Queue the uploads and report each image in input order.
+            for i, (name, data) in enumerate(chunk):
+                if i in errors:
+                    yield _dumps({"filename": name, "error": f"Could not decode image: {errors[i]}"})
+                    continue
+                upload = await queue_image_upload(
+                    name, data, guess_content_type(name), predictions[i], digests[i], i in cached
+                )
+                yield _dumps({"filename": name, **predictions[i], **upload, "cached": i in cached})
+    finally:
+        close = getattr(images, "close", None)
+        if close is not None:
+            await asyncio.to_thread(close)
+
+
+async def _decode(data):
+    # Oversized archive members arrive as an exception instead of bytes.
+    if isinstance(data, Exception):
+        raise data
+    return await preprocess_pool.run(preprocessing.decode_and_resize, data)
+
+
+def otolith_digest(otolith) -> str:
+    # Objects are stored as <folder>/<content hash>.<extension>; rows
+    # recorded before image_digest existed only have the path.
+    return otolith.image_digest or os.path.splitext(os.path.basename(otolith.minio_path))[0]
+
+
+async def otolith_embedding(otolith: models.Otolith):
+    """
+    Returns the embedding of a stored otolith image. Images stored before
+    they could be indexed are read back from MinIO, embedded and indexed.
+    """
+    digest = otolith_digest(otolith)
+    embedding = await asyncio.to_thread(embedding_index.get, digest)
+    if embedding is not None:
+        return embedding
+
+    try:
+        data = await storage_pool.run(minio_client.read_object, otolith.minio_path)
+    except Exception as e:
+        raise EmbeddingUnavailable(f"Could not read the stored image: {e}")
+    # Through the micro-batcher, like uploads, so the model runs one batch at a time.
+    _, embedding = await otolith_batcher.submit(data, with_embedding=True)
+    if embedding is None:
+        raise EmbeddingUnavailable("The serving model backend does not provide image embeddings.")
+    await index_embedding(digest, embedding)
+    return embedding
+
+
+def _otoliths_by_digest(db, digests: list) -> dict:
+    if not digests:
+        return {}
+    # One lookup on the indexed image_digest column for all neighbours.
+    rows = (
+        db.query(models.Otolith.id, models.Otolith.minio_path, models.Otolith.image_digest,
+                 models.Species.scientific_name)
+        .outerjoin(models.Species, models.Otolith.species_id == models.Species.id)
+        .filter(models.Otolith.image_digest.in_(digests))
+        .all()
+    )
+    return {row.image_digest: row for row in rows}
+
+
+async def find_similar_otoliths(db, otolith: models.Otolith, k: int) -> list:
+    """
+    Returns the `k` stored otoliths whose images are most similar to this
+    one (cosine similarity of their embeddings), most similar first.
+    """
+    embedding = await otolith_embedding(otolith)
+    # Over-fetch: indexed images that were skipped or not stored yet have no row.
+    neighbours = await asyncio.to_thread(
+        embedding_index.search, embedding, 2 * k, {otolith_digest(otolith)}
+    )
+    rows = await asyncio.to_thread(_otoliths_by_digest, db, [digest for digest, _ in neighbours])
+
+    results = []
+    for digest, similarity in neighbours:
+        row = rows.get(digest)
+        if row is not None:
+            results.append({
+                "otolith_id": row.id,
+                "minio_path": row.minio_path,
+                "species": row.scientific_name,
+                "similarity": round(similarity, 4),
+            })
+    return results[:k]
+
+
+def _dumps(record: dict) -> str:
+    return json.dumps(record) + "\n"
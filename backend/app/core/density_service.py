@@ -0,0 +1,124 @@
+# 1. Import necessary libraries.
+import os
+
+from sqlalchemy import Float, cast, func, select, text
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from .cache import LRUCache, VersionProbe, invalidate_on_commit
+from .sightings_service import apply_sighting_filters
+
+# 2. Cache configuration. Tiles and grids are cached per process; the TTL
+#    bounds how long another worker's inserts can go unnoticed if the
+#    version probe below is also stale.
+TILE_CACHE_SIZE = int(os.getenv("TILE_CACHE_SIZE", "2048"))
+TILE_CACHE_TTL_SECONDS = float(os.getenv("TILE_CACHE_TTL_SECONDS", "600"))
+VERSION_PROBE_SECONDS = float(os.getenv("TILE_VERSION_PROBE_SECONDS", "1"))
+
+# Vector tiles use the standard 4096 extent; points are aggregated onto a
+# 256 x 256 grid per tile, so a tile never holds more than 65,536 features.
+MVT_EXTENT = 4096
+MVT_GRID_CELLS = 256
+MVT_LAYER_NAME = "sightings_density"
+WEB_MERCATOR_WIDTH = 40075016.685578488
+
+
+def _read_sightings_version(db: Session) -> int:
+    return db.query(func.max(models.Sighting.id)).scalar() or 0
+
+
+tile_cache = LRUCache(maxsize=TILE_CACHE_SIZE, ttl=TILE_CACHE_TTL_SECONDS)
+_version_probe = VersionProbe(_read_sightings_version, ttl=VERSION_PROBE_SECONDS)
+
+
+def invalidate():
+    """
+    Drops every cached tile and grid. Called whenever sightings are written.
+    """
+    tile_cache.clear()
+    _version_probe.clear()
+
+
+def sightings_version(db: Session) -> int:
+    """
+    Returns a cheap data version for the sightings table (its highest id, read
+    from the primary key index). It is part of every cache key, so inserts
+    made by other worker processes also invalidate this process's tiles.
+    """
+    return _version_probe.get(db)
+
+
+# 3. Invalidate in-process caches as soon as a session commits new, changed
+#    or deleted sightings.
+invalidate_on_commit(models.Sighting, invalidate)
+
+
+def _filters_key(filters: schemas.SightingFilters) -> tuple:
+    return (filters.bbox, filters.species_id, filters.start_date, filters.end_date)
+
+
+def _aggregates():
+    return (
+        func.count().label("count"),
+        cast(func.avg(models.Sighting.sea_surface_temp_c), Float).label("mean_sea_surface_temp_c"),
+        cast(func.avg(models.Sighting.salinity_psu), Float).label("mean_salinity_psu"),
+        cast(func.avg(models.Sighting.chlorophyll_mg_m3), Float).label("mean_chlorophyll_mg_m3"),
+    )
+
+
+def get_density_grid(db: Session, filters: schemas.SightingFilters, cell_size: float) -> list:
+    """
+    Aggregates sightings onto a regular lon/lat grid with ST_SnapToGrid and
+    returns one entry per non-empty cell with its count and mean SST,
+    salinity and chlorophyll.
+    """
+    key = ("grid", cell_size, _filters_key(filters), sightings_version(db))
+    cells = tile_cache.get(key)
+    if cells is not None:
+        return cells
+
+    snapped = func.ST_SnapToGrid(models.Sighting.location, cell_size)
+    query = select(
+        func.ST_X(snapped).label("longitude"),
+        func.ST_Y(snapped).label("latitude"),
+        *_aggregates(),
+    )
+    query = apply_sighting_filters(query, filters).group_by(text("1"), text("2"))
+
+    cells = [dict(row._mapping) for row in db.execute(query)]
+    tile_cache.set(key, cells)
+    return cells
+
+
+def get_density_tile(db: Session, z: int, x: int, y: int, filters: schemas.SightingFilters) -> bytes:
+    """
+    Builds a Mapbox vector tile for z/x/y in which each feature is a grid cell
+    of aggregated sightings, rendered by ST_AsMVT.
+    """
+    key = ("mvt", z, x, y, _filters_key(filters), sightings_version(db))
+    tile = tile_cache.get(key)
+    if tile is not None:
+        return tile
+
+    # 4. Aggregate in Web Mercator onto a grid fixed to the tile's resolution,
+    #    using only the points inside the tile envelope (an index-backed && test).
+    envelope = func.ST_TileEnvelope(z, x, y)
+    cell_size = WEB_MERCATOR_WIDTH / (2 ** z) / MVT_GRID_CELLS
+    snapped = func.ST_SnapToGrid(func.ST_Transform(models.Sighting.location, 3857), cell_size)
+    cells = select(snapped.label("geom"), *_aggregates()).where(
+        models.Sighting.location.op("&&")(func.ST_Transform(envelope, 4326))
+    )
+    cells = apply_sighting_filters(cells, filters).group_by(text("1")).subquery("cells")
+
+    features = select(
+        func.ST_AsMVTGeom(cells.c.geom, envelope, MVT_EXTENT, 64, True).label("geom"),
+        cells.c.count,
+        cells.c.mean_sea_surface_temp_c,
+        cells.c.mean_salinity_psu,
+        cells.c.mean_chlorophyll_mg_m3,
+    ).subquery("features")
+
+    query = select(func.ST_AsMVT(features.table_valued(), MVT_LAYER_NAME, MVT_EXTENT, "geom"))
+    tile = bytes(db.execute(query).scalar() or b"")
+    tile_cache.set(key, tile)
+    return tile
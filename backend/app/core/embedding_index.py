@@ -0,0 +1,240 @@
+# 1. Import necessary libraries.
+import fcntl
+import json
+import os
+import threading
+
+import numpy as np
+
+from ..ml import backends
+
+# 2. Embedding index configuration. Image embeddings are kept in a float16
+#    matrix keyed by the image's content hash, in memory by default. Setting
+#    EMBEDDING_INDEX_PATH memory-maps the matrix from disk instead, so the
+#    index survives restarts without being rebuilt and is shared by every
+#    worker on the host. Embeddings from different models are not
+#    comparable, so a stored index built by another model is reset.
+EMBEDDING_INDEX_PATH = os.getenv("EMBEDDING_INDEX_PATH")
+# Rows reserved when the matrix file is created; it doubles when full.
+EMBEDDING_INDEX_INITIAL_ROWS = int(os.getenv("EMBEDDING_INDEX_INITIAL_ROWS", "1024"))
+# Rows converted to float32 at a time while searching, to bound memory.
+SEARCH_CHUNK_ROWS = 65536
+
+
+class EmbeddingIndex:
+    """
+    An append-only, exact k-nearest-neighbour index over L2-normalised
+    embeddings (cosine similarity).
+
+    Without a path the index lives in memory. Otherwise three files make up
+    the index: `<path>.f16` holds the float16 vectors, `<path>.keys` one key
+    per line (line i names row i) and `<path>.json` the dimension and the
+    fingerprint of the model that produced the vectors. A row is written
+    before its key, and other processes pick up new keys on their next search.
+    """
+    def __init__(self, path: str = None, initial_rows: int = EMBEDDING_INDEX_INITIAL_ROWS,
+                 fingerprint: str = None):
+        self.path = path or None
+        self.fingerprint = fingerprint
+        self.initial_rows = max(1, initial_rows)
+        self._lock = threading.RLock()
+        self._keys = []
+        self._rows = {}
+        self._keys_offset = 0
+        self._matrix = None
+        self.dim = None
+        self.searches = 0
+        if self.path is not None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._reset_if_stale()
+            self._load_dim()
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            self._refresh()
+            return key in self._rows
+
+    def _read_header(self) -> dict:
+        try:
+            with open(f"{self.path}.json") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_header(self):
+        with open(f"{self.path}.json", "w") as f:
+            json.dump({"dim": self.dim, "fingerprint": self.fingerprint}, f)
+
+    def _load_dim(self):
+        self.dim = self._read_header().get("dim")
+
+    def _reset_if_stale(self):
+        # Empties a stored index whose vectors came from another model.
+        with open(f"{self.path}.keys", "ab") as keys:
+            fcntl.flock(keys, fcntl.LOCK_EX)
+            try:
+                header = self._read_header()
+                stale = header.get("fingerprint") != self.fingerprint if header else keys.tell() > 0
+                if not stale:
+                    return
+                print(f"--- Resetting embedding index {self.path}: built by "
+                      f"{header.get('fingerprint')}, serving {self.fingerprint} ---")
+                keys.truncate(0)
+                for suffix in (".f16", ".json"):
+                    if os.path.exists(f"{self.path}{suffix}"):
+                        os.remove(f"{self.path}{suffix}")
+            finally:
+                fcntl.flock(keys, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        # Read the keys appended (by any process) since the last refresh.
+        if self.path is None:
+            return
+        try:
+            with open(f"{self.path}.keys", "rb") as f:
+                f.seek(self._keys_offset)
+                appended = f.read()
+        except FileNotFoundError:
+            return
+        # Ignore a trailing key that is still being written.
+        appended = appended[:appended.rfind(b"\n") + 1]
+        for key in appended.decode().splitlines():
+            self._rows[key] = len(self._keys)
+            self._keys.append(key)
+        self._keys_offset += len(appended)
+        if self.dim is None and self._keys:
+            self._load_dim()  # Created by another process.
+
+    def _grow(self, rows: int):
+        # Grows the in-memory matrix so it holds at least `rows` vectors.
+        capacity = len(self._matrix) if self._matrix is not None else 0
+        if capacity < rows:
+            capacity = max(self.initial_rows, capacity)
+            while capacity < rows:
+                capacity *= 2
+            matrix = np.zeros((capacity, self.dim), dtype=np.float16)
+            if self._matrix is not None:
+                matrix[:len(self._matrix)] = self._matrix
+            self._matrix = matrix
+        return self._matrix
+
+    def _map(self, rows: int):
+        # (Re)maps the matrix file so it holds at least `rows` vectors.
+        if self.path is None:
+            return self._grow(rows)
+        path = f"{self.path}.f16"
+        row_bytes = self.dim * 2
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < rows * row_bytes:
+            capacity = max(self.initial_rows, size // row_bytes)
+            while capacity < rows:
+                capacity *= 2
+            with open(path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+            size = capacity * row_bytes
+        if self._matrix is None or len(self._matrix) * row_bytes != size:
+            self._matrix = np.memmap(path, dtype=np.float16, mode="r+", shape=(size // row_bytes, self.dim))
+        return self._matrix
+
+    def add(self, key: str, vector: np.ndarray) -> bool:
+        """
+        Adds one embedding under `key`. Returns False if the key is already
+        indexed. Raises ValueError if the dimension does not match the index.
+        """
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        with self._lock:
+            if self.path is None:
+                return self._append(key, vector)
+            with open(f"{self.path}.keys", "ab") as keys:
+                # Serialise writers across processes; the row number is the key's line.
+                fcntl.flock(keys, fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    return self._append(key, vector, keys)
+                finally:
+                    fcntl.flock(keys, fcntl.LOCK_UN)
+
+    def _append(self, key: str, vector: np.ndarray, keys=None) -> bool:
+        if key in self._rows:
+            return False
+        if self.dim is None:
+            self.dim = len(vector)
+            if keys is not None:
+                self._write_header()
+        if len(vector) != self.dim:
+            raise ValueError(f"Embedding has {len(vector)} dimensions; the index holds {self.dim}.")
+
+        row = len(self._keys)
+        matrix = self._map(row + 1)
+        matrix[row] = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        if keys is not None:
+            matrix.flush()
+            line = f"{key}\n".encode()
+            keys.write(line)
+            keys.flush()
+            self._keys_offset += len(line)
+        self._rows[key] = row
+        self._keys.append(key)
+        return True
+
+    def get(self, key: str):
+        """
+        Returns the stored (normalised) embedding of `key` as float32, or None.
+        """
+        with self._lock:
+            self._refresh()
+            row = self._rows.get(key)
+            if row is None:
+                return None
+            return np.array(self._map(row + 1)[row], dtype=np.float32)
+
+    def search(self, vector: np.ndarray, k: int = 10, exclude: set = ()) -> list:
+        """
+        Returns up to `k` (key, cosine similarity) pairs, most similar first.
+        """
+        with self._lock:
+            self._refresh()
+            count = len(self._keys)
+            if count == 0 or k <= 0:
+                return []
+            matrix = self._map(count)
+            keys = list(self._keys)
+            # Rows are looked up now: after the lock, adds and resets can move them.
+            excluded = [self._rows[key] for key in exclude if key in self._rows]
+            self.searches += 1
+
+        query = np.asarray(vector, dtype=np.float32).ravel()
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        # One matrix-vector product per chunk of rows.
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SEARCH_CHUNK_ROWS):
+            stop = min(start + SEARCH_CHUNK_ROWS, count)
+            scores[start:stop] = matrix[start:stop].astype(np.float32) @ query
+        scores[excluded] = -np.inf
+
+        take = min(k + len(exclude), count)
+        candidates = np.argpartition(-scores, take - 1)[:take]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        return [(keys[i], float(scores[i])) for i in candidates if np.isfinite(scores[i])][:k]
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refresh()
+            return {
+                "path": self.path,
+                "size": len(self._keys),
+                "dim": self.dim,
+                "capacity": len(self._matrix) if self._matrix is not None else 0,
+                "searches": self.searches,
+            }
+
+
+# Create a single, global index for the API, tied to the serving model.
+embedding_index = EmbeddingIndex(EMBEDDING_INDEX_PATH, fingerprint=backends.model_fingerprint())
@@ -0,0 +1,133 @@
+# 1. Import necessary libraries.
+import asyncio
+import functools
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+# 2. Pool sizes are configurable through environment variables. Inference is
+#    CPU-bound (TensorFlow already uses several cores per call), so it gets a
+#    small pool; image decoding releases the GIL in PIL and scales with cores;
+#    storage calls are network-bound and can run more in parallel.
+INFERENCE_POOL_SIZE = int(os.getenv("INFERENCE_POOL_SIZE", "2"))
+PREPROCESS_POOL_SIZE = int(os.getenv("PREPROCESS_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+STORAGE_POOL_SIZE = int(os.getenv("STORAGE_POOL_SIZE", "8"))
+# Image decoding can also run in worker processes ("process"), which avoids
+# the GIL entirely at the cost of pickling image bytes to the workers.
+PREPROCESS_POOL_KIND = os.getenv("PREPROCESS_POOL_KIND", "thread")
+
+
+class InstrumentedPool(Executor):
+    """
+    A bounded thread pool that records how long work waits for a thread and
+    how long it runs once it has one. It is a regular `Executor`, so it can be
+    passed straight to `loop.run_in_executor`.
+
+    With kind="process" the work runs in worker processes instead; callables
+    must then be picklable. The parent cannot see when a worker picks a call
+    up, so only the total time per call (from submission) is recorded, and
+    the active/queued split and wait times are reported as unavailable (None).
+    """
+    def __init__(self, name: str, max_workers: int, kind: str = "thread"):
+        self.name = name
+        self.max_workers = max_workers
+        self.kind = kind
+        if kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-pool")
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def _wrap(self, fn, submitted_at: float):
+        def run(*args, **kwargs):
+            started_at = time.perf_counter()
+            waited = started_at - submitted_at
+            with self._lock:
+                self.active += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self.active -= 1
+                    self.total_run += time.perf_counter() - started_at
+                    if ok:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+        return run
+
+    def _record_process_call(self, submitted_at: float):
+        def done(future):
+            with self._lock:
+                self.total_run += time.perf_counter() - submitted_at
+                if future.exception() is None:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+        return done
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            self.submitted += 1
+        if self.kind == "process":
+            future = self._executor.submit(fn, *args, **kwargs)
+            future.add_done_callback(self._record_process_call(time.perf_counter()))
+            return future
+        return self._executor.submit(self._wrap(fn, time.perf_counter()), *args, **kwargs)
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Runs a blocking callable on this pool and awaits its result.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self, functools.partial(fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        with self._lock:
+            finished = self.completed + self.failed
+            stats = {
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "in_flight": self.submitted - finished,
+                "active": self.active,
+                "queued": self.submitted - finished - self.active,
+                "completed": self.completed,
+                "failed": self.failed,
+                "mean_wait_ms": round(1000 * self.total_wait / finished, 3) if finished else 0.0,
+                "max_wait_ms": round(1000 * self.max_wait, 3),
+                "mean_run_ms": round(1000 * self.total_run / finished, 3) if finished else 0.0,
+            }
+        if self.kind == "process":
+            stats.update(active=None, queued=None, mean_wait_ms=None, max_wait_ms=None)
+        return stats
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+# 3. Create the global pools. Keeping them separate means a burst of
+#    classification work can never starve MinIO uploads, and neither of them
+#    can starve the threads FastAPI uses for plain database routes.
+inference_pool = InstrumentedPool("inference", INFERENCE_POOL_SIZE)
+preprocess_pool = InstrumentedPool("preprocess", PREPROCESS_POOL_SIZE, kind=PREPROCESS_POOL_KIND)
+storage_pool = InstrumentedPool("storage", STORAGE_POOL_SIZE)
+
+
+def pool_stats() -> dict:
+    """
+    Returns the metrics of every dedicated pool, keyed by pool name.
+    """
+    return {pool.name: pool.stats() for pool in (inference_pool, preprocess_pool, storage_pool)}
@@ -0,0 +1,271 @@
+# 1. Import necessary libraries. pyarrow is only imported when an export runs.
+import io
+import os
+import threading
+from typing import Iterator
+
+import numpy as np
+from sqlalchemy import Float, cast, func, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..database import without_statement_timeout
+from .sightings_service import apply_sighting_filters
+
+# 2. Export configuration. PostgreSQL streams the rows as CSV through COPY and
+#    pyarrow parses that stream straight into columnar record batches, so no
+#    Python object is created per row. Each block of CSV becomes one record
+#    batch (one Parquet row group).
+EXPORT_BLOCK_BYTES = int(os.getenv("SIGHTINGS_EXPORT_BLOCK_BYTES", str(4 * 1024 * 1024)))
+PARQUET_COMPRESSION = os.getenv("SIGHTINGS_EXPORT_PARQUET_COMPRESSION", "zstd")
+
+EXPORT_FORMATS = {
+    "arrow": ("application/vnd.apache.arrow.stream", "sightings.arrows"),
+    "parquet": ("application/vnd.apache.parquet", "sightings.parquet"),
+}
+# The columns COPY writes, in order.
+COPY_COLUMNS = [
+    "sighting_id", "species_id", "latitude", "longitude", "sighting_date",
+    "sea_surface_temp_c", "salinity_psu", "chlorophyll_mg_m3",
+]
+
+
+class ExportUnavailable(Exception):
+    pass
+
+
+def require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.csv
+        import pyarrow.parquet
+    except ImportError:
+        raise ExportUnavailable("Columnar exports need the 'pyarrow' package.")
+    return pyarrow
+
+
+def export_schema(pa):
+    """
+    The exported table: plain numeric columns, with the species names
+    dictionary-encoded (each name is stored once, rows hold an index).
+    """
+    return pa.schema([
+        ("sighting_id", pa.int64()),
+        ("species_id", pa.int32()),
+        ("scientific_name", pa.dictionary(pa.int32(), pa.string())),
+        ("common_name", pa.dictionary(pa.int32(), pa.string())),
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        ("sighting_date", pa.date32()),
+        ("sea_surface_temp_c", pa.float64()),
+        ("salinity_psu", pa.float64()),
+        ("chlorophyll_mg_m3", pa.float64()),
+    ])
+
+
+def build_export_query(filters: schemas.SightingFilters):
+    """
+    Selects the flat sighting columns, filtered and ordered by id. Only
+    sightings with a species are exported, as on /api/sightings.
+    """
+    query = (
+        select(
+            models.Sighting.id,
+            models.Sighting.species_id,
+            func.ST_Y(models.Sighting.location),
+            func.ST_X(models.Sighting.location),
+            models.Sighting.sighting_date,
+            cast(models.Sighting.sea_surface_temp_c, Float),
+            cast(models.Sighting.salinity_psu, Float),
+            cast(models.Sighting.chlorophyll_mg_m3, Float),
+        )
+        .where(models.Sighting.species_id.is_not(None))
+        .order_by(models.Sighting.id)
+    )
+    return apply_sighting_filters(query, filters)
+
+
+def copy_statement(query) -> str:
+    # The filter values are validated numbers and dates, so they can be inlined.
+    sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    return f"COPY ({sql}) TO STDOUT WITH (FORMAT csv)"
+
+
+class _ChunkSink(io.RawIOBase):
+    """
+    A write-only file that collects what pyarrow writes until it is drained.
+    """
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+def _dictionary_lookup(pa, species_rows: list, column: int, size: int) -> tuple:
+    """
+    Returns (lookup, dictionary): the distinct names in `column` of the
+    species rows, and the index of each species id's name (-1 if none).
+    """
+    names = list(dict.fromkeys(row[column] for row in species_rows if row[column] is not None))
+    positions = {name: i for i, name in enumerate(names)}
+    lookup = np.full(size, -1, dtype=np.int32)
+    for row in species_rows:
+        if row[column] is not None:
+            lookup[row[0]] = positions[row[column]]
+    return lookup, pa.array(names, type=pa.string())
+
+
+def write_export(source, species_rows: list, file_format: str) -> Iterator[bytes]:
+    """
+    Converts a CSV stream of COPY_COLUMNS into an Arrow IPC stream or a
+    Parquet file, yielding the encoded bytes batch by batch. `species_rows`
+    are the (id, scientific_name, common_name) rows of the species table.
+    """
+    pa = require_pyarrow()
+    schema = export_schema(pa)
+
+    # 3. One dictionary per name column for the whole export, with a
+    #    species id -> dictionary index lookup table for each.
+    size = max((row[0] for row in species_rows), default=0) + 1
+    scientific_names = _dictionary_lookup(pa, species_rows, 1, size)
+    common_names = _dictionary_lookup(pa, species_rows, 2, size)
+
+    def encode(ids, lookup, dictionary):
+        # Ids without a name (or unknown ids) become nulls.
+        indices = np.where(ids < size, lookup[np.minimum(ids, size - 1)], -1)
+        indices = pa.array(indices, type=pa.int32(), mask=indices < 0)
+        return pa.DictionaryArray.from_arrays(indices, dictionary)
+
+    def to_export_batch(batch):
+        ids = batch.column(1).to_numpy(zero_copy_only=False)
+        return pa.RecordBatch.from_arrays([
+            batch.column(0),
+            batch.column(1),
+            encode(ids, *scientific_names),
+            encode(ids, *common_names),
+            *(batch.column(i) for i in range(2, len(COPY_COLUMNS))),
+        ], schema=schema)
+
+    sink = _ChunkSink()
+    if file_format == "parquet":
+        writer = pa.parquet.ParquetWriter(sink, schema, compression=PARQUET_COMPRESSION)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    try:
+        # 4. pyarrow parses the CSV with the column types fixed up front.
+        if source.peek(1):
+            reader = pa.csv.open_csv(
+                source,
+                read_options=pa.csv.ReadOptions(column_names=COPY_COLUMNS, block_size=EXPORT_BLOCK_BYTES),
+                convert_options=pa.csv.ConvertOptions(
+                    column_types={name: schema.field(name).type for name in COPY_COLUMNS}
+                ),
+            )
+            for batch in reader:
+                writer.write_batch(to_export_batch(batch))
+                data = sink.drain()
+                if data:
+                    yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def _copy_out(db: Session, statement: str, write_fd: int, errors: list):
+    try:
+        with open(write_fd, "wb") as out:
+            cursor = db.connection().connection.cursor()
+            try:
+                cursor.copy_expert(statement, out)
+            finally:
+                cursor.close()
+    except Exception as e:
+        errors.append(e)
+
+
+def _checked(chunks: Iterator[bytes], copier: threading.Thread, errors: list) -> Iterator[bytes]:
+    """
+    Passes the chunks on one step behind, so the last one (which completes
+    the file: the IPC end-of-stream marker or the Parquet footer) is only
+    sent once COPY has finished without error. A COPY that fails part-way
+    looks like a short CSV to pyarrow, which would otherwise finish a valid
+    but truncated file.
+    """
+    previous = None
+    for chunk in chunks:
+        if previous is not None:
+            yield previous
+        previous = chunk
+    copier.join()
+    if errors:
+        raise errors[0]
+    if previous is not None:
+        yield previous
+
+
+def start_export(db: Session, query, file_format: str) -> Iterator[bytes]:
+    """
+    Starts streaming the sightings selected by `query` as Arrow IPC or
+    Parquet and returns the stream. COPY runs in a helper thread and writes
+    into a pipe that pyarrow reads from.
+
+    The species lookup, the COPY and the first record batches run before
+    this returns, so the common failures are raised here, before a response
+    has started. A later failure raises from the stream without completing
+    the file, so the server aborts the response.
+    """
+    source = copier = None
+    try:
+        without_statement_timeout(db)
+        species_rows = db.execute(
+            select(models.Species.id, models.Species.scientific_name, models.Species.common_name)
+            .order_by(models.Species.id)
+        ).all()
+
+        read_fd, write_fd = os.pipe()
+        source = open(read_fd, "rb")
+        errors = []
+        copier = threading.Thread(
+            target=_copy_out, args=(db, copy_statement(query), write_fd, errors), daemon=True
+        )
+        copier.start()
+        chunks = _checked(write_export(source, species_rows, file_format), copier, errors)
+        first = next(chunks, None)
+    except BaseException:
+        _finish_export(db, source, copier)
+        raise
+
+    stream = _export_stream(db, source, copier, first, chunks)
+    # Start the generator, so that closing it (also when it is garbage
+    # collected without ever being iterated) always runs its cleanup.
+    next(stream)
+    return stream
+
+
+def _export_stream(db: Session, source, copier, first, chunks) -> Iterator[bytes]:
+    try:
+        yield None
+        if first is not None:
+            yield first
+        yield from chunks
+    finally:
+        _finish_export(db, source, copier)
+
+
+def _finish_export(db: Session, source, copier):
+    # Closing the read end (also when the client goes away) stops COPY.
+    if source is not None:
+        source.close()
+    if copier is not None:
+        copier.join()
+    db.close()
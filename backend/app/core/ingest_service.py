@@ -0,0 +1,243 @@
+# 1. Import necessary libraries.
+import csv
+import io
+import itertools
+import math
+import os
+import time
+from datetime import date, datetime
+from typing import Iterator
+
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import without_statement_timeout
+from . import density_service
+
+# 2. Bulk ingestion configuration. Rows are validated and loaded in chunks,
+#    each committed on its own, so a bad chunk never undoes the others and
+#    memory stays bounded however large the file is.
+INGEST_CHUNK_SIZE = int(os.getenv("SIGHTINGS_INGEST_CHUNK_SIZE", "20000"))
+# Invalid rows reported per chunk (all of them are counted).
+INGEST_MAX_ERRORS_PER_CHUNK = int(os.getenv("SIGHTINGS_INGEST_MAX_ERRORS_PER_CHUNK", "20"))
+
+# Measurements are NUMERIC(5, 2) and NUMERIC(7, 4) columns: their absolute
+# values must stay below 1000.
+MEASUREMENTS = ["sea_surface_temp_c", "salinity_psu", "chlorophyll_mg_m3"]
+MEASUREMENT_LIMIT = 1000.0
+STAGING_COLUMNS = ["species_id", "longitude", "latitude", "sighting_date", *MEASUREMENTS]
+
+# 3. Rows are COPYed into a per-connection staging table, then moved into
+#    `sightings` with one set-based INSERT ... SELECT that builds the points.
+CREATE_STAGING_TABLE = """
+CREATE TEMPORARY TABLE IF NOT EXISTS sightings_staging (
+    species_id integer NOT NULL,
+    longitude double precision NOT NULL,
+    latitude double precision NOT NULL,
+    sighting_date date NOT NULL,
+    sea_surface_temp_c numeric(5, 2),
+    salinity_psu numeric(5, 2),
+    chlorophyll_mg_m3 numeric(7, 4)
+) ON COMMIT DELETE ROWS
+"""
+COPY_INTO_STAGING = f"COPY sightings_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+INSERT_FROM_STAGING = f"""
+INSERT INTO sightings (species_id, location, sighting_date, {', '.join(MEASUREMENTS)})
+SELECT species_id, ST_SetSRID(ST_MakePoint(longitude, latitude), 4326), sighting_date, {', '.join(MEASUREMENTS)}
+FROM sightings_staging
+"""
+
+
+class IngestError(Exception):
+    pass
+
+
+def detect_format(filename: str) -> str:
+    name = (filename or "").lower()
+    if name.endswith((".parquet", ".pq")):
+        return "parquet"
+    if name.endswith((".csv", ".txt")):
+        return "csv"
+    raise IngestError("Unknown file type; upload a .csv or .parquet file.")
+
+
+def iter_csv_chunks(fileobj, chunk_size: int = INGEST_CHUNK_SIZE) -> Iterator[list]:
+    """
+    Yields lists of row dicts from a CSV file with a header row, reading it
+    as a stream.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline=""))
+    while True:
+        chunk = list(itertools.islice(reader, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_parquet_chunks(fileobj, chunk_size: int = INGEST_CHUNK_SIZE) -> Iterator[list]:
+    """
+    Yields lists of row dicts from a Parquet file, one record batch at a
+    time. The file is opened (and its footer checked) straight away.
+    """
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise IngestError("Parquet uploads need the 'pyarrow' package.")
+    try:
+        parquet_file = pq.ParquetFile(fileobj)
+    except Exception as e:
+        raise IngestError(f"Not a valid Parquet file: {e}")
+    return (batch.to_pylist() for batch in parquet_file.iter_batches(batch_size=chunk_size))
+
+
+def iter_chunks(fileobj, file_format: str, chunk_size: int = INGEST_CHUNK_SIZE) -> Iterator[list]:
+    """
+    Reads a CSV or Parquet file as a stream of row-dict chunks.
+    Raises IngestError for unusable files.
+    """
+    if file_format == "parquet":
+        return iter_parquet_chunks(fileobj, chunk_size)
+    return iter_csv_chunks(fileobj, chunk_size)
+
+
+def _number(value, name: str, required: bool = False):
+    if value is None or value == "":
+        if required:
+            raise ValueError(f"{name} is required")
+        return None
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"{name} must be a finite number")
+    return number
+
+
+def validate_row(row: dict, species_ids: set, species_by_name: dict) -> tuple:
+    """
+    Checks one input row and returns it as a tuple of STAGING_COLUMNS, or
+    raises ValueError. The species is given by `species_id` or by
+    `scientific_name`.
+    """
+    species_id = row.get("species_id")
+    if species_id not in (None, ""):
+        species_id = int(species_id)
+        if species_id not in species_ids:
+            raise ValueError(f"unknown species_id {species_id}")
+    else:
+        name = (row.get("scientific_name") or "").strip()
+        if not name:
+            raise ValueError("species_id or scientific_name is required")
+        if name not in species_by_name:
+            raise ValueError(f"unknown species '{name}'")
+        species_id = species_by_name[name]
+
+    latitude = _number(row.get("latitude"), "latitude", required=True)
+    longitude = _number(row.get("longitude"), "longitude", required=True)
+    if not (-90.0 <= latitude <= 90.0 and -180.0 <= longitude <= 180.0):
+        raise ValueError("latitude/longitude out of range")
+
+    sighting_date = row.get("sighting_date")
+    if sighting_date in (None, ""):
+        raise ValueError("sighting_date is required")
+    if isinstance(sighting_date, datetime):
+        sighting_date = sighting_date.date()
+    elif not isinstance(sighting_date, date):
+        sighting_date = date.fromisoformat(str(sighting_date).strip())
+
+    measurements = [_number(row.get(name), name) for name in MEASUREMENTS]
+    if any(value is not None and abs(value) >= MEASUREMENT_LIMIT for value in measurements):
+        raise ValueError(f"measurements must be below {MEASUREMENT_LIMIT:g} in absolute value")
+    return (species_id, longitude, latitude, sighting_date.isoformat(), *measurements)
+
+
+def copy_rows(db: Session, rows: list) -> int:
+    """
+    Loads validated rows into `sightings` through the staging table and
+    returns the number inserted. The caller commits.
+    """
+    buffer = io.StringIO()
+    # Empty unquoted fields are read back as NULL by COPY.
+    csv.writer(buffer, lineterminator="\n").writerows(
+        ["" if value is None else value for value in row] for row in rows
+    )
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.execute(CREATE_STAGING_TABLE)
+        cursor.copy_expert(COPY_INTO_STAGING, buffer)
+        cursor.execute(INSERT_FROM_STAGING)
+        return cursor.rowcount
+    finally:
+        cursor.close()
+
+
+def ingest_sightings(db: Session, chunks) -> dict:
+    """
+    Validates and loads sightings chunk by chunk and reports, per chunk, how
+    many rows were inserted and rejected (with the first errors), plus the
+    overall throughput in rows per second.
+    """
+    started = time.perf_counter()
+    without_statement_timeout(db)
+    species = db.query(models.Species.id, models.Species.scientific_name).all()
+    species_ids = {row.id for row in species}
+    species_by_name = {row.scientific_name: row.id for row in species}
+
+    report = {"rows_received": 0, "rows_inserted": 0, "rows_rejected": 0, "chunks": [], "error": None}
+    chunks = iter(chunks)
+    offset = 0
+    for number in itertools.count():
+        chunk_started = time.perf_counter()
+        try:
+            chunk = next(chunks, None)
+        except Exception as e:
+            # An unreadable file stops the ingestion; chunks already loaded stay.
+            report["error"] = f"Could not read the file after row {offset}: {e}"
+            break
+        if chunk is None:
+            break
+        valid, errors, rejected = [], [], 0
+        # Row numbers count data rows from 1, in input order.
+        for i, row in enumerate(chunk, start=offset + 1):
+            try:
+                valid.append(validate_row(row, species_ids, species_by_name))
+            except (TypeError, ValueError) as e:
+                rejected += 1
+                if len(errors) < INGEST_MAX_ERRORS_PER_CHUNK:
+                    errors.append({"row": i, "error": str(e)})
+        offset += len(chunk)
+
+        inserted, chunk_error = 0, None
+        if valid:
+            try:
+                inserted = copy_rows(db, valid)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                chunk_error = str(e).strip()
+                rejected = len(chunk)
+
+        seconds = time.perf_counter() - chunk_started
+        report["chunks"].append({
+            "chunk": number,
+            "rows": len(chunk),
+            "inserted": inserted,
+            "rejected": rejected,
+            "errors": errors,
+            "error": chunk_error,
+            "seconds": round(seconds, 3),
+        })
+        report["rows_received"] += len(chunk)
+        report["rows_inserted"] += inserted
+        report["rows_rejected"] += rejected
+
+    # 4. COPY bypasses the ORM events that normally invalidate cached tiles,
+    #    so drop them here. The correlation statistics pick the new rows up
+    #    by their created_at on the next background refresh.
+    if report["rows_inserted"]:
+        density_service.invalidate()
+
+    seconds = time.perf_counter() - started
+    report["seconds"] = round(seconds, 3)
+    report["rows_per_second"] = round(report["rows_inserted"] / seconds, 1) if seconds > 0 else 0.0
+    return report
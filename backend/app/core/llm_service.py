@@ -1,21 +1,210 @@
 # 1. Import necessary libraries.
 import os
-import requests
+import asyncio
+import httpx
 import json
+import hashlib
+import random
+import time
+
+from .cache import LRUCache, SQLiteCache, SingleFlight
 
 # 2. Load the API key and configure the API endpoint.
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_API_URL = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:generateContent?key={GEMINI_API_KEY}"
 
-def generate_hypothesis_from_finding(correlation_finding: dict) -> str:
+# Bump this whenever the prompt below changes, so cached hypotheses written
+# for the old prompt are no longer served.
+PROMPT_VERSION = "1"
+
+# Hypothesis cache configuration. Setting HYPOTHESIS_CACHE_PATH adds a SQLite
+# tier that survives restarts and is shared by the workers on a host.
+HYPOTHESIS_CACHE_SIZE = int(os.getenv("HYPOTHESIS_CACHE_SIZE", "1024"))
+HYPOTHESIS_CACHE_TTL_SECONDS = float(os.getenv("HYPOTHESIS_CACHE_TTL_SECONDS", "86400"))
+HYPOTHESIS_CACHE_PATH = os.getenv("HYPOTHESIS_CACHE_PATH")
+
+hypothesis_cache = LRUCache(maxsize=HYPOTHESIS_CACHE_SIZE, ttl=HYPOTHESIS_CACHE_TTL_SECONDS)
+persistent_hypothesis_cache = (
+    SQLiteCache(HYPOTHESIS_CACHE_PATH, maxsize=HYPOTHESIS_CACHE_SIZE * 10, ttl=HYPOTHESIS_CACHE_TTL_SECONDS)
+    if HYPOTHESIS_CACHE_PATH else None
+)
+_single_flight = SingleFlight()
+upstream_calls = 0
+
+# HTTP client configuration. One keep-alive connection pool is shared by all
+# requests; every call is bounded by connect/read deadlines and retried with
+# jittered exponential backoff on 429/5xx and transport errors.
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+LLM_READ_TIMEOUT_SECONDS = float(os.getenv("LLM_READ_TIMEOUT_SECONDS", "30"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "10"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "8"))
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class CircuitBreaker:
+    """
+    Stops calling the upstream after `failure_threshold` consecutive failed
+    calls. After `reset_seconds` a single trial call is let through; if it
+    succeeds the circuit closes again, otherwise it re-opens.
+    """
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                self.rejected += 1
+                return False
+            self.state = "half_open"
+            return True
+        if self.state == "half_open":
+            # Only one trial call at a time while half-open.
+            self.rejected += 1
+            return False
+        return True
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+
+    def record_neutral(self):
+        """
+        For outcomes that say nothing about the upstream's health (a 4xx): no
+        failure is counted, but a half-open circuit does not close either. It
+        goes back to open, and the next call is another trial.
+        """
+        if self.state == "half_open":
+            self.state = "open"
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures, "rejected": self.rejected}
+
+circuit_breaker = CircuitBreaker(LLM_CIRCUIT_FAILURE_THRESHOLD, LLM_CIRCUIT_RESET_SECONDS)
+
+_client = None
+_client_loop = None
+_concurrency = None
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Returns the shared keep-alive client, creating it on first use. The client
+    and its concurrency limit belong to the running event loop, so they are
+    rebuilt if the loop changes.
+    """
+    global _client, _client_loop, _concurrency
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+            ),
+            headers={"Content-Type": "application/json"},
+        )
+        _client_loop = loop
+        _concurrency = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _client
+
+async def close_client():
+    """
+    Closes the shared client. Called when the application shuts down.
+    """
+    global _client, _client_loop
+    if _client is not None:
+        await _client.aclose()
+    _client, _client_loop = None, None
+
+def _backoff_delay(attempt: int, response: httpx.Response = None) -> float:
+    # Full jitter: a random delay up to the exponential cap, but never less
+    # than what the server asked for in Retry-After.
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        delay = max(delay, min(float(retry_after), LLM_BACKOFF_MAX_SECONDS))
+    return delay
+
+def hypothesis_cache_key(correlation_finding: dict) -> str:
+    """
+    Builds a content-addressed cache key from the parts of a finding that
+    actually change the prompt: species, variable, the correlation rounded to
+    the two decimals shown to the model, and the prompt version.
+    """
+    normalised = [
+        correlation_finding.get("species_id"),
+        correlation_finding.get("species_name"),
+        correlation_finding.get("variable"),
+        round(float(correlation_finding.get("correlation") or 0), 2),
+        PROMPT_VERSION,
+    ]
+    return hashlib.sha256(json.dumps(normalised).encode()).hexdigest()
+
+async def _cached_hypothesis(key: str):
+    hypothesis = hypothesis_cache.get(key)
+    if hypothesis is None and persistent_hypothesis_cache is not None:
+        hypothesis = await asyncio.to_thread(persistent_hypothesis_cache.get, key)
+        if hypothesis is not None:
+            hypothesis_cache.set(key, hypothesis)
+    return hypothesis
+
+def cache_stats() -> dict:
+    return {
+        "memory": hypothesis_cache.stats(),
+        "persistent": persistent_hypothesis_cache.stats() if persistent_hypothesis_cache else None,
+        "deduplicated": _single_flight.shared,
+        "upstream_calls": upstream_calls,
+        "circuit": circuit_breaker.stats(),
+    }
+
+async def generate_hypothesis_from_finding(correlation_finding: dict) -> str:
     """
     Takes a statistical finding and uses the Gemini LLM to generate a
-    human-readable scientific hypothesis.
+    human-readable scientific hypothesis. Hypotheses are cached per finding,
+    and concurrent requests for the same finding share one upstream call.
     """
     # 3. Check if we have a valid finding to work with.
     if not correlation_finding or correlation_finding.get("error"):
         return "No significant correlations were found in the current dataset."
 
+    key = hypothesis_cache_key(correlation_finding)
+    hypothesis = await _cached_hypothesis(key)
+    if hypothesis is not None:
+        return hypothesis
+
+    async def generate():
+        generated = await _request_hypothesis(correlation_finding)
+        if generated is not None:
+            hypothesis_cache.set(key, generated)
+            if persistent_hypothesis_cache is not None:
+                await asyncio.to_thread(persistent_hypothesis_cache.set, key, generated)
+        return generated
+
+    hypothesis = await _single_flight.do(key, generate)
+    if hypothesis is None:
+        return "Failed to generate hypothesis due to an API error."
+    return hypothesis
+
+async def _request_hypothesis(correlation_finding: dict):
+    """
+    Calls the Gemini API for a finding. Returns the hypothesis text, or None
+    if the call failed or the circuit is open (failures are never cached).
+    """
     # 4. This is our Prompt Engineering step. We create a detailed, structured prompt.
     prompt = f"""
     You are a marine biology research assistant. Your task is to translate a raw statistical finding into a concise, insightful scientific hypothesis.
@@ -44,18 +233,69 @@ def generate_hypothesis_from_finding(correlation_finding: dict) -> str:
         }]
     }
 
-    headers = {"Content-Type": "application/json"}
+    # 6. Fail fast while the upstream is known to be unhealthy.
+    if not circuit_breaker.allow():
+        print("Gemini API circuit is open; skipping call.")
+        return None
 
+    client = get_client()
     try:
-        # 6. Make the POST request to the Gemini API.
-        response = requests.post(GEMINI_API_URL, headers=headers, data=json.dumps(payload))
-        response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
-
-        # 7. Parse the JSON response and extract the generated text.
-        result = response.json()
-        hypothesis = result['candidates'][0]['content']['parts'][0]['text']
-        return hypothesis.strip()
-
-    except requests.exceptions.RequestException as e:
-        print(f"Error calling Gemini API: {e}")
-        return "Failed to generate hypothesis due to an API error."
\ No newline at end of file
+        return await _call_upstream(client, payload)
+    finally:
+        # Whatever happened (including an unexpected error or cancellation),
+        # a half-open trial must settle, or the circuit stays half-open and
+        # rejects every later call.
+        if circuit_breaker.state == "half_open":
+            circuit_breaker.record_failure()
+
+async def _call_upstream(client: httpx.AsyncClient, payload: dict):
+    """
+    Posts the payload with retries and records the outcome on the breaker.
+    """
+    global upstream_calls
+
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        response = None
+        try:
+            # 7. Make the POST request to the Gemini API over the shared pool.
+            async with _concurrency:
+                upstream_calls += 1
+                response = await client.post(GEMINI_API_URL, content=json.dumps(payload))
+
+            if response.status_code in RETRYABLE_STATUS_CODES and attempt < LLM_MAX_RETRIES:
+                await asyncio.sleep(_backoff_delay(attempt, response))
+                continue
+            response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
+
+            # 8. Parse the JSON response and extract the generated text.
+            result = response.json()
+            hypothesis = result['candidates'][0]['content']['parts'][0]['text']
+            circuit_breaker.record_success()
+            return hypothesis.strip()
+
+        except httpx.TransportError as e:
+            # Timeouts and connection errors are retried like 5xx responses.
+            if attempt < LLM_MAX_RETRIES:
+                await asyncio.sleep(_backoff_delay(attempt))
+                continue
+            print(f"Error calling Gemini API: {e!r}")
+            circuit_breaker.record_failure()
+            return None
+
+        except (httpx.HTTPStatusError, ValueError, KeyError, IndexError) as e:
+            print(f"Error calling Gemini API: {e}")
+            # Client errors (bad key, bad request) say nothing about the
+            # upstream's health: they neither trip nor close the circuit. Only
+            # a usable 2xx reply (above) closes it.
+            if response is not None and 400 <= response.status_code < 500 and response.status_code != 429:
+                circuit_breaker.record_neutral()
+            else:
+                circuit_breaker.record_failure()
+            return None
+
+        except Exception as e:
+            # Anything else (an undecodable body, too many redirects, an
+            # unexpected JSON shape) counts against the upstream too.
+            print(f"Error calling Gemini API: {e!r}")
+            circuit_breaker.record_failure()
+            return None
\ No newline at end of file
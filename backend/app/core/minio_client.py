@@ -1,12 +1,24 @@
 # 1. Import necessary libraries: 'os' for environment variables and 'Minio' for the client.
 import os
+import asyncio
+from datetime import datetime, timezone
 from minio import Minio
+from minio.error import S3Error
+
+from .executors import storage_pool
 
 # 2. Load MinIO configuration from environment variables.
 MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "minio:9000")
 MINIO_ACCESS_KEY = os.getenv("MINIO_ROOT_USER")
 MINIO_SECRET_KEY = os.getenv("MINIO_ROOT_PASSWORD")
 MINIO_BUCKET = os.getenv("MINIO_BUCKET", "otoliths")
+# Every bucket the application writes to. They are provisioned once at startup.
+MINIO_BUCKETS = [MINIO_BUCKET] + [
+    bucket.strip() for bucket in os.getenv("MINIO_BUCKETS", "").split(",")
+    if bucket.strip() and bucket.strip() != MINIO_BUCKET
+]
+# How often the background probe checks that storage is reachable.
+STORAGE_PROBE_INTERVAL_SECONDS = float(os.getenv("STORAGE_PROBE_INTERVAL_SECONDS", "30"))
 
 # 3. Create a Minio client instance. This object will be used to interact with the server.
 minio_client = Minio(
@@ -16,15 +28,83 @@ minio_client = Minio(
     secure=False  # Set to False because we are running in a local Docker network.
 )
 
+# 4. The last known state of object storage. It is updated by the startup
+#    provisioning and the background probe, never by request handlers, so
+#    reporting it costs nothing.
+storage_health = {
+    "reachable": None,
+    "buckets_ready": False,
+    "buckets": MINIO_BUCKETS,
+    "last_checked": None,
+    "error": None,
+}
+
+def record_storage_check(reachable: bool, error: Exception = None):
+    storage_health["reachable"] = reachable
+    storage_health["last_checked"] = datetime.now(timezone.utc).isoformat()
+    storage_health["error"] = str(error) if error else None
+
+def provision_buckets() -> bool:
+    """
+    Makes sure every configured bucket exists. Safe to run from several
+    workers at once. Returns True once all buckets are ready.
+    """
+    try:
+        for bucket in MINIO_BUCKETS:
+            if not minio_client.bucket_exists(bucket):
+                try:
+                    minio_client.make_bucket(bucket)
+                    print(f"--- Created MinIO bucket '{bucket}' ---")
+                except S3Error as e:
+                    # Another worker created it between our check and make_bucket.
+                    if e.code not in ("BucketAlreadyOwnedByYou", "BucketAlreadyExists"):
+                        raise
+    except Exception as e:
+        print(f"Error provisioning MinIO buckets: {e}")
+        record_storage_check(False, e)
+        return False
+
+    storage_health["buckets_ready"] = True
+    record_storage_check(True)
+    return True
+
+def probe_storage() -> bool:
+    """
+    Checks that storage is reachable, finishing bucket provisioning if it
+    failed at startup.
+    """
+    if not storage_health["buckets_ready"]:
+        return provision_buckets()
+    try:
+        minio_client.bucket_exists(MINIO_BUCKET)
+    except Exception as e:
+        record_storage_check(False, e)
+        return False
+    record_storage_check(True)
+    return True
+
+async def monitor_storage(interval: float = STORAGE_PROBE_INTERVAL_SECONDS):
+    """
+    Background job: probes storage every `interval` seconds.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        await storage_pool.run(probe_storage)
+
+def read_object(object_name: str, bucket: str = MINIO_BUCKET) -> bytes:
+    """
+    Reads a whole stored object into memory.
+    """
+    response = minio_client.get_object(bucket, object_name)
+    try:
+        return response.read()
+    finally:
+        response.close()
+        response.release_conn()
+
 def get_minio_client():
     """
-    Dependency function to provide the Minio client and ensure the bucket exists.
+    Dependency function to provide the Minio client. Buckets are provisioned at
+    application startup, so no storage round trip is made per request.
     """
-    # 4. Check if the designated bucket exists on the MinIO server.
-    found = minio_client.bucket_exists(MINIO_BUCKET)
-    if not found:
-        # 5. If the bucket does not exist, create it.
-        minio_client.make_bucket(MINIO_BUCKET)
-    
-    # 6. Return the client instance.
-    return minio_client
\ No newline at end of file
+    return minio_client
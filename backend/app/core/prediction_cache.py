@@ -0,0 +1,67 @@
+# 1. Import necessary libraries.
+import asyncio
+import hashlib
+import json
+import os
+
+from ..ml import backends, calibration
+from .cache import LRUCache, SQLiteCache, SingleFlight
+
+# 2. Prediction cache configuration. Predictions are keyed by the SHA-256 of
+#    the uploaded bytes and the model they came from (weights fingerprint and
+#    calibration temperature). They are kept in memory only, unless
+#    PREDICTION_CACHE_PATH adds a SQLite tier that survives restarts and is
+#    shared by the workers on a host.
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "4096"))
+PREDICTION_CACHE_PATH = os.getenv("PREDICTION_CACHE_PATH")
+# Bump this whenever the shape of a prediction changes.
+PREDICTION_FORMAT_VERSION = "2"
+
+prediction_cache = LRUCache(maxsize=PREDICTION_CACHE_SIZE)
+persistent_prediction_cache = (
+    SQLiteCache(PREDICTION_CACHE_PATH, maxsize=PREDICTION_CACHE_SIZE * 25)
+    if PREDICTION_CACHE_PATH else None
+)
+single_flight = SingleFlight()
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def prediction_key(digest: str) -> str:
+    # Retraining, switching backends or recalibrating changes the key, so
+    # old predictions are no longer served.
+    return (
+        f"{backends.model_fingerprint()}:T{calibration.temperature()}:"
+        f"v{PREDICTION_FORMAT_VERSION}:{digest}"
+    )
+
+
+async def get(digest: str):
+    """
+    Returns the cached prediction for an image hash, or None.
+    """
+    key = prediction_key(digest)
+    prediction = prediction_cache.get(key)
+    if prediction is None and persistent_prediction_cache is not None:
+        stored = await asyncio.to_thread(persistent_prediction_cache.get, key)
+        if stored is not None:
+            prediction = json.loads(stored)
+            prediction_cache.set(key, prediction)
+    return prediction
+
+
+async def put(digest: str, prediction: dict):
+    key = prediction_key(digest)
+    prediction_cache.set(key, prediction)
+    if persistent_prediction_cache is not None:
+        await asyncio.to_thread(persistent_prediction_cache.set, key, json.dumps(prediction))
+
+
+def cache_stats() -> dict:
+    return {
+        "memory": prediction_cache.stats(),
+        "persistent": persistent_prediction_cache.stats() if persistent_prediction_cache else None,
+        "shared_in_flight": single_flight.shared,
+    }
@@ -0,0 +1,182 @@
+# 1. Import necessary libraries.
+import json
+from typing import Iterator, Optional
+
+import orjson
+from sqlalchemy import Float, cast, func, select
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+
+# 2. Paging and streaming configuration.
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+STREAM_CHUNK_SIZE = 2000
+
+
+def apply_sighting_filters(query, filters: schemas.SightingFilters):
+    """
+    Adds a WHERE clause for every filter that is set. The bounding box is
+    tested with ST_Intersects so PostGIS can answer it from the spatial index
+    on `location`.
+    """
+    bounds = filters.bounds()
+    if bounds is not None:
+        envelope = func.ST_MakeEnvelope(*bounds, 4326)
+        query = query.where(func.ST_Intersects(models.Sighting.location, envelope))
+    if filters.species_id is not None:
+        query = query.where(models.Sighting.species_id == filters.species_id)
+    if filters.start_date is not None:
+        query = query.where(models.Sighting.sighting_date >= filters.start_date)
+    if filters.end_date is not None:
+        query = query.where(models.Sighting.sighting_date <= filters.end_date)
+    return query
+
+
+def build_sightings_query(filters: schemas.SightingFilters, after_id: Optional[int] = None,
+                          limit: Optional[int] = None):
+    """
+    Builds a SELECT over flat sighting columns (no ORM objects), ordered by id
+    for keyset pagination, with every requested filter applied in SQL.
+    """
+    # 3. Select plain columns. Numeric columns are cast to float in SQL so the
+    #    rows can be encoded directly without Decimal conversion in Python.
+    #    encode_sightings_json unpacks the rows by position, in this order.
+    query = (
+        select(
+            models.Sighting.id,
+            func.ST_Y(models.Sighting.location).label("latitude"),
+            func.ST_X(models.Sighting.location).label("longitude"),
+            models.Sighting.sighting_date,
+            cast(models.Sighting.sea_surface_temp_c, Float).label("sea_surface_temp_c"),
+            cast(models.Sighting.salinity_psu, Float).label("salinity_psu"),
+            cast(models.Sighting.chlorophyll_mg_m3, Float).label("chlorophyll_mg_m3"),
+            models.Species.id.label("species_id"),
+            models.Species.scientific_name,
+            models.Species.common_name,
+            models.Species.description,
+            models.Species.habitat,
+        )
+        .join(models.Species, models.Sighting.species_id == models.Species.id)
+        .order_by(models.Sighting.id)
+    )
+
+    query = apply_sighting_filters(query, filters)
+
+    # 4. Keyset pagination: continue strictly after the last id of the previous page.
+    if after_id is not None:
+        query = query.where(models.Sighting.id > after_id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def sighting_row_to_dict(row) -> dict:
+    """
+    Shapes a flat result row into the structure of `schemas.Sighting`.
+    """
+    return {
+        "sighting_id": f"CMLRE-SIGHT-{row.id}",
+        "latitude": row.latitude,
+        "longitude": row.longitude,
+        "sighting_date": row.sighting_date,
+        "sea_surface_temp_c": row.sea_surface_temp_c,
+        "salinity_psu": row.salinity_psu,
+        "chlorophyll_mg_m3": row.chlorophyll_mg_m3,
+        "species": {
+            "id": row.species_id,
+            "scientific_name": row.scientific_name,
+            "common_name": row.common_name,
+            "description": row.description,
+            "habitat": row.habitat,
+        },
+    }
+
+
+def encode_sightings_json(rows) -> bytes:
+    """
+    Encodes result rows as the JSON of `List[schemas.Sighting]` with orjson,
+    without validating each row through Pydantic. Rows are unpacked by
+    position, and each species dict is built once and shared by every row
+    that references it.
+    """
+    species_by_id = {}
+    sightings = []
+    for (sighting_id, latitude, longitude, sighting_date, sea_surface_temp_c, salinity_psu,
+         chlorophyll_mg_m3, species_id, scientific_name, common_name, description, habitat) in rows:
+        species = species_by_id.get(species_id)
+        if species is None:
+            species = species_by_id[species_id] = {
+                "id": species_id,
+                "scientific_name": scientific_name,
+                "common_name": common_name,
+                "description": description,
+                "habitat": habitat,
+            }
+        sightings.append({
+            "sighting_id": f"CMLRE-SIGHT-{sighting_id}",
+            "latitude": latitude,
+            "longitude": longitude,
+            "sighting_date": sighting_date,
+            "sea_surface_temp_c": sea_surface_temp_c,
+            "salinity_psu": salinity_psu,
+            "chlorophyll_mg_m3": chlorophyll_mg_m3,
+            "species": species,
+        })
+    return orjson.dumps(sightings)
+
+
+def sighting_row_to_feature(row) -> dict:
+    """
+    Shapes a flat result row into a GeoJSON Point feature.
+    """
+    properties = sighting_row_to_dict(row)
+    del properties["latitude"], properties["longitude"]
+    return {
+        "type": "Feature",
+        "id": row.id,
+        "geometry": {"type": "Point", "coordinates": [row.longitude, row.latitude]},
+        "properties": properties,
+    }
+
+
+def iter_sighting_rows(db: Session, query, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[list]:
+    """
+    Yields result rows in chunks from a server-side cursor, so the full result
+    set is never held in memory.
+    """
+    result = db.execute(query.execution_options(stream_results=True, yield_per=chunk_size))
+    for partition in result.partitions():
+        yield partition
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, default=str, separators=(",", ":"))
+
+
+def stream_ndjson(db: Session, query) -> Iterator[str]:
+    """
+    Streams sightings as newline-delimited JSON, one object per line.
+    """
+    try:
+        for rows in iter_sighting_rows(db, query):
+            yield "".join(_dumps(sighting_row_to_dict(row)) + "\n" for row in rows)
+    finally:
+        db.close()
+
+
+def stream_geojson(db: Session, query) -> Iterator[str]:
+    """
+    Streams sightings as a single GeoJSON FeatureCollection.
+    """
+    try:
+        yield '{"type":"FeatureCollection","features":['
+        first = True
+        for rows in iter_sighting_rows(db, query):
+            chunk = ",".join(_dumps(sighting_row_to_feature(row)) for row in rows)
+            if chunk:
+                yield chunk if first else "," + chunk
+                first = False
+        yield "]}"
+    finally:
+        db.close()
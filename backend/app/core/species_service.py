@@ -0,0 +1,187 @@
+# 1. Import necessary libraries. brotli is optional; without it the catalogue
+#    is only served gzip-compressed or uncompressed.
+import gzip
+import hashlib
+import os
+import threading
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from .cache import VersionProbe, invalidate_on_commit
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 2. Cache configuration. The serialised catalogue is rebuilt only when the
+#    species table changes. Writes made through this process invalidate it
+#    at once; the version probe (row count, newest updated_at and highest id)
+#    picks up other processes' writes within VERSION_PROBE_SECONDS.
+VERSION_PROBE_SECONDS = float(os.getenv("SPECIES_CATALOGUE_PROBE_SECONDS", "1"))
+GZIP_LEVEL = int(os.getenv("SPECIES_CATALOGUE_GZIP_LEVEL", "9"))
+BROTLI_QUALITY = int(os.getenv("SPECIES_CATALOGUE_BROTLI_QUALITY", "11"))
+
+_species_list = TypeAdapter(List[schemas.Species])
+_lock = threading.Lock()
+_catalogue = None
+# Bumped from the threadpool's request handlers, so counted under a lock.
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "not_modified": 0, "rebuilds": 0}
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+class Catalogue:
+    """
+    The species list serialised once, with its pre-compressed variants.
+    `bodies` and `etags` are keyed by content coding ("identity", "gzip", "br").
+    """
+    def __init__(self, version: tuple, body: bytes):
+        self.version = version
+        self.bodies = {"identity": body}
+        gzipped = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        if len(gzipped) < len(body):
+            self.bodies["gzip"] = gzipped
+        if brotli is not None:
+            compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+            if len(compressed) < len(body):
+                self.bodies["br"] = compressed
+        # Each encoding is a different representation, so it gets its own
+        # strong ETag (as web servers do for pre-compressed files).
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etags = {
+            coding: f'"{digest}"' if coding == "identity" else f'"{digest}-{coding}"'
+            for coding in self.bodies
+        }
+
+
+def invalidate():
+    """
+    Drops the cached catalogue. Called whenever species are written.
+    """
+    global _catalogue
+    with _lock:
+        _catalogue = None
+    _version_probe.clear()
+
+
+def _read_catalogue_version(db: Session) -> tuple:
+    count, updated_at, max_id = db.query(
+        func.count(models.Species.id), func.max(models.Species.updated_at), func.max(models.Species.id)
+    ).one()
+    return (count, updated_at.isoformat() if updated_at else None, max_id)
+
+
+_version_probe = VersionProbe(_read_catalogue_version, ttl=VERSION_PROBE_SECONDS)
+
+
+def catalogue_version(db: Session) -> tuple:
+    return _version_probe.get(db)
+
+
+def get_catalogue(db: Session) -> Catalogue:
+    """
+    Returns the cached catalogue, rebuilding it if the species table changed.
+    """
+    global _catalogue
+    version = catalogue_version(db)
+    catalogue = _catalogue
+    if catalogue is not None and catalogue.version == version:
+        _count("hits")
+        return catalogue
+
+    with _lock:
+        if _catalogue is not None and _catalogue.version == version:
+            return _catalogue
+        rows = db.query(models.Species).order_by(models.Species.id).all()
+        _catalogue = Catalogue(version, _species_list.dump_json(_species_list.validate_python(rows)))
+        _count("rebuilds")
+        print(f"--- Species catalogue rebuilt: {len(rows)} species, "
+              f"{', '.join(f'{c} {len(b)} B' for c, b in _catalogue.bodies.items())} ---")
+        return _catalogue
+
+
+def choose_encoding(accept_encoding: str, available) -> str:
+    """
+    Picks the best available content coding for an Accept-Encoding header:
+    the highest q-value wins, and brotli is preferred over gzip on a tie.
+    """
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+
+    best, best_q = "identity", weights.get("identity", weights.get("*", 1.0)) - 0.001
+    for coding in ("br", "gzip"):
+        q = weights.get(coding, weights.get("*", 0.0))
+        if coding in available and q > 0 and q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def etag_matches(if_none_match: str, catalogue: Catalogue) -> bool:
+    """
+    If-None-Match uses weak comparison, so any variant's tag, with or without
+    a W/ prefix, matches the current catalogue.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return not tags.isdisjoint(catalogue.etags.values())
+
+
+def catalogue_response(db: Session, if_none_match: str = None, accept_encoding: str = None) -> tuple:
+    """
+    Returns (status_code, body, headers) for a GET of the species catalogue:
+    a 304 when the client's ETag is current, otherwise the pre-compressed body.
+    """
+    catalogue = get_catalogue(db)
+    coding = choose_encoding(accept_encoding, catalogue.bodies)
+    headers = {
+        "ETag": catalogue.etags[coding],
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if etag_matches(if_none_match, catalogue):
+        _count("not_modified")
+        return 304, b"", headers
+    if coding != "identity":
+        headers["Content-Encoding"] = coding
+    return 200, catalogue.bodies[coding], headers
+
+
+def cache_stats() -> dict:
+    catalogue = _catalogue
+    with _stats_lock:
+        counts = dict(_stats)
+    return {
+        **counts,
+        "brotli": brotli is not None,
+        "sizes": {coding: len(body) for coding, body in catalogue.bodies.items()} if catalogue else {},
+    }
+
+
+# 3. Invalidate the cached catalogue as soon as a session commits new,
+#    changed or deleted species.
+invalidate_on_commit(models.Species, invalidate)
@@ -0,0 +1,213 @@
+# 1. Import necessary libraries.
+import asyncio
+import io
+import os
+import random
+import re
+from datetime import datetime, timezone
+
+from sqlalchemy.exc import IntegrityError
+
+from .. import models
+from ..database import SessionLocal
+from . import minio_client
+from .cache import LRUCache
+from .executors import storage_pool
+
+# 2. Write-behind configuration.
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+UPLOAD_QUEUE_SIZE = int(os.getenv("UPLOAD_QUEUE_SIZE", "256"))
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("UPLOAD_MAX_ATTEMPTS", "5"))
+UPLOAD_RETRY_BASE_SECONDS = float(os.getenv("UPLOAD_RETRY_BASE_SECONDS", "0.5"))
+UPLOAD_DRAIN_SECONDS = float(os.getenv("UPLOAD_DRAIN_SECONDS", "30"))
+# Number of recent jobs whose status is kept in memory. Older jobs are still
+# found through their `otoliths` row once stored.
+UPLOAD_STATUS_RETENTION = int(os.getenv("UPLOAD_STATUS_RETENTION", "10000"))
+
+# Upload ids are the SHA-256 hex digest of the image bytes.
+UPLOAD_ID_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+class UploadJob:
+    def __init__(self, upload_id: str, object_name: str, data: bytes, content_type: str, species_name: str):
+        self.upload_id = upload_id
+        self.object_name = object_name
+        self.data = data
+        self.content_type = content_type
+        self.species_name = species_name
+
+
+class UploadQueue:
+    """
+    A write-behind queue for otolith images: the API enqueues the bytes and
+    returns immediately, while a pool of workers writes them to MinIO with
+    retries and records each stored object in the `otoliths` table.
+    """
+    def __init__(self, session_factory, workers: int = UPLOAD_WORKERS, maxsize: int = UPLOAD_QUEUE_SIZE):
+        self._session_factory = session_factory
+        self.workers = workers
+        self.maxsize = maxsize
+        self._statuses = LRUCache(maxsize=UPLOAD_STATUS_RETENTION)
+        self._loop = None
+        self._queue = None
+        self._tasks = []
+        self.stored = 0
+        self.failed = 0
+        self.retries = 0
+
+    def _ensure_started(self):
+        # Workers are bound to the running event loop; (re)start them if needed.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or not self._tasks:
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+            self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def start(self):
+        self._ensure_started()
+
+    async def stop(self, timeout: float = UPLOAD_DRAIN_SECONDS):
+        """
+        Gives queued uploads up to `timeout` seconds to finish, then stops the workers.
+        """
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"--- Upload queue stopped with {self._queue.qsize()} uploads pending ---")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _set_status(self, upload_id: str, **fields):
+        status = self._statuses.get(upload_id) or {"upload_id": upload_id}
+        status.update(fields, updated_at=datetime.now(timezone.utc).isoformat())
+        self._statuses.set(upload_id, status)
+        return status
+
+    async def submit(self, upload_id: str, object_name: str, data: bytes, content_type: str,
+                     species_name: str) -> dict:
+        """
+        Enqueues an image for storage and returns its initial status. Waits
+        only if the queue is full (back-pressure).
+        """
+        self._ensure_started()
+        status = self._set_status(upload_id, status="queued", minio_path=object_name, attempts=0)
+        await self._queue.put(UploadJob(upload_id, object_name, data, content_type, species_name))
+        return dict(status)
+
+    def status(self, upload_id: str, lookup_db: bool = True):
+        """
+        Returns the status of an upload, from memory or, for stored uploads
+        handled by another worker process, from the `otoliths` table.
+        """
+        status = self._statuses.get(upload_id)
+        if status is not None:
+            return dict(status)
+        if not lookup_db or not UPLOAD_ID_PATTERN.fullmatch(upload_id):
+            return None
+
+        db = self._session_factory()
+        try:
+            otolith = (
+                db.query(models.Otolith)
+                .filter(models.Otolith.image_digest == upload_id)
+                .first()
+            )
+        finally:
+            db.close()
+        if otolith is None:
+            return None
+        return {"upload_id": upload_id, "status": "stored", "minio_path": otolith.minio_path, "otolith_id": otolith.id}
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._process(job)
+            except Exception as e:
+                print(f"Error processing upload {job.upload_id}: {e}")
+                self._set_status(job.upload_id, status="failed", error=str(e))
+                self.failed += 1
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, job: UploadJob):
+        # 3. Write the object, retrying with jittered exponential backoff.
+        for attempt in range(1, UPLOAD_MAX_ATTEMPTS + 1):
+            self._set_status(job.upload_id, status="uploading", attempts=attempt)
+            try:
+                await storage_pool.run(
+                    minio_client.get_minio_client().put_object,
+                    minio_client.MINIO_BUCKET,
+                    job.object_name,
+                    io.BytesIO(job.data),
+                    len(job.data),
+                    content_type=job.content_type
+                )
+                minio_client.record_storage_check(True)
+                break
+            except Exception as e:
+                minio_client.record_storage_check(False, e)
+                if attempt == UPLOAD_MAX_ATTEMPTS:
+                    raise
+                self.retries += 1
+                self._set_status(job.upload_id, status="retrying", error=str(e))
+                await asyncio.sleep(random.uniform(0, UPLOAD_RETRY_BASE_SECONDS * 2 ** attempt))
+
+        # 4. Record the stored object in the `otoliths` table.
+        otolith_id = await asyncio.to_thread(self._record_otolith, job)
+        self._set_status(job.upload_id, status="stored", otolith_id=otolith_id, error=None)
+        self.stored += 1
+
+    def _record_otolith(self, job: UploadJob) -> int:
+        db = self._session_factory()
+        try:
+            # Object names are content-addressed, so a re-upload of the same
+            # image maps to the row recorded the first time.
+            existing = self._find_otolith(db, job.object_name)
+            if existing is not None:
+                return existing.id
+            species = job.species_name and (
+                db.query(models.Species)
+                .filter(models.Species.scientific_name == job.species_name)
+                .first()
+            )
+            otolith = models.Otolith(
+                species_id=species.id if species else None,
+                minio_path=job.object_name,
+                image_digest=job.upload_id,
+            )
+            db.add(otolith)
+            try:
+                db.commit()
+            except IntegrityError:
+                # A concurrent upload of the same image recorded it first.
+                db.rollback()
+                existing = self._find_otolith(db, job.object_name)
+                if existing is None:
+                    raise
+                return existing.id
+            return otolith.id
+        finally:
+            db.close()
+
+    @staticmethod
+    def _find_otolith(db, object_name: str):
+        return db.query(models.Otolith).filter(models.Otolith.minio_path == object_name).first()
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "maxsize": self.maxsize,
+            "stored": self.stored,
+            "failed": self.failed,
+            "retries": self.retries,
+        }
+
+
+# Create a single, global upload queue, started and drained by the app lifespan.
+upload_queue = UploadQueue(SessionLocal)
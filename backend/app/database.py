@@ -1,9 +1,13 @@
 # 1. Import the 'os' module to access environment variables.
 import os
+import threading
+import time
+import weakref
 # 2. Import necessary components from SQLAlchemy.
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.pool import QueuePool
 # 3. Import the 'load_dotenv' function to load our .env file.
 from dotenv import load_dotenv
 
@@ -11,13 +15,173 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # 5. Read the database URL from the environment variable named "DATABASE_URL".
+#    An optional read replica serves the read-only endpoints; without one,
+#    reads go to the primary.
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
+REPLICA_DATABASE_URL = os.getenv("DATABASE_REPLICA_URL") or None
 
-# 6. Create the SQLAlchemy engine, which is the core entry point to the database.
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Connection pool configuration (ignored for in-memory SQLite).
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Default statement timeout of each request's transaction, in milliseconds
+# (0 = none). Bulk ingestion, exports and the statistics refresh lift it.
+STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
 
-# 7. Create a SessionLocal class. Instances of this class will be our individual database sessions.
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# 8. Create a Base class. Our ORM models in models.py will inherit from this class.
-Base = declarative_base()
\ No newline at end of file
+class PoolMetrics:
+    """
+    Counters fed by pool event listeners, plus the time callers spent
+    waiting for a connection (including opening a new one). `max_overflow`
+    is the overflow the pool was configured with (None without a QueuePool).
+    """
+    def __init__(self, max_overflow: int = None):
+        self.max_overflow = max_overflow
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.connections_opened = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, seconds: float):
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def count(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+# The metrics of every engine made by build_engine, keyed by engine.
+_engine_metrics = weakref.WeakKeyDictionary()
+
+
+def _instrumented_pool_class(metrics: PoolMetrics):
+    """
+    A QueuePool that times every checkout. The metrics live on the class, so
+    they survive the pool being recreated (e.g. after a disconnect).
+    """
+    class InstrumentedQueuePool(QueuePool):
+        def connect(self):
+            started = time.perf_counter()
+            try:
+                return super().connect()
+            except exc.TimeoutError:
+                metrics.count("timeouts")
+                raise
+            finally:
+                metrics.record_wait(time.perf_counter() - started)
+
+    return InstrumentedQueuePool
+
+
+def build_engine(url: str):
+    """
+    Creates an engine with the configured pool and registers its metrics.
+    """
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:"):
+        metrics = PoolMetrics()
+        new_engine = create_engine(url)
+    else:
+        metrics = PoolMetrics(max_overflow=MAX_OVERFLOW)
+        new_engine = create_engine(
+            url,
+            poolclass=_instrumented_pool_class(metrics),
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_timeout=POOL_TIMEOUT_SECONDS,
+            pool_recycle=POOL_RECYCLE_SECONDS,
+            pool_pre_ping=POOL_PRE_PING,
+        )
+    _engine_metrics[new_engine] = metrics
+
+    @event.listens_for(new_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        metrics.count("connections_opened")
+
+    @event.listens_for(new_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.count("checkouts")
+
+    @event.listens_for(new_engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.count("invalidations")
+
+    return new_engine
+
+
+def pool_stats(bound_engine) -> dict:
+    pool, metrics = bound_engine.pool, _engine_metrics[bound_engine]
+    stats = {
+        "checkouts": metrics.checkouts,
+        "connections_opened": metrics.connections_opened,
+        "invalidations": metrics.invalidations,
+        "timeouts": metrics.timeouts,
+        "wait_seconds_total": round(metrics.wait_seconds_total, 4),
+        "wait_seconds_max": round(metrics.wait_seconds_max, 4),
+        "mean_wait_ms": round(1000 * metrics.wait_seconds_total / metrics.checkouts, 3) if metrics.checkouts else 0.0,
+    }
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "max_overflow": metrics.max_overflow,
+            "in_use": pool.checkedout(),
+            "idle": pool.checkedin(),
+            # Negative while the pool has not yet opened `size` connections.
+            "overflow": max(pool.overflow(), 0),
+        })
+    return stats
+
+
+# 6. Create the SQLAlchemy engines, which are the core entry point to the database.
+engine = build_engine(SQLALCHEMY_DATABASE_URL)
+replica_engine = build_engine(REPLICA_DATABASE_URL) if REPLICA_DATABASE_URL else None
+
+# 7. Create the session classes. Instances of these classes will be our
+#    individual database sessions; ReadSessionLocal is for read-only work.
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine,
+    info={"statement_timeout_ms": STATEMENT_TIMEOUT_MS},
+)
+ReadSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=replica_engine,
+    info={"statement_timeout_ms": STATEMENT_TIMEOUT_MS},
+) if replica_engine else SessionLocal
+
+
+# 8. Apply the session's statement timeout at the start of each transaction.
+#    SET LOCAL ends with the transaction, so pooled connections never carry
+#    another request's timeout.
+@event.listens_for(Session, "after_begin")
+def _apply_statement_timeout(session, transaction, connection):
+    timeout_ms = session.info.get("statement_timeout_ms")
+    if timeout_ms and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+
+def without_statement_timeout(db: Session) -> Session:
+    """
+    Lifts the statement timeout for long-running work on `db`, including
+    the transaction already in progress.
+    """
+    db.info["statement_timeout_ms"] = 0
+    if db.in_transaction() and db.get_bind().dialect.name == "postgresql":
+        db.connection().exec_driver_sql("SET LOCAL statement_timeout = 0")
+    return db
+
+
+def database_stats() -> dict:
+    return {
+        "primary": pool_stats(engine),
+        "replica": pool_stats(replica_engine) if replica_engine else None,
+        "statement_timeout_ms": STATEMENT_TIMEOUT_MS,
+    }
+
+# 9. Create a Base class. Our ORM models in models.py will inherit from this class.
+Base = declarative_base()
@@ -8,17 +8,27 @@
 
 # --- Core Imports ---
 
-from fastapi import FastAPI, Depends, UploadFile, File
+from fastapi import FastAPI, Depends, UploadFile, File, HTTPException, Path, Query, Request, Response
 
-from typing import List
+from fastapi.exceptions import RequestValidationError
 
-from sqlalchemy.orm import Session, joinedload
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from sqlalchemy import func
+from starlette.concurrency import run_in_threadpool
 
-from minio import Minio
+from typing import List, Optional
 
-import uuid
+from datetime import date
+
+from pydantic import ValidationError
+
+from sqlalchemy.orm import Session
+
+from contextlib import asynccontextmanager
+
+import asyncio
+
+import io
 
 
 
@@ -26,13 +36,19 @@ import uuid
 
 from . import schemas, models
 
-from .database import SessionLocal, engine
+from .database import ReadSessionLocal, SessionLocal, database_stats, engine
+
+from .core import minio_client
+
+from .core.upload_queue import upload_queue
 
-from .core.minio_client import get_minio_client
+from .core.embedding_index import embedding_index
 
-from .ml.classifier import otolith_classifier
+from .ml.classifier import otolith_batcher, otolith_classifier, WARMUP_ON_STARTUP
 
-from .core import analysis_service, llm_service
+from .core.executors import inference_pool, storage_pool, pool_stats
+
+from .core import analysis_service, classification_service, density_service, export_service, ingest_service, llm_service, prediction_cache, sightings_service, species_service
 
 
 
@@ -44,9 +60,95 @@ from fastapi.middleware.cors import CORSMiddleware
 
 
 
-# This command ensures all database tables are created based on your models.
+# Startup progress reported by /health/ready.
+
+startup_state = {"database": False}
+
+
+
+# ==============================================================================
+
+# APPLICATION LIFESPAN
+
+# Starts the background jobs when the application starts and stops them
+
+# cleanly when it shuts down.
+
+# ==============================================================================
+
+@asynccontextmanager
+
+async def lifespan(app: FastAPI):
+
+    # This command ensures all database tables are created based on your models.
+
+    # It runs at startup rather than at import, so importing the app is cheap.
+
+    await run_in_threadpool(models.Base.metadata.create_all, bind=engine)
+
+    startup_state["database"] = True
+
+
+
+    # Provision every MinIO bucket once, before serving requests. If storage
+
+    # is down, startup continues and the storage monitor keeps retrying.
+
+    await storage_pool.run(minio_client.provision_buckets)
+
+
+
+    # Start the write-behind workers that persist uploaded images.
+
+    await upload_queue.start()
+
+
+
+    background_jobs = [
+
+        # Keeps the correlation statistics behind /api/hypotheses up to date.
+
+        asyncio.create_task(analysis_service.refresh_periodically(ReadSessionLocal)),
+
+        # Keeps the storage health report behind /health/storage current.
+
+        asyncio.create_task(minio_client.monitor_storage()),
+
+    ]
+
+    if WARMUP_ON_STARTUP:
+
+        # Loads the model and traces it with a dummy batch; /health/ready
+
+        # reports ready once it is done.
+
+        background_jobs.append(asyncio.create_task(inference_pool.run(otolith_classifier.warm_up)))
+
+
+
+    yield
+
+
+
+    for job in background_jobs:
+
+        job.cancel()
+
+    for job in background_jobs:
+
+        try:
+
+            await job
+
+        except asyncio.CancelledError:
+
+            pass
+
+    await upload_queue.stop()
+
+    await llm_service.close_client()
+
 
-models.Base.metadata.create_all(bind=engine)
 
 
 
@@ -58,7 +160,9 @@ app = FastAPI(
 
     description="The complete backend service for the SIH 2025 AI-Driven Marine Data Platform.",
 
-    version="1.0.0"
+    version="1.0.0",
+
+    lifespan=lifespan
 
 )
 
@@ -98,6 +202,10 @@ app.add_middleware(
 
     allow_headers=["*"], # Allows all headers
 
+    # Lets the frontend read the keyset cursor of paged /api/sightings responses.
+
+    expose_headers=["X-Next-After-Id"],
+
 )
 
 
@@ -126,12 +234,82 @@ def get_db():
 
 
 
+
+
+# Read-only endpoints use this instead; it is served by DATABASE_REPLICA_URL
+
+# when a replica is configured, and by the primary otherwise.
+
+def get_read_db():
+
+    db = ReadSessionLocal()
+
+    try:
+
+        yield db
+
+    finally:
+
+        db.close()
+
+
+
+# ==============================================================================
+
+# SIGHTING FILTERS DEPENDENCY
+
+# Collects the optional query-string filters shared by the sightings endpoints
+
+# and validates them into a `schemas.SightingFilters` object.
+
+# ==============================================================================
+
+def get_sighting_filters(
+
+    bbox: Optional[str] = Query(None, description="Bounding box as 'min_lon,min_lat,max_lon,max_lat' (WGS84)."),
+
+    species_id: Optional[int] = Query(None),
+
+    start_date: Optional[date] = Query(None),
+
+    end_date: Optional[date] = Query(None)
+
+) -> schemas.SightingFilters:
+
+    try:
+
+        return schemas.SightingFilters(
+
+            bbox=bbox, species_id=species_id, start_date=start_date, end_date=end_date
+
+        )
+
+    except ValidationError as exc:
+
+        raise RequestValidationError(
+
+            [{**error, "loc": ("query", *error["loc"])} for error in exc.errors(include_url=False, include_context=False)]
+
+        )
+
+
+
 # ==============================================================================
 
 # API ENDPOINTS
 
 # These are the live, functional routes that connect to your database and AI models.
 
+#
+
+# Routes that only talk to the database are plain `def` functions, so FastAPI
+
+# runs them in its threadpool instead of blocking the event loop. The async
+
+# routes hand their blocking work to the threadpool or to the dedicated pools
+
+# in `core/executors.py` (inference, MinIO).
+
 # ==============================================================================
 
 
@@ -148,77 +326,323 @@ async def root():
 
 @app.get("/api/species", response_model=List[schemas.Species], tags=["Species"])
 
-async def get_all_species(db: Session = Depends(get_db)):
+def get_all_species(request: Request, db: Session = Depends(get_read_db)):
 
     """
 
     Retrieves a list of all marine species from the PostgreSQL database.
 
+
+
+    The serialised list is cached in process and served pre-compressed
+
+    (brotli or gzip, per Accept-Encoding) with a strong ETag; clients that
+
+    send a current If-None-Match get an empty 304 response.
+
     """
 
-    return db.query(models.Species).all()
+    status_code, body, headers = species_service.catalogue_response(
+
+        db, request.headers.get("if-none-match"), request.headers.get("accept-encoding")
+
+    )
+
+    media_type = "application/json" if status_code == 200 else None
+
+    return Response(content=body, status_code=status_code, media_type=media_type, headers=headers)
+
+
+
 
 
+@app.get(
 
+    "/api/sightings",
 
+    response_model=List[schemas.Sighting],
 
-@app.get("/api/sightings", response_model=List[schemas.Sighting], tags=["Sightings"])
+    tags=["Sightings"],
 
-async def get_sightings_data(db: Session = Depends(get_db)):
+    responses={200: {"content": {"application/x-ndjson": {}, "application/geo+json": {}}}},
+
+)
+
+def get_sightings_data(
+
+    filters: schemas.SightingFilters = Depends(get_sighting_filters),
+
+    after_id: Optional[int] = Query(None, description="Keyset cursor: only return sightings with a larger id."),
+
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of sightings to return."),
+
+    output: str = Query("json", alias="format", pattern="^(json|ndjson|geojson)$"),
+
+    db: Session = Depends(get_read_db)
+
+):
 
     """
 
-    Retrieves all geospatial and oceanographic data points, joining
+    Retrieves geospatial and oceanographic data points, joined with their
+
+    related species information, ordered by id.
+
+
 
-    them with their related species information.
+    Results can be filtered by bounding box, species and date range.
+
+    `format=json` returns every matching row unless `limit` or `after_id` is
+
+    given; then it returns one page (at most `limit` rows) and puts the
+
+    cursor for the next page in the `X-Next-After-Id` header. `format=ndjson`
+
+    and `format=geojson` stream every matching row from a server-side cursor.
 
     """
 
-    query_results = (
+    if output != "json":
 
-        db.query(
+        query = sightings_service.build_sightings_query(filters, after_id, limit)
 
-            models.Sighting,
+        if output == "ndjson":
 
-            func.ST_Y(models.Sighting.location).label("latitude"),
+            stream, media_type = sightings_service.stream_ndjson, "application/x-ndjson"
 
-            func.ST_X(models.Sighting.location).label("longitude")
+        else:
 
-        )
+            stream, media_type = sightings_service.stream_geojson, "application/geo+json"
+
+        # The stream owns its own session: the request's session is closed
+
+        # before a streaming body is sent.
+
+        return StreamingResponse(stream(ReadSessionLocal(), query), media_type=media_type)
+
+
+
+    # Without paging parameters the whole result is returned, as before.
+
+    paged = limit is not None or after_id is not None
+
+    page_size = min(limit or sightings_service.DEFAULT_PAGE_SIZE, sightings_service.MAX_PAGE_SIZE) if paged else None
+
+    rows = db.execute(sightings_service.build_sightings_query(filters, after_id, page_size)).all()
+
+
+
+    # The rows are encoded straight to JSON; response_model still documents
+
+    # the shape in OpenAPI, but returning a Response skips re-validating it.
+
+    response = Response(content=sightings_service.encode_sightings_json(rows), media_type="application/json")
+
+    if paged and len(rows) == page_size:
+
+        response.headers["X-Next-After-Id"] = str(rows[-1].id)
+
+    return response
+
+
+
+
+
+@app.get(
 
-        .options(joinedload(models.Sighting.species))
+    "/api/sightings/export",
 
-        .all()
+    tags=["Sightings"],
+
+    response_class=StreamingResponse,
+
+    responses={200: {"content": {media_type: {} for media_type, _ in export_service.EXPORT_FORMATS.values()}}},
+
+)
+
+def export_sightings(
+
+    filters: schemas.SightingFilters = Depends(get_sighting_filters),
+
+    output: str = Query("arrow", alias="format", pattern="^(arrow|parquet)$"),
+
+):
+
+    """
+
+    Streams every matching sighting as an Apache Arrow IPC stream or a
+
+    Parquet file, for analytics clients (e.g. `pyarrow` / `pandas`).
+
+
+
+    Coordinates and measurements are plain float columns and the species
+
+    names are dictionary-encoded. Rows are read from PostgreSQL with COPY
+
+    and converted to columnar record batches without per-row Python objects.
+
+    """
+
+    try:
+
+        export_service.require_pyarrow()
+
+    except export_service.ExportUnavailable as e:
+
+        raise HTTPException(status_code=501, detail=str(e))
+
+
+
+    media_type, filename = export_service.EXPORT_FORMATS[output]
+
+    query = export_service.build_export_query(filters)
+
+    # The stream owns its own session, like the NDJSON and GeoJSON streams.
+
+    # Starting it runs the COPY up to the first batches, so database errors
+
+    # are a 500 here rather than a truncated file after a 200.
+
+    return StreamingResponse(
+
+        export_service.start_export(ReadSessionLocal(), query, output),
+
+        media_type=media_type,
+
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
 
     )
 
 
 
-    response_data = []
 
-    for s_model, lat, lon in query_results:
 
-        response_data.append({
+@app.post("/api/sightings/bulk", tags=["Sightings"])
+
+def bulk_ingest_sightings(
+
+    file: UploadFile = File(...),
 
-            "sighting_id": f"CMLRE-SIGHT-{s_model.id}",
+    file_format: Optional[str] = Query(None, alias="format", pattern="^(csv|parquet)$",
 
-            "latitude": lat,
+                                       description="Defaults to the file extension."),
+
+    db: Session = Depends(get_db)
+
+):
 
-            "longitude": lon,
+    """
+
+    Loads a CSV or Parquet file of sightings (columns: species_id or
+
+    scientific_name, latitude, longitude, sighting_date and optionally
+
+    sea_surface_temp_c, salinity_psu, chlorophyll_mg_m3).
+
+
+
+    Rows are validated and loaded in chunks through PostgreSQL COPY; each
+
+    chunk commits on its own. The response reports the rows inserted and
+
+    rejected per chunk, the first errors of each, and the rows per second.
+
+    """
+
+    try:
 
-            "sighting_date": s_model.sighting_date,
+        chunks = ingest_service.iter_chunks(file.file, file_format or ingest_service.detect_format(file.filename))
 
-            "sea_surface_temp_c": s_model.sea_surface_temp_c,
+    except ingest_service.IngestError as e:
 
-            "salinity_psu": s_model.salinity_psu,
+        raise HTTPException(status_code=400, detail=str(e))
 
-            "chlorophyll_mg_m3": s_model.chlorophyll_mg_m3,
+    return ingest_service.ingest_sightings(db, chunks)
 
-            "species": s_model.species,
 
-        })
 
-    return response_data
+
+
+@app.get("/api/sightings/density", tags=["Sightings"])
+
+def get_sightings_density(
+
+    cell_size: float = Query(1.0, ge=0.05, le=10.0, description="Grid cell size in degrees."),
+
+    filters: schemas.SightingFilters = Depends(get_sighting_filters),
+
+    db: Session = Depends(get_read_db)
+
+):
+
+    """
+
+    Returns sightings aggregated onto a lon/lat grid: one entry per non-empty
+
+    cell with the sighting count and mean SST, salinity and chlorophyll.
+
+    The payload depends on the grid, not on the size of the table.
+
+    """
+
+    return density_service.get_density_grid(db, filters, cell_size)
+
+
+
+
+
+@app.get(
+
+    "/api/sightings/tiles/{z}/{x}/{y}.mvt",
+
+    tags=["Sightings"],
+
+    response_class=Response,
+
+    responses={200: {"content": {"application/vnd.mapbox-vector-tile": {}}}},
+
+)
+
+def get_sightings_tile(
+
+    z: int = Path(..., ge=0, le=22),
+
+    x: int = Path(..., ge=0),
+
+    y: int = Path(..., ge=0),
+
+    filters: schemas.SightingFilters = Depends(get_sighting_filters),
+
+    db: Session = Depends(get_read_db)
+
+):
+
+    """
+
+    Returns a Mapbox vector tile of aggregated sighting density for the
+
+    z/x/y web-mercator tile, built in PostGIS with ST_AsMVT.
+
+    """
+
+    if x >= 2 ** z or y >= 2 ** z:
+
+        raise HTTPException(status_code=404, detail="Tile coordinates out of range for this zoom level.")
+
+
+
+    tile = density_service.get_density_tile(db, z, x, y, filters)
+
+    return Response(
+
+        content=tile,
+
+        media_type="application/vnd.mapbox-vector-tile",
+
+        headers={"Cache-Control": "public, max-age=60"},
+
+    )
 
 
 
@@ -230,8 +654,6 @@ async def classify_otolith_image(
 
     db: Session = Depends(get_db),
 
-    minio: Minio = Depends(get_minio_client),
-
     file: UploadFile = File(...)
 
 ):
@@ -240,65 +662,185 @@ async def classify_otolith_image(
 
     Accepts an otolith image, performs species classification using the AI model,
 
-    and stores the uploaded image in the MinIO object storage.
+    and queues the uploaded image for storage in MinIO.
+
+
+
+    The prediction is returned as soon as inference finishes; the image is
+
+    written in the background. Poll /api/uploads/{upload_id} for its status.
+
+
+
+    Images are identified by the SHA-256 of their bytes (the upload id): a
+
+    re-upload of the same image is answered from the prediction cache
+
+    (`cached: true`) and reuses the stored object instead of a new copy.
 
     """
 
     contents = await file.read()
 
-    prediction_results = otolith_classifier.predict(contents)
+    return await classification_service.classify_image(file.filename, contents, file.content_type)
+
+
+
+
+
+def take_upload_file(upload: UploadFile):
+
+    """
+
+    Detaches the spooled file from an UploadFile. FastAPI closes form files as
+
+    soon as the endpoint returns, before a streamed body is sent, so a stream
+
+    must own the file it reads from (and close it when done).
+
+    """
+
+    fileobj = upload.file
+
+    upload.file = io.BytesIO()
+
+    return fileobj
+
+
+
+
 
+@app.post(
 
+    "/api/classify_otolith/batch",
 
-    file_extension = file.filename.split('.')[-1]
+    tags=["AI Models"],
 
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
+    response_class=StreamingResponse,
 
-    object_name = f"{prediction_results['predicted_species'].replace(' ', '_')}/{unique_filename}"
+    responses={200: {"content": {"application/x-ndjson": {}}}}
 
-    
+)
+
+async def classify_otolith_batch(files: List[UploadFile] = File(...)):
+
+    """
+
+    Classifies many otolith images in one request: either several image files,
+
+    or a single zip/tar archive of images, which is read member by member and
+
+    never extracted to disk.
 
-    file.file.seek(0)
 
-    file_size = len(contents)
 
+    Results are streamed as NDJSON, one line per image, as each fixed-size
 
+    batch is classified. Every image is queued for storage like a single
 
-    minio.put_object(
+    upload; images that cannot be decoded get an `error` line.
 
-        "otoliths",
+    """
+
+    if len(files) == 1 and classification_service.is_archive_name(files[0].filename):
+
+        images = classification_service.iter_archive_images(take_upload_file(files[0]), files[0].filename)
+
+    else:
 
-        object_name,
+        images = classification_service.iter_uploaded_images(
+
+            [(upload.filename, take_upload_file(upload)) for upload in files]
+
+        )
 
-        file.file,
 
-        file_size,
 
-        content_type=file.content_type
+    return StreamingResponse(
+
+        classification_service.classify_images(images),
+
+        media_type="application/x-ndjson"
 
     )
 
 
 
-    return prediction_results
 
 
+@app.get("/api/uploads/{upload_id}", tags=["AI Models"])
 
+def get_upload_status(upload_id: str):
+
+    """
+
+    Reports the storage status of an uploaded otolith image: queued,
+
+    uploading, retrying, stored or failed.
+
+    """
+
+    status = upload_queue.status(upload_id)
+
+    if status is None:
+
+        raise HTTPException(status_code=404, detail="Unknown upload id.")
+
+    return status
 
 
-@app.get("/api/hypotheses", response_model=dict, tags=["X-Factor"])
 
-async def get_ai_hypotheses(db: Session = Depends(get_db)):
+
+
+@app.get("/api/otoliths/{otolith_id}/similar", tags=["AI Models"])
+
+async def get_similar_otoliths(
+
+    otolith_id: int,
+
+    k: int = Query(10, ge=1, le=100, description="Number of similar otoliths to return."),
+
+    db: Session = Depends(get_db)
+
+):
 
     """
 
-    Analyzes the entire database to find the strongest statistical correlation
+    Finds the stored otoliths whose images look most like this one, by the
+
+    cosine similarity of their MobileNetV2 embeddings.
+
+    """
+
+    otolith = await run_in_threadpool(db.get, models.Otolith, otolith_id)
+
+    if otolith is None:
+
+        raise HTTPException(status_code=404, detail="Otolith not found.")
+
+    try:
+
+        results = await classification_service.find_similar_otoliths(db, otolith, k)
+
+    except classification_service.EmbeddingUnavailable as e:
+
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return {"otolith_id": otolith_id, "results": results}
+
+
+
+
+
+def load_correlation_finding(db: Session) -> dict:
+
+    """
 
-    and uses a Generative AI model to formulate a natural language hypothesis.
+    Reads the precomputed correlation finding and attaches the species name.
 
     """
 
-    correlation_finding = analysis_service.find_strongest_correlation(db)
+    correlation_finding = analysis_service.correlation_store.get(db)
 
 
 
@@ -312,7 +854,37 @@ async def get_ai_hypotheses(db: Session = Depends(get_db)):
 
 
 
-    hypothesis_text = llm_service.generate_hypothesis_from_finding(correlation_finding)
+    return correlation_finding
+
+
+
+
+
+@app.get("/api/hypotheses", response_model=dict, tags=["X-Factor"])
+
+async def get_ai_hypotheses(db: Session = Depends(get_read_db)):
+
+    """
+
+    Reads the strongest statistical correlation from the precomputed statistics
+
+    (refreshed in the background as sightings arrive) and uses a Generative AI
+
+    model to formulate a natural language hypothesis. The finding reports how
+
+    stale the statistics are.
+
+    """
+
+    # The database part runs in the threadpool; the LLM call is async and
+
+    # waits on the network without holding a thread.
+
+    correlation_finding = await run_in_threadpool(load_correlation_finding, db)
+
+
+
+    hypothesis_text = await llm_service.generate_hypothesis_from_finding(correlation_finding)
 
 
 
@@ -322,4 +894,98 @@ async def get_ai_hypotheses(db: Session = Depends(get_db)):
 
         "source_finding": correlation_finding
 
-    }
\ No newline at end of file
+    }
+
+
+
+
+
+@app.get("/metrics", tags=["Monitoring"])
+
+async def get_metrics():
+
+    """
+
+    Reports the load on the dedicated worker pools, the database connection
+
+    pools and the inference batcher.
+
+    """
+
+    return {
+
+        "pools": pool_stats(),
+
+        "database": database_stats(),
+
+        "batching": otolith_batcher.stats(),
+
+        "uploads": upload_queue.stats(),
+
+        "caches": {
+
+            "tiles": density_service.tile_cache.stats(),
+
+            "species_catalogue": species_service.cache_stats(),
+
+            "hypotheses": llm_service.cache_stats(),
+
+            "predictions": prediction_cache.cache_stats(),
+
+        },
+
+        "correlation_stats": analysis_service.correlation_store.stats(),
+
+        "embedding_index": embedding_index.stats(),
+
+    }
+
+
+
+
+
+@app.get("/health/storage", tags=["Monitoring"])
+
+async def get_storage_health():
+
+    """
+
+    Reports object storage reachability from the last background probe,
+
+    without contacting MinIO. Returns 503 while storage is unreachable.
+
+    """
+
+    health = minio_client.storage_health
+
+    status_code = 200 if health["reachable"] and health["buckets_ready"] else 503
+
+    return JSONResponse(health, status_code=status_code)
+
+
+
+
+
+@app.get("/health/ready", tags=["Monitoring"])
+
+async def get_readiness():
+
+    """
+
+    Readiness probe: 200 once the database schema is in place and the model
+
+    is loaded and warmed up, 503 before that (or if loading failed).
+
+    """
+
+    model_ready = otolith_classifier.ready or not WARMUP_ON_STARTUP
+
+    ready = startup_state["database"] and model_ready
+
+    return JSONResponse(
+
+        {"ready": ready, "database": startup_state["database"], "model": otolith_classifier.status},
+
+        status_code=200 if ready else 503
+
+    )
\ No newline at end of file
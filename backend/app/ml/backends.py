@@ -0,0 +1,159 @@
+# 1. Import necessary libraries. TensorFlow (or the standalone TFLite runtime)
+#    is only imported when a backend is actually loaded.
+import functools
+import os
+import threading
+
+import numpy as np
+
+MODEL_DIR = os.path.dirname(__file__)
+
+# 2. The artefacts written by train_model.py, one per backend.
+MODEL_ARTEFACTS = {
+    "keras": "otolith_classifier_model.h5",
+    "tflite-fp16": "otolith_classifier_fp16.tflite",
+    "tflite-int8": "otolith_classifier_int8.tflite",
+}
+
+# Which backend serves predictions ("remote" uses app/ml/inference_server.py),
+# and optionally a path to its artefact.
+MODEL_BACKEND = os.getenv("OTOLITH_MODEL_BACKEND", "keras")
+MODEL_PATH = os.getenv("OTOLITH_MODEL_PATH")
+TFLITE_THREADS = int(os.getenv("OTOLITH_TFLITE_THREADS", "2"))
+
+
+class KerasBackend:
+    """
+    The full Keras model, run through `model.predict`. It also returns the
+    pooled MobileNetV2 features, which serve as the image embedding.
+    """
+    name = "keras"
+
+    def __init__(self, model_path: str):
+        import tensorflow as tf
+        self.model_path = model_path
+        model = tf.keras.models.load_model(model_path)
+        pooling = [layer for layer in model.layers if isinstance(layer, tf.keras.layers.GlobalAveragePooling2D)]
+        self.embedding_dim = int(pooling[-1].output.shape[-1]) if pooling else None
+        if pooling:
+            # One forward pass yields both the probabilities and the embedding.
+            model = tf.keras.Model(model.input, [model.output, pooling[-1].output])
+        self._model = model
+
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        if self.embedding_dim:
+            return self.predict_with_embeddings(images)[0]
+        return self._model.predict(images, verbose=0)
+
+    def predict_with_embeddings(self, images: np.ndarray) -> tuple:
+        probabilities, embeddings = self._model.predict(images, verbose=0)
+        return probabilities, embeddings
+
+
+def quantize(values: np.ndarray, scale: float, zero_point: int, dtype) -> np.ndarray:
+    """
+    Maps float values to a quantized integer tensor: q = round(x / scale) + zero_point.
+    """
+    info = np.iinfo(dtype)
+    return np.clip(np.round(values / scale) + zero_point, info.min, info.max).astype(dtype)
+
+
+def dequantize(values: np.ndarray, scale: float, zero_point: int) -> np.ndarray:
+    return (values.astype(np.float32) - zero_point) * scale
+
+
+def _tflite_interpreter_class():
+    # Prefer the small standalone runtime when it is installed.
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class TFLiteBackend:
+    """
+    A TFLite flatbuffer (float16 or int8 quantized), run by the TFLite
+    interpreter. Interpreters are not thread-safe, so each inference thread
+    gets its own; they are resized to the batch size on demand.
+    """
+    # The exported flatbuffers only output the class probabilities.
+    embedding_dim = None
+
+    def __init__(self, model_path: str, name: str = "tflite", num_threads: int = TFLITE_THREADS):
+        self.name = name
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self._interpreter_class = _tflite_interpreter_class()
+        self._local = threading.local()
+        self._interpreter()  # Fail fast on a missing or invalid artefact.
+
+    def _interpreter(self):
+        interpreter = getattr(self._local, "interpreter", None)
+        if interpreter is None:
+            interpreter = self._interpreter_class(model_path=self.model_path, num_threads=self.num_threads)
+            interpreter.allocate_tensors()
+            self._local.interpreter = interpreter
+            self._local.batch_size = interpreter.get_input_details()[0]["shape"][0]
+        return interpreter
+
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        interpreter = self._interpreter()
+        input_details = interpreter.get_input_details()[0]
+        output_details = interpreter.get_output_details()[0]
+
+        if self._local.batch_size != len(images):
+            interpreter.resize_tensor_input(input_details["index"], (len(images), *images.shape[1:]))
+            interpreter.allocate_tensors()
+            self._local.batch_size = len(images)
+
+        # Integer models take quantized inputs and return quantized outputs.
+        if input_details["dtype"] != np.float32:
+            scale, zero_point = input_details["quantization"]
+            images = quantize(images, scale, zero_point, input_details["dtype"])
+        interpreter.set_tensor(input_details["index"], images)
+        interpreter.invoke()
+        outputs = interpreter.get_tensor(output_details["index"])
+        if output_details["dtype"] != np.float32:
+            scale, zero_point = output_details["quantization"]
+            outputs = dequantize(outputs, scale, zero_point)
+        return outputs
+
+
+def artefact_path(backend: str) -> str:
+    if backend not in MODEL_ARTEFACTS:
+        raise ValueError(f"Unknown model backend '{backend}'. Choose one of: {', '.join(MODEL_ARTEFACTS)}.")
+    return os.path.join(MODEL_DIR, MODEL_ARTEFACTS[backend])
+
+
+@functools.lru_cache(maxsize=None)
+def model_fingerprint(backend: str = MODEL_BACKEND, model_path: str = MODEL_PATH) -> str:
+    """
+    Identifies the model that serves predictions (backend and artefact
+    size and modification time), without loading it.
+    """
+    if backend == "remote":
+        from .inference_server import SERVER_BACKEND
+        backend = SERVER_BACKEND
+    model_path = model_path or artefact_path(backend)
+    try:
+        stat = os.stat(model_path)
+    except OSError:
+        return f"{backend}:missing"
+    return f"{backend}:{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def load_backend(backend: str = MODEL_BACKEND, model_path: str = MODEL_PATH):
+    """
+    Loads the named inference backend from its artefact (or from `model_path`).
+    The "remote" backend connects to the inference server instead.
+    """
+    if backend == "remote":
+        from .inference_server import RemoteBackend
+        return RemoteBackend()
+    default_path = artefact_path(backend)  # Also rejects unknown backends.
+    model_path = model_path or default_path
+    if backend == "keras":
+        return KerasBackend(model_path)
+    return TFLiteBackend(model_path, name=backend)
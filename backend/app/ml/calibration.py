@@ -0,0 +1,98 @@
+# 1. Import necessary libraries. Everything here is plain NumPy, applied to
+#    the probabilities the model's softmax layer already produces.
+import functools
+import json
+import os
+
+import numpy as np
+
+# 2. Calibration configuration. calibration.json is written by train_model.py
+#    from the validation split; without it the model output is used as is.
+CALIBRATION_PATH = (
+    os.getenv("OTOLITH_CALIBRATION_PATH") or os.path.join(os.path.dirname(__file__), "calibration.json")
+)
+# Probabilities are clipped away from 0 before taking logs.
+EPSILON = 1e-7
+
+
+@functools.lru_cache(maxsize=None)
+def load_calibration(path: str = CALIBRATION_PATH) -> dict:
+    """
+    Returns the fitted calibration, or the identity calibration (T = 1).
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"temperature": 1.0}
+
+
+def temperature() -> float:
+    return float(load_calibration()["temperature"])
+
+
+def calibrate(probabilities: np.ndarray, temperature: float) -> np.ndarray:
+    """
+    Temperature-scales softmax outputs: softmax(log(p) / T). log(p) equals the
+    model's logits up to a per-row constant, which the softmax cancels out.
+    """
+    logits = np.log(np.clip(probabilities, EPSILON, 1.0)) / temperature
+    logits -= logits.max(axis=-1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def negative_log_likelihood(probabilities: np.ndarray, labels: np.ndarray) -> float:
+    picked = probabilities[np.arange(len(labels)), labels]
+    return float(-np.log(np.clip(picked, EPSILON, 1.0)).mean())
+
+
+def expected_calibration_error(probabilities: np.ndarray, labels: np.ndarray, bins: int = 10) -> float:
+    """
+    The gap between confidence and accuracy, averaged over confidence bins.
+    """
+    confidence = probabilities.max(axis=1)
+    correct = probabilities.argmax(axis=1) == labels
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    error = 0.0
+    for low, high in zip(edges[:-1], edges[1:]):
+        in_bin = (confidence > low) & (confidence <= high)
+        if in_bin.any():
+            error += in_bin.mean() * abs(correct[in_bin].mean() - confidence[in_bin].mean())
+    return float(error)
+
+
+def fit_temperature(probabilities: np.ndarray, labels: np.ndarray,
+                    low: float = 0.05, high: float = 20.0, iterations: int = 60) -> float:
+    """
+    Finds the temperature that minimises the negative log-likelihood of the
+    labels, by golden-section search over log(T) (the NLL is unimodal in T).
+    """
+    ratio = (np.sqrt(5) - 1) / 2
+    a, b = np.log(low), np.log(high)
+    nll = lambda log_t: negative_log_likelihood(calibrate(probabilities, np.exp(log_t)), labels)
+    c, d = b - ratio * (b - a), a + ratio * (b - a)
+    for _ in range(iterations):
+        if nll(c) < nll(d):
+            b, d = d, c
+            c = b - ratio * (b - a)
+        else:
+            a, c = c, d
+            d = a + ratio * (b - a)
+    return float(np.exp((a + b) / 2))
+
+
+def fit_calibration(probabilities: np.ndarray, labels: np.ndarray) -> dict:
+    """
+    Fits the temperature on held-out predictions and reports its effect.
+    """
+    fitted = fit_temperature(probabilities, labels)
+    calibrated = calibrate(probabilities, fitted)
+    return {
+        "temperature": round(fitted, 4),
+        "samples": int(len(labels)),
+        "nll_before": round(negative_log_likelihood(probabilities, labels), 4),
+        "nll_after": round(negative_log_likelihood(calibrated, labels), 4),
+        "ece_before": round(expected_calibration_error(probabilities, labels), 4),
+        "ece_after": round(expected_calibration_error(calibrated, labels), 4),
+    }
@@ -1,21 +1,46 @@
-import tensorflow as tf
-from PIL import Image
 import numpy as np
-import io
+import asyncio
 import os
+import threading
+import time
+
+from ..core.executors import inference_pool, preprocess_pool
+from . import backends, calibration, preprocessing
+
+# Micro-batching configuration. Requests that arrive within the window are
+# grouped into a single forward pass of at most BATCH_MAX_SIZE images.
+BATCH_MAX_SIZE = int(os.getenv("OTOLITH_BATCH_MAX_SIZE", "16"))
+BATCH_WINDOW_MS = float(os.getenv("OTOLITH_BATCH_WINDOW_MS", "5"))
+# Load the model and run a dummy batch in the background at startup, so the
+# first request doesn't pay for it.
+WARMUP_ON_STARTUP = os.getenv("OTOLITH_WARMUP", "true").lower() in ("1", "true", "yes")
+# How many ranked species each prediction carries, and the calibrated
+# probability below which a prediction is flagged as low confidence.
+TOP_K = int(os.getenv("OTOLITH_TOP_K", "3"))
+CONFIDENCE_THRESHOLD = float(os.getenv("OTOLITH_CONFIDENCE_THRESHOLD", "0.6"))
 
 class OtolithClassifier:
     _model = None
     _class_names = None # <-- ADD THIS
 
+    def __init__(self):
+        # TensorFlow is only imported when the model is first loaded.
+        self._load_lock = threading.Lock()
+        self.status = {
+            "state": "not_loaded",
+            "backend": backends.MODEL_BACKEND,
+            "load_seconds": None,
+            "warmup_seconds": None,
+            "error": None,
+        }
+
     def _load_model(self):
         """
-        Loads the trained TensorFlow model and class names.
+        Loads the trained model, through the configured backend, and class names.
         """
-        print("--- LOADING TRAINED MODEL ---")
-        # 1. Load the Keras model from the .h5 file.
-        model_path = os.path.join(os.path.dirname(__file__), 'otolith_classifier_model.h5')
-        self._model = tf.keras.models.load_model(model_path)
+        print(f"--- LOADING TRAINED MODEL ({backends.MODEL_BACKEND}) ---")
+        # 1. Load the Keras model or one of its TFLite exports.
+        self._model = backends.load_backend()
 
         # 2. IMPORTANT: Define the class mapping in the correct order.
         #    This must match the alphabetical order of the sub-folders
@@ -28,35 +53,238 @@ class OtolithClassifier:
         Public method to access the model and class names, loading them once.
         """
         if self._model is None:
-            self._load_model()
+            with self._load_lock:
+                if self._model is None:
+                    self.status["state"] = "loading"
+                    started = time.perf_counter()
+                    try:
+                        self._load_model()
+                    except Exception as e:
+                        self.status.update(state="failed", error=str(e))
+                        raise
+                    self.status.update(
+                        state="loaded", load_seconds=round(time.perf_counter() - started, 3), error=None
+                    )
         return self._model, self._class_names
 
+    def warm_up(self) -> bool:
+        """
+        Loads the model and runs dummy batches of the sizes the API uses, so
+        graph tracing and tensor allocation happen before the first request.
+        Returns True once the classifier is ready.
+        """
+        try:
+            self.get_model_and_classes()
+            self.status["state"] = "warming_up"
+            started = time.perf_counter()
+            for batch_size in sorted({1, BATCH_MAX_SIZE}):
+                self.predict_batch(np.zeros((batch_size, *preprocessing.IMG_SIZE, 3), dtype=np.float32))
+            self.status["warmup_seconds"] = round(time.perf_counter() - started, 3)
+        except Exception as e:
+            print(f"Error warming up the otolith classifier: {e}")
+            self.status.update(state="failed", error=str(e))
+            return False
+
+        self.status.update(state="ready", error=None)
+        print(f"--- MODEL WARMED UP in {self.status['warmup_seconds']}s ---")
+        return True
+
+    @property
+    def ready(self) -> bool:
+        # Only a completed forward pass counts; "loaded" is not ready yet.
+        return self.status["state"] == "ready"
+
+    def preprocess(self, image_bytes: bytes) -> np.ndarray:
+        """
+        Decodes an image and returns a normalised (224, 224, 3) array.
+        """
+        return preprocessing.preprocess(image_bytes)
+
+    @property
+    def embedding_dim(self):
+        """
+        The size of the pooled MobileNetV2 embedding, or None if the loaded
+        backend does not provide it.
+        """
+        model, _ = self.get_model_and_classes()
+        return getattr(model, "embedding_dim", None)
+
+    def embed(self, images: np.ndarray):
+        """
+        Returns the pooled MobileNetV2 embedding of each pre-processed image,
+        or None if the loaded backend does not provide embeddings.
+        """
+        return self.classify_batch(images)[1]
+
+    def predict_batch(self, images: np.ndarray) -> list:
+        """
+        Runs a single forward pass over a stacked batch of pre-processed images
+        and returns one prediction dict per image: the top species, its
+        calibrated confidence, the top-k ranking and a low-confidence flag.
+        """
+        return self.classify_batch(images)[0]
+
+    def classify_batch(self, images: np.ndarray) -> tuple:
+        """
+        Like `predict_batch`, but returns (predictions, embeddings) from the
+        same forward pass; embeddings is None if the backend has none.
+        """
+        model, class_names = self.get_model_and_classes()
+        if getattr(model, "embedding_dim", None):
+            outputs, embeddings = model.predict_with_embeddings(images)
+        else:
+            outputs, embeddings = model.predict(images), None
+        if self.status["state"] in ("failed", "loaded"):
+            # A batch went through after a failed (or skipped) warm-up.
+            self.status.update(state="ready", error=None)
+
+        # The model ends in a softmax layer, so its output already is a
+        # distribution; it is only temperature-scaled, in NumPy.
+        probabilities = calibration.calibrate(np.asarray(outputs), calibration.temperature())
+        k = max(1, min(TOP_K, len(class_names)))
+        ranked = np.argsort(-probabilities, axis=1)[:, :k]
+
+        results = []
+        for row, order in zip(probabilities, ranked):
+            top_k = [
+                {"species": class_names[i].replace("_", " "), "probability": round(float(row[i]), 4)}
+                for i in order
+            ]
+            results.append({
+                "predicted_species": top_k[0]["species"],
+                "confidence_score": round(100 * float(row[order[0]]), 2),
+                "top_k": top_k,
+                "low_confidence": bool(row[order[0]] < CONFIDENCE_THRESHOLD),
+            })
+        return results, (None if embeddings is None else np.asarray(embeddings, dtype=np.float32))
+
     def predict(self, image_bytes: bytes) -> dict:
         """
         Performs a prediction on a given image.
         """
-        # 3. Get the model and class names.
-        model, class_names = self.get_model_and_classes()
+        img_array = self.preprocess(image_bytes)
+        return self.predict_batch(img_array[np.newaxis])[0]
+
+
+class BatchScheduler:
+    """
+    Collects concurrent prediction requests and runs them through the model
+    as one batch, handing each caller back its own result.
+
+    A batch is dispatched as soon as it holds `max_batch_size` images or the
+    collection window since its first image has elapsed. While a batch is
+    running, new requests keep queueing, so bursts naturally form larger
+    batches.
+    """
+    def __init__(self, classifier: OtolithClassifier, max_batch_size: int = BATCH_MAX_SIZE,
+                 window_ms: float = BATCH_WINDOW_MS, executor=inference_pool,
+                 preprocess_executor=preprocess_pool):
+        self._classifier = classifier
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms) / 1000.0
+        self._executor = executor
+        self._preprocess_executor = preprocess_executor
+        self._buffer = preprocessing.BatchBuffer(self.max_batch_size)
+        self._loop = None
+        self._queue = None
+        self._worker = None
+        self.batches_run = 0
+        self.images_run = 0
 
-        # 4. Pre-process the image (same as before).
-        img = Image.open(io.BytesIO(image_bytes)).convert('RGB') # Ensure 3 channels
-        img = img.resize((224, 224))
-        img_array = tf.keras.utils.img_to_array(img)
-        img_array = img_array / 255.0 # Normalize pixel values
-        img_array = tf.expand_dims(img_array, 0)
+    def _ensure_worker(self):
+        # The worker task is bound to the running event loop. Start it lazily,
+        # and restart it if the loop changed (e.g. between test clients).
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
 
-        # 5. Use the real model to make a prediction.
-        predictions = model.predict(img_array)
-        score = tf.nn.softmax(predictions[0])
+    async def submit(self, image_bytes: bytes, with_embedding: bool = False):
+        """
+        Queues one image for classification and waits for its prediction, or
+        for a (prediction, embedding) pair if `with_embedding` is set.
+        """
+        self._ensure_worker()
+        loop = self._loop
+        # Only decoding and resizing happen per request; normalisation is done
+        # straight into the batch buffer when the batch runs.
+        pixels = await loop.run_in_executor(
+            self._preprocess_executor, preprocessing.decode_and_resize, image_bytes
+        )
+
+        future = loop.create_future()
+        self._queue.put_nowait((pixels, future))
+        prediction, embedding = await future
+        return (prediction, embedding) if with_embedding else prediction
+
+    async def submit_many(self, pixel_arrays: list) -> list:
+        """
+        Queues images that are already decoded and resized (e.g. a chunk of a
+        batch upload) and waits for all of them, returning their
+        (prediction, embedding) pairs in order. They share the forward passes
+        of single uploads, so the model never runs two batches at once.
+        """
+        self._ensure_worker()
+        futures = [self._loop.create_future() for _ in pixel_arrays]
+        for pixels, future in zip(pixel_arrays, futures):
+            self._queue.put_nowait((pixels, future))
+        outcomes = await asyncio.gather(*futures, return_exceptions=True)
+        for outcome in outcomes:
+            if isinstance(outcome, BaseException):
+                raise outcome
+        return outcomes
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Drop callers that went away (e.g. client disconnects) before running.
+            batch = [(img, fut) for img, fut in batch if not fut.done()]
+            if not batch:
+                continue
 
-        # 6. Get the predicted class name and confidence score.
-        predicted_class = class_names[np.argmax(score)]
-        confidence_score = 100 * np.max(score)
+            # The buffer is reused: this batch is done with it before the next fill.
+            images = self._buffer.fill([img for img, _ in batch])
+            try:
+                results, embeddings = await self._loop.run_in_executor(
+                    self._executor, self._classifier.classify_batch, images
+                )
+            except Exception as exc:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(exc)
+                continue
 
+            self.batches_run += 1
+            self.images_run += len(batch)
+            for i, ((_, fut), result) in enumerate(zip(batch, results)):
+                if not fut.done():
+                    fut.set_result((result, None if embeddings is None else embeddings[i]))
+
+    def stats(self) -> dict:
         return {
-            "predicted_species": predicted_class.replace("_", " "),
-            "confidence_score": round(confidence_score, 2)
+            "max_batch_size": self.max_batch_size,
+            "window_ms": self.window * 1000.0,
+            "batches_run": self.batches_run,
+            "images_run": self.images_run,
+            "mean_batch_size": round(self.images_run / self.batches_run, 2) if self.batches_run else 0.0,
         }
 
 # Create a single, global instance of the classifier.
-otolith_classifier = OtolithClassifier()
\ No newline at end of file
+otolith_classifier = OtolithClassifier()
+
+# ...and the scheduler the API uses to batch concurrent uploads.
+otolith_batcher = BatchScheduler(otolith_classifier)
@@ -0,0 +1,255 @@
+# A standalone inference server that owns the otolith model, so any number of
+# API worker processes can share one copy of TensorFlow and the model.
+#
+# Start it next to the API (from the backend directory):
+#     python -m app.ml.inference_server
+# and point the API at it with OTOLITH_MODEL_BACKEND=remote. The server and
+# the API workers must share /dev/shm (same host or container, or a shared
+# IPC namespace).
+#
+# Every client thread creates one shared-memory segment and sends its name
+# when it connects. For each batch it writes the preprocessed images into
+# the segment and sends only the batch size over the socket. The server runs
+# the model on a NumPy view of that same memory and writes the probabilities
+# back into the segment, so tensors never go through a pipe or pickle.
+
+# 1. Import necessary libraries.
+import atexit
+import os
+import threading
+from multiprocessing import resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from . import backends, preprocessing
+
+# 2. Server configuration.
+SERVER_ADDRESS = os.getenv("OTOLITH_INFERENCE_ADDRESS", "/tmp/otolith-inference.sock")
+# The listener unpickles what authenticated clients send, so there is no
+# default key: the server and its clients refuse to run without one.
+SERVER_AUTHKEY = os.getenv("OTOLITH_INFERENCE_AUTHKEY", "").encode() or None
+# The backend the server itself runs (keras, tflite-fp16 or tflite-int8).
+SERVER_BACKEND = os.getenv("OTOLITH_SERVER_BACKEND", "keras")
+# How many batches the server runs at once; the model already uses several cores.
+SERVER_CONCURRENCY = int(os.getenv("OTOLITH_SERVER_CONCURRENCY", "1"))
+# The largest batch a client segment is sized for at first; it grows on demand.
+SEGMENT_BATCH_SIZE = int(os.getenv("OTOLITH_BATCH_MAX_SIZE", "16"))
+MAX_CLASSES = 64
+
+IMAGE_SHAPE = (*preprocessing.IMG_SIZE, 3)
+IMAGE_BYTES = int(np.prod(IMAGE_SHAPE)) * 4
+
+
+def require_authkey(authkey: bytes = None) -> bytes:
+    authkey = authkey or SERVER_AUTHKEY
+    if not authkey or authkey == b"change-me":
+        raise RuntimeError(
+            "Set OTOLITH_INFERENCE_AUTHKEY to a long random secret shared by the "
+            "inference server and the API workers."
+        )
+    return authkey
+
+
+def segment_size(batch_size: int) -> int:
+    return batch_size * IMAGE_BYTES + batch_size * MAX_CLASSES * 4
+
+
+def segment_views(buffer, batch_size: int, capacity: int) -> tuple:
+    """
+    Returns the (images, probabilities) float32 views of a segment sized for
+    `capacity` images.
+    """
+    images = np.ndarray((batch_size, *IMAGE_SHAPE), dtype=np.float32, buffer=buffer)
+    outputs = np.ndarray((capacity, MAX_CLASSES), dtype=np.float32, buffer=buffer, offset=capacity * IMAGE_BYTES)
+    return images, outputs
+
+
+def _attach(name: str, owner_pid: int) -> SharedMemory:
+    segment = SharedMemory(name=name)
+    if owner_pid != os.getpid():
+        # The client owns the segment. Stop this process's resource tracker
+        # from unlinking it at exit (Python < 3.13 registers attached segments too).
+        resource_tracker.unregister(segment._name, "shared_memory")
+    return segment
+
+
+class InferenceServer:
+    """
+    Accepts client connections on a Unix socket and runs their batches, read
+    from shared memory, through one loaded backend.
+    """
+    def __init__(self, backend, address: str = SERVER_ADDRESS, authkey: bytes = None,
+                 concurrency: int = SERVER_CONCURRENCY):
+        self.backend = backend
+        self.address = address
+        self._authkey = require_authkey(authkey)
+        self._slots = threading.Semaphore(max(1, concurrency))
+        self._listener = None
+        # Client handler threads all count their batches.
+        self._stats_lock = threading.Lock()
+        self.batches_run = 0
+        self.images_run = 0
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        self._listener = Listener(self.address, family="AF_UNIX", authkey=self._authkey)
+        print(f"--- Inference server listening on {self.address} ---")
+        while True:
+            try:
+                connection = self._listener.accept()
+            except OSError:
+                break  # Listener closed.
+            except Exception as e:
+                print(f"Error accepting inference client: {e}")
+                continue
+            threading.Thread(target=self._serve_client, args=(connection,), daemon=True).start()
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.close()
+
+    def _serve_client(self, connection):
+        segment = None
+        try:
+            # The first message names the client's segment, its capacity and its owner.
+            name, capacity, owner_pid = connection.recv()
+            segment = _attach(name, owner_pid)
+            while True:
+                try:
+                    batch_size = connection.recv()
+                except EOFError:
+                    break
+                try:
+                    num_classes = self._run_batch(segment, batch_size, capacity)
+                except Exception as e:
+                    connection.send(("error", str(e)))
+                    continue
+                connection.send(("ok", num_classes))
+        finally:
+            connection.close()
+            if segment is not None:
+                segment.close()
+
+    def _run_batch(self, segment: SharedMemory, batch_size: int, capacity: int) -> int:
+        # The views only live in this frame, so the segment can be closed afterwards.
+        images, outputs = segment_views(segment.buf, batch_size, capacity)
+        with self._slots:
+            probabilities = np.asarray(self.backend.predict(images), dtype=np.float32)
+        outputs[:batch_size, :probabilities.shape[1]] = probabilities
+        with self._stats_lock:
+            self.batches_run += 1
+            self.images_run += batch_size
+        return probabilities.shape[1]
+
+
+class _Channel:
+    """
+    One thread's connection to the server and its shared-memory segment.
+    """
+    def __init__(self, connection, segment: SharedMemory, capacity: int):
+        self.connection = connection
+        self.segment = segment
+        self.capacity = capacity
+        self.closed = False
+
+
+class RemoteBackend:
+    """
+    The client side: a backend whose `predict` runs on the inference server.
+    Each inference thread keeps its own connection and shared-memory segment.
+    """
+    name = "remote"
+    # Only the probabilities travel back through shared memory.
+    embedding_dim = None
+
+    def __init__(self, address: str = SERVER_ADDRESS, authkey: bytes = None,
+                 batch_size: int = SEGMENT_BATCH_SIZE):
+        self.address = address
+        self._authkey = require_authkey(authkey)
+        self._batch_size = batch_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._channels = set()
+        atexit.register(self.close)
+
+    def _channel(self, batch_size: int) -> _Channel:
+        channel = getattr(self._local, "channel", None)
+        if channel is not None and (channel.closed or channel.capacity < batch_size):
+            # Too small, or closed by `close()` from another thread.
+            self._close_channel(channel)
+            channel = None
+        if channel is None:
+            capacity = max(batch_size, self._batch_size)
+            segment = SharedMemory(create=True, size=segment_size(capacity))
+            try:
+                connection = Client(self.address, family="AF_UNIX", authkey=self._authkey)
+                connection.send((segment.name, capacity, os.getpid()))
+            except Exception:
+                segment.close()
+                segment.unlink()
+                raise
+            channel = self._local.channel = _Channel(connection, segment, capacity)
+            with self._lock:
+                self._channels.add(channel)
+        return channel
+
+    def _close_channel(self, channel: _Channel):
+        # Safe to call more than once: only the first call frees the channel.
+        if getattr(self._local, "channel", None) is channel:
+            self._local.channel = None
+        with self._lock:
+            if channel.closed:
+                return
+            channel.closed = True
+            self._channels.discard(channel)
+        channel.connection.close()
+        channel.segment.close()
+        channel.segment.unlink()
+
+    def close(self):
+        """
+        Closes every thread's connection and frees its shared-memory segment.
+        """
+        with self._lock:
+            channels = list(self._channels)
+        for channel in channels:
+            self._close_channel(channel)
+
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        channel = self._channel(len(images))
+        batch, outputs = segment_views(channel.segment.buf, len(images), channel.capacity)
+        try:
+            batch[...] = images
+            channel.connection.send(len(images))
+            status, detail = channel.connection.recv()
+            result = outputs[:len(images), :detail].copy() if status == "ok" else None
+        except (EOFError, OSError):
+            # The server went away; reconnect on the next call.
+            del batch, outputs
+            self._close_channel(channel)
+            raise
+        del batch, outputs
+
+        if result is None:
+            raise RuntimeError(f"Inference server error: {detail}")
+        return result
+
+
+def main():
+    # Fail before loading the model if no key is configured.
+    require_authkey()
+    backend = backends.load_backend(SERVER_BACKEND)
+    server = InferenceServer(backend)
+    # Trace the model before accepting clients.
+    backend.predict(np.zeros((1, *IMAGE_SHAPE), dtype=np.float32))
+    try:
+        server.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
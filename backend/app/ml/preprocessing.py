@@ -0,0 +1,111 @@
+# 1. Import necessary libraries. This module deliberately avoids TensorFlow,
+#    so it is cheap to import in worker processes.
+import io
+import os
+
+import numpy as np
+from PIL import Image
+
+# 2. Preprocessing configuration.
+IMG_SIZE = (224, 224)
+# Let libjpeg decode JPEGs directly at 1/2, 1/4 or 1/8 scale (never smaller
+# than IMG_SIZE) instead of decoding full-resolution microscope images.
+JPEG_DRAFT = os.getenv("OTOLITH_JPEG_DRAFT", "true").lower() in ("1", "true", "yes")
+# Large images are first shrunk by an integer factor with a cheap box filter,
+# down to this multiple of the target size, before the bicubic resize. At 3
+# the result is indistinguishable from a full bicubic resize.
+RESIZE_REDUCING_GAP = float(os.getenv("OTOLITH_RESIZE_REDUCING_GAP", "3.0"))
+
+
+def decode(image_bytes: bytes, size: tuple = IMG_SIZE) -> Image.Image:
+    """
+    Decodes an image to RGB, using reduced-size decoding for JPEGs.
+    """
+    img = Image.open(io.BytesIO(image_bytes))
+    if JPEG_DRAFT and img.format == "JPEG":
+        img.draft("RGB", size)
+    return img.convert("RGB")
+
+
+def resize(img: Image.Image, size: tuple = IMG_SIZE) -> Image.Image:
+    return img.resize(size, Image.Resampling.BICUBIC, reducing_gap=RESIZE_REDUCING_GAP)
+
+
+def decode_and_resize(image_bytes: bytes) -> np.ndarray:
+    """
+    Decodes and resizes an image, returning its (224, 224, 3) uint8 pixels.
+    This is the expensive stage, run on the preprocessing pool.
+    """
+    return np.asarray(resize(decode(image_bytes)))
+
+
+def normalise_into(pixels: np.ndarray, out: np.ndarray) -> np.ndarray:
+    """
+    Writes `pixels / 255` into the float32 array `out`, without intermediate copies.
+    """
+    out[...] = pixels
+    out /= 255.0
+    return out
+
+
+def preprocess(image_bytes: bytes) -> np.ndarray:
+    """
+    Decodes an image and returns a normalised (224, 224, 3) float32 array.
+    """
+    out = np.empty((*IMG_SIZE, 3), dtype=np.float32)
+    return normalise_into(decode_and_resize(image_bytes), out)
+
+
+class BatchBuffer:
+    """
+    A preallocated (capacity, 224, 224, 3) float32 buffer that batches are
+    normalised into, so a forward pass never needs a freshly stacked array.
+    The returned batch is a view: it is only valid until the next `fill`.
+    """
+    def __init__(self, capacity: int):
+        self._buffer = np.empty((max(1, capacity), *IMG_SIZE, 3), dtype=np.float32)
+
+    def fill(self, pixel_arrays: list) -> np.ndarray:
+        if len(pixel_arrays) > len(self._buffer):
+            self._buffer = np.empty((len(pixel_arrays), *IMG_SIZE, 3), dtype=np.float32)
+        batch = self._buffer[:len(pixel_arrays)]
+        for pixels, out in zip(pixel_arrays, batch):
+            normalise_into(pixels, out)
+        return batch
+
+
+def preprocess_batch(images: list, executor=None, buffer: BatchBuffer = None) -> tuple:
+    """
+    Decodes a list of images (in parallel when an `executor` is given) and
+    normalises the decodable ones into a single batch.
+
+    Returns (batch, indices, errors): `indices` maps batch rows back to
+    positions in `images`; `errors` maps the other positions to their exception.
+    """
+    if executor is not None:
+        futures = [executor.submit(decode_and_resize, image) for image in images]
+        outcomes = []
+        for future in futures:
+            try:
+                outcomes.append(future.result())
+            except Exception as e:
+                outcomes.append(e)
+    else:
+        outcomes = []
+        for image in images:
+            try:
+                outcomes.append(decode_and_resize(image))
+            except Exception as e:
+                outcomes.append(e)
+
+    return collect_batch(outcomes, buffer)
+
+
+def collect_batch(outcomes: list, buffer: BatchBuffer = None) -> tuple:
+    """
+    Splits decode outcomes into a normalised batch and per-position errors.
+    """
+    indices = [i for i, outcome in enumerate(outcomes) if not isinstance(outcome, Exception)]
+    errors = {i: outcome for i, outcome in enumerate(outcomes) if isinstance(outcome, Exception)}
+    buffer = buffer or BatchBuffer(len(indices))
+    return buffer.fill([outcomes[i] for i in indices]), indices, errors
@@ -1,5 +1,5 @@
 # 1. Import necessary components from SQLAlchemy and GeoAlchemy2.
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, TIMESTAMP, Date, Numeric
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, TIMESTAMP, Date, Numeric, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from geoalchemy2 import Geometry
@@ -24,12 +24,28 @@ class Species(Base):
 # 6. Define the Sighting class, mapping to the 'sightings' table.
 class Sighting(Base):
     __tablename__ = "sightings"
+    # The indexes behind the sightings filters, created by the Alembic
+    # migration 2f6c1d9a8e47 (and by create_all on a fresh database):
+    #  - GiST on location, for bounding-box (ST_Intersects) queries,
+    #  - B-tree on (species_id, sighting_date), for species and species + date filters,
+    #  - BRIN on sighting_date and created_at: sightings are appended roughly
+    #    in date order, so a tiny block-range index answers date ranges and the
+    #    incremental statistics refresh (created_at > watermark).
+    __table_args__ = (
+        Index("ix_sightings_location", "location", postgresql_using="gist"),
+        Index("ix_sightings_species_id_sighting_date", "species_id", "sighting_date"),
+        Index("ix_sightings_sighting_date_brin", "sighting_date", postgresql_using="brin",
+              postgresql_with={"pages_per_range": 32}),
+        Index("ix_sightings_created_at_brin", "created_at", postgresql_using="brin",
+              postgresql_with={"pages_per_range": 32}),
+    )
 
     id = Column(Integer, primary_key=True)
     # 7. Define the foreign key relationship to the species table.
     species_id = Column(Integer, ForeignKey("species.id"))
     # 8. Define the PostGIS Geometry column for storing location data.
-    location = Column(Geometry(geometry_type='POINT', srid=4326), nullable=False)
+    #    Its spatial index is declared explicitly in __table_args__.
+    location = Column(Geometry(geometry_type='POINT', srid=4326, spatial_index=False), nullable=False)
     sighting_date = Column(Date, nullable=False)
     sea_surface_temp_c = Column(Numeric(5, 2))
     salinity_psu = Column(Numeric(5, 2))
@@ -44,6 +60,10 @@ class Otolith(Base):
     id = Column(Integer, primary_key=True)
     species_id = Column(Integer, ForeignKey("species.id"))
     minio_path = Column(String, unique=True, nullable=False)
+    # SHA-256 of the image bytes (the upload id); objects are stored as
+    # <folder>/<image_digest>.<extension>. Indexed for the status and
+    # similarity lookups (migration 7c3e5b2a9d14).
+    image_digest = Column(String(64), index=True)
     collection_date = Column(Date)
     age_estimation_years = Column(Integer)
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
\ No newline at end of file
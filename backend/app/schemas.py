@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, field_validator
 from typing import List, Optional
 from datetime import date
 
@@ -28,4 +28,37 @@ class PaginatedSpeciesResponse(BaseModel):
     count: int
     results: List[Species]
 
-    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
+
+# Query-string filters shared by the sightings endpoints. Every filter is
+# optional and they are combined with AND.
+class SightingFilters(BaseModel):
+    bbox: Optional[str] = Field(
+        None,
+        description="Bounding box as 'min_lon,min_lat,max_lon,max_lat' (WGS84).",
+        examples=["72.0,8.0,78.0,20.0"],
+    )
+    species_id: Optional[int] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+
+    @field_validator("bbox")
+    @classmethod
+    def check_bbox(cls, value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return value
+        parts = value.split(",")
+        if len(parts) != 4:
+            raise ValueError("bbox must have four comma-separated numbers")
+        min_lon, min_lat, max_lon, max_lat = (float(p) for p in parts)
+        if not (-180 <= min_lon <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+            raise ValueError("bbox must be ordered min_lon,min_lat,max_lon,max_lat within WGS84 bounds")
+        return value
+
+    def bounds(self) -> Optional[tuple]:
+        """
+        Returns the bounding box as a (min_lon, min_lat, max_lon, max_lat) tuple.
+        """
+        if self.bbox is None:
+            return None
+        return tuple(float(p) for p in self.bbox.split(","))
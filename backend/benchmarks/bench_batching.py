@@ -0,0 +1,81 @@
+# Benchmark: micro-batched inference vs. the one-at-a-time path.
+#
+# Run from the backend directory (the trained model must be present):
+#     python -m benchmarks.bench_batching --requests 256 --concurrency 32
+
+# 1. Import necessary libraries.
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.ml.classifier import BatchScheduler, otolith_classifier
+from benchmarks.dataset import load_images
+
+
+async def drive(handler, images: list, total: int, concurrency: int) -> tuple:
+    """
+    Fires `total` requests with at most `concurrency` in flight and returns
+    (elapsed seconds, list of per-request latencies).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await handler(images[i % len(images)])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return time.perf_counter() - start, latencies
+
+
+def report(label: str, elapsed: float, latencies: list):
+    lat_ms = np.array(latencies) * 1000.0
+    print(
+        f"{label:<14} {len(latencies) / elapsed:>9.1f} req/s   "
+        f"p50 {np.percentile(lat_ms, 50):>8.1f} ms   p99 {np.percentile(lat_ms, 99):>8.1f} ms"
+    )
+
+
+async def main(args):
+    images = load_images()
+    # 2. Load the model and run a warm-up pass so neither path pays for it.
+    otolith_classifier.predict(images[0])
+
+    # 3. Baseline: every request runs its own batch-of-one forward pass. A single
+    #    worker thread reproduces the old behaviour, where predict() ran inline on
+    #    the event loop and requests were therefore served one at a time.
+    serial = ThreadPoolExecutor(max_workers=1)
+    loop = asyncio.get_running_loop()
+
+    async def one_at_a_time(image_bytes):
+        return await loop.run_in_executor(serial, otolith_classifier.predict, image_bytes)
+
+    elapsed, latencies = await drive(one_at_a_time, images, args.requests, args.concurrency)
+    report("one-at-a-time", elapsed, latencies)
+
+    # 4. Micro-batched: concurrent requests share forward passes.
+    batcher = BatchScheduler(
+        otolith_classifier,
+        max_batch_size=args.max_batch_size,
+        window_ms=args.window_ms,
+        executor=ThreadPoolExecutor(max_workers=2),
+        preprocess_executor=ThreadPoolExecutor(max_workers=4),
+    )
+    elapsed, latencies = await drive(batcher.submit, images, args.requests, args.concurrency)
+    report("micro-batched", elapsed, latencies)
+    print(f"batcher stats: {batcher.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-batching inference benchmark")
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    asyncio.run(main(parser.parse_args()))
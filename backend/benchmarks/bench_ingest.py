@@ -0,0 +1,107 @@
+# Benchmark: sighting ingestion throughput, ORM objects (as in seed.py) vs
+# the chunked COPY path behind /api/sightings/bulk. Synthetic rows are
+# inserted and deleted again afterwards.
+#
+# Run from the backend directory with the database available:
+#     python -m benchmarks.bench_ingest --rows 200000 --orm-rows 5000
+
+# 1. Import necessary libraries.
+import argparse
+import csv
+import io
+import time
+
+import numpy as np
+from geoalchemy2.shape import from_shape
+from shapely.geometry import Point
+from sqlalchemy import func
+
+from app import models
+from app.core import density_service, ingest_service
+from app.database import SessionLocal
+
+
+def synthetic_rows(count: int, species_ids: list, seed: int = 0) -> list:
+    """
+    Survey-like rows off the west coast of India.
+    """
+    rng = np.random.default_rng(seed)
+    dates = np.datetime64("2024-01-01") + rng.integers(0, 365, count)
+    return [
+        {
+            "species_id": int(rng.choice(species_ids)),
+            "latitude": round(float(rng.uniform(8.0, 22.0)), 5),
+            "longitude": round(float(rng.uniform(68.0, 77.0)), 5),
+            "sighting_date": str(dates[i]),
+            "sea_surface_temp_c": round(float(rng.normal(28.0, 1.0)), 2),
+            "salinity_psu": round(float(rng.normal(35.0, 0.5)), 2),
+            "chlorophyll_mg_m3": round(float(rng.gamma(2.0, 0.2)), 4),
+        }
+        for i in range(count)
+    ]
+
+
+def to_csv(rows: list) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+def insert_with_orm(db, rows: list) -> float:
+    started = time.perf_counter()
+    db.add_all([
+        models.Sighting(
+            species_id=row["species_id"],
+            location=from_shape(Point(row["longitude"], row["latitude"]), srid=4326),
+            sighting_date=row["sighting_date"],
+            sea_surface_temp_c=row["sea_surface_temp_c"],
+            salinity_psu=row["salinity_psu"],
+            chlorophyll_mg_m3=row["chlorophyll_mg_m3"],
+        )
+        for row in rows
+    ])
+    db.commit()
+    return time.perf_counter() - started
+
+
+def main(args):
+    db = SessionLocal()
+    try:
+        species_ids = [row.id for row in db.query(models.Species.id)]
+        if not species_ids:
+            raise SystemExit("Seed the species table first (python seed.py).")
+        baseline_id = db.query(func.max(models.Sighting.id)).scalar() or 0
+
+        try:
+            orm_seconds = insert_with_orm(db, synthetic_rows(args.orm_rows, species_ids, seed=1))
+            print(f"ORM add_all: {args.orm_rows:>9} rows in {orm_seconds:7.2f}s "
+                  f"{args.orm_rows / orm_seconds:>10.0f} rows/s")
+
+            data = to_csv(synthetic_rows(args.rows, species_ids, seed=2))
+            started = time.perf_counter()
+            report = ingest_service.ingest_sightings(
+                db, ingest_service.iter_csv_chunks(io.BytesIO(data), args.chunk_size)
+            )
+            copy_seconds = time.perf_counter() - started
+            print(f"COPY (CSV):  {report['rows_inserted']:>9} rows in {copy_seconds:7.2f}s "
+                  f"{report['rows_inserted'] / copy_seconds:>10.0f} rows/s "
+                  f"({len(report['chunks'])} chunks of {args.chunk_size})")
+            print(f"Speed-up: {(report['rows_inserted'] / copy_seconds) / (args.orm_rows / orm_seconds):.1f}x")
+        finally:
+            if not args.keep:
+                db.query(models.Sighting).filter(models.Sighting.id > baseline_id).delete(synchronize_session=False)
+                db.commit()
+                density_service.invalidate()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark ORM vs COPY sighting ingestion.")
+    parser.add_argument("--rows", type=int, default=200000, help="Rows loaded through COPY.")
+    parser.add_argument("--orm-rows", type=int, default=5000, help="Rows loaded through the ORM.")
+    parser.add_argument("--chunk-size", type=int, default=ingest_service.INGEST_CHUNK_SIZE)
+    parser.add_argument("--keep", action="store_true", help="Keep the inserted rows.")
+    main(parser.parse_args())
@@ -0,0 +1,109 @@
+# Benchmark: per-stage cost of otolith image preprocessing (decode, resize,
+# normalise), comparing the original path with the draft-mode pipeline, and
+# batch throughput with thread and process pools.
+#
+# Run from the backend directory (TensorFlow is not needed):
+#     python -m benchmarks.bench_preprocessing --repeat 20 --workers 4
+
+# 1. Import necessary libraries.
+import argparse
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from app.ml import preprocessing
+from benchmarks.dataset import load_images
+
+
+def legacy_preprocess(image_bytes: bytes) -> np.ndarray:
+    """
+    The original path: full decode, default resize, a float32 copy (what
+    img_to_array does), a division and a batch dimension.
+    """
+    img = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+    img = img.resize((224, 224))
+    img_array = np.asarray(img, dtype=np.float32)
+    return np.expand_dims(img_array / 255.0, 0)
+
+
+def time_stage(fn, inputs: list, repeat: int) -> tuple:
+    """
+    Runs `fn` over every input `repeat` times; returns (mean ms per image, outputs).
+    """
+    outputs = None
+    start = time.perf_counter()
+    for _ in range(repeat):
+        outputs = [fn(x) for x in inputs]
+    return 1000.0 * (time.perf_counter() - start) / (repeat * len(inputs)), outputs
+
+
+def bench_stages(images: list, repeat: int):
+    print(f"Per-stage cost over {len(images)} images (mean ms per image):")
+
+    legacy_decode = lambda b: Image.open(io.BytesIO(b)).convert('RGB')
+    ms, decoded = time_stage(legacy_decode, images, repeat)
+    print(f"  original  decode    {ms:>8.3f}")
+    ms, resized = time_stage(lambda img: img.resize((224, 224)), decoded, repeat)
+    print(f"  original  resize    {ms:>8.3f}")
+    ms, _ = time_stage(lambda img: np.expand_dims(np.asarray(img, dtype=np.float32) / 255.0, 0), resized, repeat)
+    print(f"  original  normalise {ms:>8.3f}")
+
+    ms, decoded = time_stage(preprocessing.decode, images, repeat)
+    print(f"  pipeline  decode    {ms:>8.3f}")
+    ms, resized = time_stage(preprocessing.resize, decoded, repeat)
+    print(f"  pipeline  resize    {ms:>8.3f}")
+    buffer = preprocessing.BatchBuffer(len(images))
+    pixels = [np.asarray(img) for img in resized]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        buffer.fill(pixels)
+    ms = 1000.0 * (time.perf_counter() - start) / (repeat * len(images))
+    print(f"  pipeline  normalise {ms:>8.3f}")
+
+    # How far the reduced decoding moves the model input.
+    diffs = [np.abs(legacy_preprocess(b)[0] - preprocessing.preprocess(b)).mean() for b in images]
+    print(f"  mean abs input difference vs original: {np.mean(diffs):.4f} (max {np.max(diffs):.4f})")
+
+
+def bench_batches(images: list, repeat: int, workers: int):
+    print(f"Batch throughput ({len(images)} images x {repeat}):")
+    runs = [
+        ("original, serial", lambda: [legacy_preprocess(b) for b in images]),
+        ("pipeline, serial", lambda: preprocessing.preprocess_batch(images, buffer=buffer)),
+    ]
+    buffer = preprocessing.BatchBuffer(len(images))
+    threads = ThreadPoolExecutor(max_workers=workers)
+    processes = ProcessPoolExecutor(max_workers=workers)
+    # Start the worker processes before timing.
+    list(processes.map(preprocessing.decode_and_resize, images[:workers]))
+    runs += [
+        (f"pipeline, {workers} threads", lambda: preprocessing.preprocess_batch(images, threads, buffer)),
+        (f"pipeline, {workers} processes", lambda: preprocessing.preprocess_batch(images, processes, buffer)),
+    ]
+
+    for label, run in runs:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            run()
+        elapsed = time.perf_counter() - start
+        print(f"  {label:<24} {repeat * len(images) / elapsed:>9.1f} images/s")
+
+    threads.shutdown()
+    processes.shutdown()
+
+
+def main(args):
+    images = load_images(args.limit)
+    bench_stages(images, args.repeat)
+    bench_batches(images, args.repeat, args.workers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark otolith image preprocessing.")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--limit", type=int, default=None, help="Use only the first N dataset images.")
+    main(parser.parse_args())
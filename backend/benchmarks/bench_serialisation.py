@@ -0,0 +1,90 @@
+# Benchmark: JSON serialisation of /api/sightings result rows, comparing
+# FastAPI's response_model path (dicts validated through List[schemas.Sighting],
+# then encoded with the stdlib json module) with the orjson fast path.
+# Only serialisation is timed; rows are synthetic SQL-like tuples.
+#
+# Run from the backend directory (no database is needed):
+#     python -m benchmarks.bench_serialisation --rows 10000 100000 1000000
+
+# 1. Import necessary libraries.
+import argparse
+import asyncio
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+from typing import List
+
+import numpy as np
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app import schemas
+from app.core import sightings_service
+
+# The columns of sightings_service.build_sightings_query, in order.
+Row = namedtuple("Row", [
+    "id", "latitude", "longitude", "sighting_date", "sea_surface_temp_c", "salinity_psu",
+    "chlorophyll_mg_m3", "species_id", "scientific_name", "common_name", "description", "habitat",
+])
+
+
+def synthetic_rows(count: int, species_count: int = 40, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    species = [
+        (i, f"Species {i}", f"Fish {i}", "A pelagic fish of the Arabian Sea.", "Coastal waters")
+        for i in range(1, species_count + 1)
+    ]
+    species_index = rng.integers(0, species_count, count)
+    latitudes = rng.uniform(8.0, 22.0, count).round(5).tolist()
+    longitudes = rng.uniform(68.0, 77.0, count).round(5).tolist()
+    temperatures = rng.normal(28.0, 1.0, count).round(2).tolist()
+    first_day = date(2024, 1, 1)
+    days = rng.integers(0, 365, count).tolist()
+    return [
+        Row(i + 1, latitudes[i], longitudes[i], first_day + timedelta(days=days[i]), temperatures[i],
+            35.0, None, *species[species_index[i]])
+        for i in range(count)
+    ]
+
+
+def response_model_path(rows: list, field) -> bytes:
+    """
+    What FastAPI does for a list of dicts returned with response_model set.
+    """
+    content = [sightings_service.sighting_row_to_dict(row) for row in rows]
+    payload = asyncio.run(serialize_response(field=field, response_content=content, is_coroutine=True))
+    return JSONResponse(payload).body
+
+
+def fast_path(rows: list, field) -> bytes:
+    return sightings_service.encode_sightings_json(rows)
+
+
+def best_of(function, rows: list, field, repeat: int) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = function(rows, field)
+        timings.append(time.perf_counter() - started)
+    return min(timings), len(body)
+
+
+def main(args):
+    field = create_model_field(name="Response_get_sightings", type_=List[schemas.Sighting], mode="serialization")
+    print(f"{'rows':>9} {'path':<16} {'seconds':>9} {'rows/s':>12} {'MB':>8}")
+    for count in args.rows:
+        rows = synthetic_rows(count)
+        results = {}
+        for name, function in (("response_model", response_model_path), ("orjson", fast_path)):
+            seconds, size = best_of(function, rows, field, args.repeat)
+            results[name] = seconds
+            print(f"{count:>9} {name:<16} {seconds:>9.3f} {count / seconds:>12.0f} {size / 1e6:>8.1f}")
+        print(f"{'':>9} speed-up: {results['response_model'] / results['orjson']:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark /api/sightings JSON serialisation.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=3, help="Report the best of N runs.")
+    main(parser.parse_args())
@@ -0,0 +1,75 @@
+# Benchmark: cold start of the API. Each run uses a fresh interpreter and
+# measures how long importing `app.main` takes, how long the lifespan takes
+# to start, how long until /health/ready reports ready (model loaded and
+# warmed up), and the latency of the first classification request.
+#
+# Run from the backend directory with the database, MinIO and the model available:
+#     python -m benchmarks.bench_startup --runs 5
+
+# 1. Import necessary libraries.
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+def measure(args) -> dict:
+    """
+    Runs once in a fresh interpreter and returns the timings in seconds.
+    """
+    started = time.perf_counter()
+    from app.main import app
+    timings = {"import": time.perf_counter() - started}
+    timings["tensorflow_imported"] = "tensorflow" in sys.modules
+
+    from fastapi.testclient import TestClient
+    from benchmarks.dataset import load_images
+
+    started = time.perf_counter()
+    with TestClient(app) as client:
+        timings["lifespan_startup"] = time.perf_counter() - started
+
+        while client.get("/health/ready").status_code != 200:
+            if time.perf_counter() - started > args.timeout:
+                raise SystemExit("The API did not become ready in time.")
+            time.sleep(0.01)
+        timings["ready"] = time.perf_counter() - started
+
+        image = load_images(1)[0]
+        for label in ("first_classify", "second_classify"):
+            request_started = time.perf_counter()
+            response = client.post("/api/classify_otolith", files={"file": ("otolith.png", image, "image/png")})
+            response.raise_for_status()
+            timings[label] = time.perf_counter() - request_started
+    return timings
+
+
+def main(args):
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_startup", "--measure", "--timeout", str(args.timeout)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"Cold start over {args.runs} runs (median, max):")
+    print(f"  tensorflow imported by app.main: {any(run['tensorflow_imported'] for run in runs)}")
+    for key in ("import", "lifespan_startup", "ready", "first_classify", "second_classify"):
+        values = np.array([run[key] for run in runs]) * 1000.0
+        print(f"  {key:<18} {np.median(values):>9.1f} ms {values.max():>9.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark API import, startup and first-request time.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.measure:
+        print(json.dumps(measure(args)))
+    else:
+        main(args)
@@ -0,0 +1,67 @@
+# Benchmark: accuracy and CPU latency of every exported model backend against
+# the Keras (.h5) baseline.
+#
+# Export the TFLite models first (python train_model.py --export-only), then
+# run from the backend directory:
+#     python -m benchmarks.compare_backends --repeat 20
+
+# 1. Import necessary libraries.
+import argparse
+import os
+import time
+
+import numpy as np
+
+from app.ml import backends, preprocessing
+from benchmarks.dataset import load_images
+
+
+def time_calls(backend, batches: list, repeat: int) -> np.ndarray:
+    """
+    Returns the latency in ms of every call of `backend.predict` over `batches`.
+    """
+    backend.predict(batches[0])  # Warm-up (graph tracing, tensor allocation).
+    latencies = []
+    for _ in range(repeat):
+        for batch in batches:
+            start = time.perf_counter()
+            backend.predict(batch)
+            latencies.append(1000.0 * (time.perf_counter() - start))
+    return np.array(latencies)
+
+
+def main(args):
+    images = np.stack([preprocessing.preprocess(image) for image in load_images(args.limit)])
+    singles = [images[i:i + 1] for i in range(len(images))]
+    batches = [images[i:i + args.batch_size] for i in range(0, len(images), args.batch_size)]
+
+    baseline = None
+    print(f"{'backend':<12} {'size MB':>8} {'top-1 agree':>12} {'max |dp|':>9} "
+          f"{'p50 ms (1)':>11} {'p99 ms (1)':>11} {'images/s (batch)':>17}")
+    for name in backends.MODEL_ARTEFACTS:
+        path = backends.artefact_path(name)
+        if not os.path.exists(path):
+            print(f"{name:<12} (missing: {path})")
+            continue
+
+        backend = backends.load_backend(name, path)
+        probabilities = np.concatenate([backend.predict(batch) for batch in batches])
+        if baseline is None:
+            baseline = probabilities
+        agreement = np.mean(probabilities.argmax(axis=1) == baseline.argmax(axis=1))
+        max_diff = np.abs(probabilities - baseline).max()
+
+        single = time_calls(backend, singles, args.repeat)
+        batched = time_calls(backend, batches, args.repeat)
+        throughput = 1000.0 * len(images) * args.repeat / batched.sum()
+
+        print(f"{name:<12} {os.path.getsize(path) / 1e6:>8.2f} {agreement:>12.1%} {max_diff:>9.4f} "
+              f"{np.percentile(single, 50):>11.2f} {np.percentile(single, 99):>11.2f} {throughput:>17.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare model backends against the Keras baseline.")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--limit", type=int, default=None, help="Use only the first N dataset images.")
+    main(parser.parse_args())
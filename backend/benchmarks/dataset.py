@@ -0,0 +1,17 @@
+# Shared helpers for the benchmarks. Kept free of TensorFlow imports.
+import os
+
+DATASET_PATH = 'ml_model_data/otolith_dataset'
+
+
+def load_images(limit: int = None) -> list:
+    """
+    Reads the raw bytes of every image in the otolith dataset.
+    """
+    images = []
+    for species in sorted(os.listdir(DATASET_PATH)):
+        species_dir = os.path.join(DATASET_PATH, species)
+        for name in sorted(os.listdir(species_dir)):
+            with open(os.path.join(species_dir, name), "rb") as f:
+                images.append(f.read())
+    return images[:limit] if limit else images
@@ -0,0 +1,46 @@
+# Loads a CSV or Parquet file of survey sightings into the database through
+# the same COPY-based path as POST /api/sightings/bulk.
+#
+# Run from the backend directory:
+#     python ingest_sightings.py cruise_2025.parquet --chunk-size 50000
+
+# 1. Import necessary modules.
+import argparse
+import json
+
+from app.core import ingest_service
+from app.database import SessionLocal
+
+
+def main(args):
+    file_format = args.format or ingest_service.detect_format(args.path)
+    db = SessionLocal()
+    try:
+        with open(args.path, "rb") as f:
+            chunks = ingest_service.iter_chunks(f, file_format, args.chunk_size)
+            report = ingest_service.ingest_sightings(db, chunks)
+    finally:
+        db.close()
+
+    # 2. One line per chunk, then the totals.
+    for chunk in report["chunks"]:
+        print(f"chunk {chunk['chunk']:>4}: {chunk['inserted']:>8} inserted {chunk['rejected']:>6} rejected "
+              f"in {chunk['seconds']:.2f}s" + (f"  ({chunk['error']})" if chunk["error"] else ""))
+        for error in chunk["errors"]:
+            print(f"    row {error['row']}: {error['error']}")
+    if report["error"]:
+        print(f"Stopped: {report['error']}")
+    print(f"--- {report['rows_inserted']} of {report['rows_received']} rows inserted in "
+          f"{report['seconds']:.2f}s ({report['rows_per_second']:.0f} rows/s) ---")
+    if args.json:
+        print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load sightings from a CSV or Parquet file.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "parquet"], default=None,
+                        help="Defaults to the file extension.")
+    parser.add_argument("--chunk-size", type=int, default=ingest_service.INGEST_CHUNK_SIZE)
+    parser.add_argument("--json", action="store_true", help="Also print the full report as JSON.")
+    main(parser.parse_args())
@@ -0,0 +1,146 @@
+import random
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+from app.core import analysis_service
+
+
+def pandas_strongest_correlation(rows: list) -> dict:
+    """
+    The original pandas implementation of the analysis, kept here as the
+    reference the SQL-aggregate engine must agree with.
+    """
+    if not rows:
+        return {"error": "Not enough data to perform analysis."}
+    df = pd.DataFrame(rows)
+    df = pd.get_dummies(df, columns=['species_id'], prefix='species')
+    corr_matrix = df.corr()
+
+    strongest_corr = {"correlation": 0, "variable": None, "species_id": None}
+    species_cols = [col for col in df.columns if col.startswith('species_')]
+    for s_col in species_cols:
+        for env_var in analysis_service.ENV_VARS:
+            current_corr = abs(corr_matrix.loc[s_col, env_var])
+            if current_corr > abs(strongest_corr["correlation"]):
+                strongest_corr = {
+                    "correlation": corr_matrix.loc[s_col, env_var],
+                    "variable": env_var,
+                    "species_id": int(s_col.split('_')[-1])
+                }
+    return strongest_corr
+
+
+def moments_from_rows(rows: list) -> dict:
+    """
+    Mirrors the GROUP BY in `query_species_moments`: per species and variable,
+    the count, sum and sum of squares of the non-null values.
+    """
+    moments = {}
+    for row in rows:
+        species_moments = moments.setdefault(
+            row["species_id"], {v: [0, Decimal(0), Decimal(0)] for v in analysis_service.ENV_VARS}
+        )
+        for env_var in analysis_service.ENV_VARS:
+            value = row[env_var]
+            if value is not None:
+                species_moments[env_var][0] += 1
+                species_moments[env_var][1] += value
+                species_moments[env_var][2] += value * value
+    return moments
+
+
+def make_rows(seed: int, n_rows: int, n_species: int, null_rate: float) -> list:
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n_rows):
+        species_id = rng.randint(1, n_species)
+        # Give each species its own preferred temperature so there is signal.
+        sst = Decimal(f"{rng.gauss(26 + species_id * 0.7, 1.5):.2f}")
+        row = {
+            "species_id": species_id,
+            "sea_surface_temp_c": sst,
+            "salinity_psu": Decimal(f"{rng.uniform(33, 37):.2f}"),
+            "chlorophyll_mg_m3": Decimal(f"{rng.lognormvariate(-1, 0.5):.4f}"),
+        }
+        for env_var in analysis_service.ENV_VARS:
+            if rng.random() < null_rate:
+                row[env_var] = None
+        rows.append(row)
+    return rows
+
+
+@pytest.mark.parametrize("seed,n_rows,n_species,null_rate", [
+    (1, 3, 2, 0.0),
+    (2, 50, 3, 0.0),
+    (3, 500, 5, 0.1),
+    (4, 2000, 12, 0.3),
+])
+def test_sufficient_statistics_match_pandas(seed, n_rows, n_species, null_rate):
+    """
+    The aggregate-based engine must pick the same species and variable as the
+    pandas implementation and report the same coefficient.
+    """
+    rows = make_rows(seed, n_rows, n_species, null_rate)
+
+    expected = pandas_strongest_correlation(rows)
+    actual = analysis_service.strongest_correlation_from_moments(moments_from_rows(rows))
+
+    assert actual["species_id"] == expected["species_id"]
+    assert actual["variable"] == expected["variable"]
+    assert actual["correlation"] == pytest.approx(float(expected["correlation"]), abs=1e-9)
+
+
+def test_seeded_dataset_matches_pandas():
+    """
+    Checks the three sightings from seed.py, where one species only has a
+    single sighting.
+    """
+    rows = [
+        {"species_id": 1, "sea_surface_temp_c": Decimal("28.5"), "salinity_psu": Decimal("35.1"), "chlorophyll_mg_m3": Decimal("0.4")},
+        {"species_id": 2, "sea_surface_temp_c": Decimal("29.1"), "salinity_psu": Decimal("35.5"), "chlorophyll_mg_m3": Decimal("0.6")},
+        {"species_id": 1, "sea_surface_temp_c": Decimal("27.9"), "salinity_psu": Decimal("36.0"), "chlorophyll_mg_m3": Decimal("0.3")},
+    ]
+    expected = pandas_strongest_correlation(rows)
+    actual = analysis_service.strongest_correlation_from_moments(moments_from_rows(rows))
+
+    assert (actual["species_id"], actual["variable"]) == (expected["species_id"], expected["variable"])
+    assert actual["correlation"] == pytest.approx(float(expected["correlation"]), abs=1e-9)
+
+
+def test_empty_dataset_reports_error():
+    assert "error" in analysis_service.strongest_correlation_from_moments({})
+
+
+def test_store_incremental_refresh_matches_full_recompute(monkeypatch):
+    """
+    Folding new sightings into the stored statistics must give the same
+    finding as recomputing over all of them.
+    """
+    rows = make_rows(5, 600, 4, 0.1)
+    batches = iter([moments_from_rows(rows[:400]), moments_from_rows(rows[400:])])
+    monkeypatch.setattr(analysis_service, "query_species_moments", lambda db, *criteria: next(batches))
+
+    class FakeSession:
+        def query(self, *columns):
+            return self
+
+        def scalar(self):
+            return datetime.now(timezone.utc)
+
+    store = analysis_service.CorrelationStatsStore()
+    store.refresh(FakeSession())
+    incremental = store.refresh(FakeSession())
+
+    expected = analysis_service.strongest_correlation_from_moments(moments_from_rows(rows))
+    assert incremental["species_id"] == expected["species_id"]
+    assert incremental["variable"] == expected["variable"]
+    assert incremental["correlation"] == pytest.approx(expected["correlation"], abs=1e-12)
+
+    # The reader gets the stored answer plus its staleness, without a query.
+    finding = store.get(FakeSession())
+    assert finding["species_id"] == expected["species_id"]
+    assert finding["staleness_seconds"] >= 0
+    assert store.stats()["rebuilds"] == 1
@@ -1,6 +1,11 @@
 from fastapi.testclient import TestClient
 from app.main import app
+import hashlib
+import io
 import os
+import json
+import zipfile
+import time
 import pytest 
 import mimetypes 
 from app.core import llm_service
@@ -8,6 +13,15 @@ from app.core import llm_service
 # 2. Create an instance of the TestClient.
 client = TestClient(app)
 
+
+# Run the application's lifespan (table creation, MinIO bucket provisioning,
+# model warm-up, background jobs)
+# around the whole module, exactly as the server does on startup.
+@pytest.fixture(scope="module", autouse=True)
+def app_lifespan():
+    with client:
+        yield
+
 # --- Test for the Species Endpoint (Existing) ---
 def test_get_all_species():
     """
@@ -28,6 +42,26 @@ def test_get_all_species():
     assert data[0]["common_name"] == "Indian Oil Sardine"
 
 
+def test_get_all_species_conditional_and_compressed():
+    """
+    Tests that /api/species answers a current If-None-Match with 304 and
+    serves the gzip variant under its own ETag.
+    """
+    response = client.get("/api/species", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert "content-encoding" not in response.headers
+
+    response = client.get("/api/species", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get("/api/species", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"] != etag
+    assert response.json()[0]["common_name"] == "Indian Oil Sardine"
+
+
 # --- NEW Test for the Sightings Endpoint ---
 def test_get_all_sightings():
     """
@@ -58,6 +92,174 @@ def test_get_all_sightings():
     assert nested_species["id"] == 1
 
 
+def test_get_sightings_keyset_pagination():
+    """
+    Tests that /api/sightings pages by id and hands back a cursor for the next page.
+    """
+    # 1. Ask for a page smaller than the seeded data set.
+    first_page = client.get("/api/sightings", params={"limit": 2})
+    assert first_page.status_code == 200
+    assert len(first_page.json()) == 2
+
+    # 2. A full page carries the keyset cursor for the next one.
+    cursor = first_page.headers["X-Next-After-Id"]
+    second_page = client.get("/api/sightings", params={"limit": 2, "after_id": cursor})
+    assert second_page.status_code == 200
+    assert len(second_page.json()) == 1
+
+    # 3. The pages must not overlap.
+    first_ids = {s["sighting_id"] for s in first_page.json()}
+    assert second_page.json()[0]["sighting_id"] not in first_ids
+
+
+def test_get_sightings_unpaged_and_cursor_exposed_to_the_frontend():
+    """
+    Without paging parameters every row is returned; paged responses expose
+    the cursor header to the cross-origin frontend.
+    """
+    response = client.get("/api/sightings")
+    assert len(response.json()) == 3
+    assert "X-Next-After-Id" not in response.headers
+
+    response = client.get("/api/sightings", params={"limit": 1}, headers={"Origin": "http://localhost:5173"})
+    assert response.headers["X-Next-After-Id"]
+    exposed = response.headers["access-control-expose-headers"].lower()
+    assert "x-next-after-id" in exposed
+
+
+def test_get_sightings_filters():
+    """
+    Tests the bounding-box, species and date filters on /api/sightings.
+    """
+    # 1. A box around the Goa coast only contains the Goa sighting.
+    response = client.get("/api/sightings", params={"bbox": "73.0,15.0,74.5,16.0"})
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+
+    # 2. Two of the three seeded sightings belong to species 1.
+    response = client.get("/api/sightings", params={"species_id": 1})
+    assert len(response.json()) == 2
+    assert all(s["species"]["id"] == 1 for s in response.json())
+
+    # 3. Only the June sighting falls after the start date.
+    response = client.get("/api/sightings", params={"start_date": "2025-06-01"})
+    assert len(response.json()) == 1
+
+    # 4. A malformed bounding box is rejected.
+    response = client.get("/api/sightings", params={"bbox": "73.0,15.0"})
+    assert response.status_code == 422
+
+
+def test_bulk_ingest_reports_invalid_rows():
+    """
+    Tests POST /api/sightings/bulk with rows that all fail validation, so
+    the seeded data set is left untouched.
+    """
+    data = (
+        "species_id,latitude,longitude,sighting_date\n"
+        "1,95.0,73.0,2025-05-21\n"
+        "999,15.0,73.0,2025-05-21\n"
+        "1,15.0,73.0,not-a-date\n"
+    )
+    response = client.post("/api/sightings/bulk", files={"file": ("cruise.csv", data, "text/csv")})
+    assert response.status_code == 200
+    report = response.json()
+    assert report["rows_received"] == 3
+    assert report["rows_inserted"] == 0
+    assert [error["row"] for error in report["chunks"][0]["errors"]] == [1, 2, 3]
+    assert "rows_per_second" in report
+
+    # Only CSV and Parquet files are accepted.
+    response = client.post("/api/sightings/bulk", files={"file": ("cruise.xlsx", b"", "application/octet-stream")})
+    assert response.status_code == 400
+
+
+def test_export_sightings_as_arrow():
+    """
+    Tests GET /api/sightings/export returns the seeded sightings as an
+    Arrow IPC stream with dictionary-encoded species names.
+    """
+    pa = pytest.importorskip("pyarrow")
+    response = client.get("/api/sightings/export", params={"format": "arrow"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.num_rows == 3
+    assert pa.types.is_dictionary(table.schema.field("scientific_name").type)
+    assert table.schema.field("latitude").type == pa.float64()
+
+
+def test_get_sightings_streaming_formats():
+    """
+    Tests the NDJSON and GeoJSON streaming modes of /api/sightings.
+    """
+    response = client.get("/api/sightings", params={"format": "ndjson"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines() if line]
+    assert len(lines) == 3
+    assert "species" in lines[0]
+
+    response = client.get("/api/sightings", params={"format": "geojson"})
+    assert response.status_code == 200
+    collection = response.json()
+    assert collection["type"] == "FeatureCollection"
+    assert len(collection["features"]) == 3
+    assert collection["features"][0]["geometry"]["type"] == "Point"
+
+
+def test_get_sightings_density():
+    """
+    Tests the server-side grid aggregation and the vector tile endpoint.
+    """
+    # 1. Every seeded sighting is counted exactly once across the grid cells.
+    response = client.get("/api/sightings/density", params={"cell_size": 5})
+    assert response.status_code == 200
+    cells = response.json()
+    assert sum(cell["count"] for cell in cells) == 3
+    assert "mean_sea_surface_temp_c" in cells[0]
+
+    # 2. The single zoom-0 tile covers the whole world.
+    response = client.get("/api/sightings/tiles/0/0/0.mvt")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.mapbox-vector-tile"
+    assert len(response.content) > 0
+
+    # 3. Tile coordinates outside the zoom level are rejected.
+    assert client.get("/api/sightings/tiles/1/2/0.mvt").status_code == 404
+
+
+def test_storage_health():
+    """
+    Tests that /health/storage reports the state found by the startup provisioning.
+    """
+    response = client.get("/health/storage")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["reachable"] is True
+    assert data["buckets_ready"] is True
+
+
+def test_readiness_after_model_warm_up():
+    """
+    Tests that /health/ready turns ready once the background warm-up has
+    loaded the model and run it on a dummy batch.
+    """
+    response = None
+    for _ in range(600):
+        response = client.get("/health/ready")
+        if response.status_code == 200 or response.json()["model"]["state"] == "failed":
+            break
+        time.sleep(0.1)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["ready"] is True
+    assert data["database"] is True
+    assert data["model"]["state"] == "ready"
+    assert data["model"]["warmup_seconds"] is not None
+
+
 @pytest.mark.parametrize("test_image_name", ["test_image.jpg", "test_image.png"])
 def test_classify_otolith_with_different_formats(test_image_name):
     """
@@ -89,13 +291,135 @@ def test_classify_otolith_with_different_formats(test_image_name):
     assert data["predicted_species"] in known_species
 
 
+def test_classify_otolith_upload_is_stored_in_background():
+    """
+    Tests that the classification response carries an upload id and that the
+    write-behind queue eventually stores the image and records it.
+    """
+    test_image_path = os.path.join(os.path.dirname(__file__), "test_image.png")
+    with open(test_image_path, "rb") as image_file:
+        response = client.post(
+            "/api/classify_otolith",
+            files={"file": ("test_image.png", image_file, "image/png")}
+        )
+    assert response.status_code == 200
+    data = response.json()
+    # The same image may already have been uploaded by an earlier test, in
+    # which case its existing object is reused.
+    assert data["upload_status"] in ("queued", "uploading", "stored")
+
+    # Poll the status endpoint until the background worker has finished.
+    status = None
+    for _ in range(50):
+        status = client.get(f"/api/uploads/{data['upload_id']}").json()
+        if status["status"] in ("stored", "failed"):
+            break
+        time.sleep(0.1)
+    assert status["status"] == "stored"
+    assert status["otolith_id"] is not None
+
+    # Unknown ids are reported as such.
+    assert client.get("/api/uploads/does-not-exist").status_code == 404
+
+
+def test_classify_otolith_reupload_is_served_from_cache():
+    """
+    Tests that uploading the same bytes again returns the cached prediction
+    and the same content-addressed upload instead of storing a duplicate.
+    """
+    test_image_path = os.path.join(os.path.dirname(__file__), "test_image.jpg")
+    with open(test_image_path, "rb") as image_file:
+        contents = image_file.read()
+
+    first = client.post("/api/classify_otolith", files={"file": ("first.jpg", contents, "image/jpeg")}).json()
+    second = client.post("/api/classify_otolith", files={"file": ("retry.jpg", contents, "image/jpeg")}).json()
+
+    assert second["cached"] is True
+    assert second["upload_id"] == first["upload_id"] == hashlib.sha256(contents).hexdigest()
+    assert second["predicted_species"] == first["predicted_species"]
+    assert second["confidence_score"] == first["confidence_score"]
+
+
+def test_similar_otoliths():
+    """
+    Tests the GET /api/otoliths/{id}/similar endpoint: the stored otoliths
+    most similar to a classified image, ranked by cosine similarity.
+    """
+    results = []
+    for test_image_name in ("test_image.jpg", "test_image.png"):
+        with open(os.path.join(os.path.dirname(__file__), test_image_name), "rb") as image_file:
+            upload = client.post(
+                "/api/classify_otolith",
+                files={"file": (test_image_name, image_file.read(), mimetypes.guess_type(test_image_name)[0])}
+            ).json()
+        for _ in range(50):
+            status = client.get(f"/api/uploads/{upload['upload_id']}").json()
+            if status["status"] in ("stored", "failed"):
+                break
+            time.sleep(0.1)
+        results.append(status)
+    assert all(status["status"] == "stored" for status in results)
+
+    response = client.get(f"/api/otoliths/{results[0]['otolith_id']}/similar", params={"k": 5})
+    assert response.status_code == 200
+    similar = response.json()["results"]
+    assert 1 <= len(similar) <= 5
+    assert results[0]["otolith_id"] not in [item["otolith_id"] for item in similar]
+    assert [item["similarity"] for item in similar] == sorted((item["similarity"] for item in similar), reverse=True)
+
+    assert client.get("/api/otoliths/0/similar").status_code == 404
+
+
+def test_classify_otolith_batch_from_archive():
+    """
+    Tests the POST /api/classify_otolith/batch endpoint with a zip archive:
+    one NDJSON line per image, undecodable images reported without failing
+    the batch, and non-image members skipped.
+    """
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for test_image_name in ("test_image.jpg", "test_image.png"):
+            zf.write(os.path.join(os.path.dirname(__file__), test_image_name), f"otoliths/{test_image_name}")
+        zf.writestr("otoliths/corrupt.jpg", b"not an image")
+        zf.writestr("README.txt", "skipped")
+
+    response = client.post(
+        "/api/classify_otolith/batch",
+        files={"files": ("otoliths.zip", archive.getvalue(), "application/zip")}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = {line["filename"]: line for line in map(json.loads, response.text.splitlines())}
+    assert set(results) == {"otoliths/test_image.jpg", "otoliths/test_image.png", "otoliths/corrupt.jpg"}
+    assert "error" in results["otoliths/corrupt.jpg"]
+    for name in ("otoliths/test_image.jpg", "otoliths/test_image.png"):
+        assert results[name]["predicted_species"] in ["Gadus morhua", "Sardinella longiceps"]
+        assert results[name]["upload_status"] in ("queued", "uploading", "stored")
+
+
+def test_classify_otolith_batch_from_files():
+    """
+    Tests the batch endpoint with several image files in one request.
+    """
+    files = []
+    for test_image_name in ("test_image.jpg", "test_image.png"):
+        with open(os.path.join(os.path.dirname(__file__), test_image_name), "rb") as image_file:
+            files.append(("files", (test_image_name, image_file.read(), mimetypes.guess_type(test_image_name)[0])))
+
+    response = client.post("/api/classify_otolith/batch", files=files)
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["filename"] for line in lines] == ["test_image.jpg", "test_image.png"]
+    assert all("upload_id" in line for line in lines)
+
+
 def test_get_hypotheses(monkeypatch):
     """
     Tests the GET /api/hypotheses endpoint by mocking the external LLM call.
     """
-    # 1. Define a simple, fake function that mimics our real LLM service.
+    # 1. Define a simple, fake coroutine that mimics our real (async) LLM service.
     #    It takes the same arguments but returns a predictable string instantly.
-    def mock_generate_hypothesis(finding: dict) -> str:
+    async def mock_generate_hypothesis(finding: dict) -> str:
         return "This is a mock hypothesis based on the finding."
 
     # 2. This is the core of the mock. We use pytest's `monkeypatch` fixture.
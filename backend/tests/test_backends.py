@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from app.ml import backends
+
+
+class FakeInterpreter:
+    """
+    Stands in for the TFLite interpreter of an int8 model whose output is the
+    mean of each image's pixels.
+    """
+    def __init__(self, model_path: str, num_threads: int):
+        self.shape = (1, 224, 224, 3)
+        self.resizes = 0
+        self.input = None
+
+    def allocate_tensors(self):
+        pass
+
+    def get_input_details(self):
+        return [{"index": 0, "shape": np.array(self.shape), "dtype": np.int8, "quantization": (1 / 255, -128)}]
+
+    def get_output_details(self):
+        return [{"index": 1, "dtype": np.int8, "quantization": (1 / 256, -128)}]
+
+    def resize_tensor_input(self, index, shape):
+        self.shape = tuple(shape)
+        self.resizes += 1
+
+    def set_tensor(self, index, value):
+        assert value.dtype == np.int8 and value.shape == self.shape
+        self.input = value
+
+    def invoke(self):
+        pass
+
+    def get_tensor(self, index):
+        images = backends.dequantize(self.input, 1 / 255, -128)
+        means = images.reshape(len(images), -1).mean(axis=1)
+        return backends.quantize(np.stack([means, 1 - means], axis=1), 1 / 256, -128, np.int8)
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        backends.load_backend("onnx")
+
+
+def test_quantize_round_trip():
+    values = np.linspace(0, 1, 101, dtype=np.float32)
+    restored = backends.dequantize(backends.quantize(values, 1 / 255, -128, np.int8), 1 / 255, -128)
+    assert np.abs(restored - values).max() <= 0.5 / 255 + 1e-6
+    # Out-of-range values saturate instead of wrapping around.
+    assert backends.quantize(np.array([2.0, -1.0]), 1 / 255, -128, np.int8).tolist() == [127, -128]
+
+
+def test_tflite_backend_quantizes_and_resizes(monkeypatch):
+    monkeypatch.setattr(backends, "_tflite_interpreter_class", lambda: FakeInterpreter)
+    backend = backends.TFLiteBackend("model.tflite", name="tflite-int8")
+
+    images = np.full((3, 224, 224, 3), 0.25, dtype=np.float32)
+    outputs = backend.predict(images)
+    assert outputs.dtype == np.float32
+    np.testing.assert_allclose(outputs, [[0.25, 0.75]] * 3, atol=1 / 128)
+
+    # Same batch size again: the interpreter is not resized a second time.
+    backend.predict(images)
+    assert backend._local.interpreter.resizes == 1
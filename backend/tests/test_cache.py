@@ -0,0 +1,47 @@
+from sqlalchemy import Column, Integer, create_engine
+from sqlalchemy.orm import Session, declarative_base
+
+from app.core.cache import VersionProbe, invalidate_on_commit
+
+Base = declarative_base()
+
+
+class Row(Base):
+    __tablename__ = "rows"
+    id = Column(Integer, primary_key=True)
+
+
+class Other(Base):
+    __tablename__ = "others"
+    id = Column(Integer, primary_key=True)
+
+
+def test_commit_invalidates_the_caches_registered_for_the_model():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    reads = []
+    probe = VersionProbe(lambda db: reads.append(1) or db.query(Row).count(), ttl=60)
+    calls = []
+    invalidate_on_commit(Row, lambda: calls.append("first"))
+    invalidate_on_commit(Row, probe.clear)
+    invalidate_on_commit(Row, lambda: calls.append("second"))
+
+    with Session(engine) as db:
+        assert probe.get(db) == 0
+        assert probe.get(db) == 0
+        assert len(reads) == 1
+
+        db.add(Other(id=1))
+        db.commit()
+        assert calls == []
+
+        db.add(Row(id=1))
+        db.flush()
+        assert calls == []
+        db.commit()
+        assert calls == ["first", "second"]
+        assert probe.get(db) == 1
+        assert len(reads) == 2
+
+        db.commit()
+        assert calls == ["first", "second"]
@@ -0,0 +1,61 @@
+import numpy as np
+
+from app.ml import calibration
+from app.ml.classifier import OtolithClassifier
+
+
+class FixedBackend:
+    def __init__(self, probabilities):
+        self.probabilities = np.asarray(probabilities, dtype=np.float32)
+
+    def predict(self, images):
+        return self.probabilities[:len(images)]
+
+
+def overconfident_predictions(true_temperature: float = 2.5, samples: int = 4000, seed: int = 0):
+    """
+    Labels drawn from well-calibrated probabilities, reported by a model that
+    is overconfident by `true_temperature`.
+    """
+    rng = np.random.default_rng(seed)
+    logits = rng.normal(0, 1.5, size=(samples, 3))
+    calibrated = calibration.calibrate(np.exp(logits) / np.exp(logits).sum(1, keepdims=True), 1.0)
+    labels = np.array([rng.choice(3, p=p) for p in calibrated])
+    reported = calibration.calibrate(calibrated, 1 / true_temperature)
+    return reported, labels
+
+
+def test_identity_temperature_keeps_probabilities():
+    probabilities = np.array([[0.7, 0.2, 0.1], [0.05, 0.9, 0.05]])
+    np.testing.assert_allclose(calibration.calibrate(probabilities, 1.0), probabilities, rtol=1e-6)
+
+
+def test_fit_temperature_recovers_overconfidence():
+    reported, labels = overconfident_predictions(true_temperature=2.5)
+    fitted = calibration.fit_temperature(reported, labels)
+    assert abs(fitted - 2.5) < 0.25
+
+    result = calibration.fit_calibration(reported, labels)
+    assert result["nll_after"] < result["nll_before"]
+    assert result["ece_after"] < result["ece_before"]
+
+
+def test_predictions_are_ranked_and_not_softmaxed_twice(monkeypatch):
+    monkeypatch.setattr(calibration, "temperature", lambda: 1.0)
+    classifier = OtolithClassifier()
+    classifier._model = FixedBackend([[0.9, 0.1], [0.45, 0.55]])
+    classifier._class_names = ["Gadus_morhua", "Sardinella_longiceps"]
+
+    first, second = classifier.predict_batch(np.zeros((2, 224, 224, 3), dtype=np.float32))
+
+    # The model's softmax output is used as is (a second softmax would turn 0.9 into 0.69).
+    assert first["predicted_species"] == "Gadus morhua"
+    assert first["confidence_score"] == 90.0
+    assert first["top_k"] == [
+        {"species": "Gadus morhua", "probability": 0.9},
+        {"species": "Sardinella longiceps", "probability": 0.1},
+    ]
+    assert first["low_confidence"] is False
+
+    assert second["predicted_species"] == "Sardinella longiceps"
+    assert second["low_confidence"] is True
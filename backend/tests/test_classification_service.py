@@ -0,0 +1,129 @@
+import asyncio
+import io
+import json
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.core import cache, classification_service, prediction_cache
+from app.ml.classifier import BatchScheduler
+
+
+def png(shade: int) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (32, 32), (shade, shade, shade)).save(out, format="PNG")
+    return out.getvalue()
+
+
+class StubClassifier:
+    """
+    "Classifies" an image by its brightness and records every forward pass.
+    """
+    def __init__(self):
+        self.batch_sizes = []
+
+    def classify_batch(self, images):
+        self.batch_sizes.append(len(images))
+        results = [
+            {"predicted_species": f"Shade {round(float(image.mean()) * 255)}", "confidence_score": 90.0,
+             "top_k": [], "low_confidence": False}
+            for image in images
+        ]
+        return results, None
+
+
+class ForwardOnly:
+    """
+    A non-seekable stream, like a request body read front to back.
+    """
+    def __init__(self, data: bytes):
+        self._data = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._data.read(size)
+
+    def close(self):
+        self._data.close()
+
+
+@pytest.fixture
+def classifier(monkeypatch):
+    stub = StubClassifier()
+    batcher = BatchScheduler(stub, max_batch_size=4, window_ms=200, executor=ThreadPoolExecutor(1))
+    monkeypatch.setattr(classification_service, "otolith_batcher", batcher)
+    monkeypatch.setattr(prediction_cache, "prediction_cache", cache.LRUCache(maxsize=100))
+    monkeypatch.setattr(prediction_cache, "persistent_prediction_cache", None)
+
+    async def queued(filename, data, content_type, prediction, digest, cached=False):
+        return {"upload_id": digest, "upload_status": "queued"}
+
+    monkeypatch.setattr(classification_service, "queue_image_upload", queued)
+    return stub
+
+
+def classify(images) -> list:
+    async def collect():
+        return [json.loads(line) async for line in classification_service.classify_images(images)]
+    return asyncio.run(collect())
+
+
+def test_zip_archive_is_classified_member_by_member(classifier):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as out:
+        for i in range(6):
+            out.writestr(f"tray/{i}.png", png(10 * i))
+        out.writestr("tray/notes.txt", b"not an image")
+        out.writestr("tray/broken.png", b"not a png")
+    archive.seek(0)
+
+    lines = classify(classification_service.iter_archive_images(archive, "tray.zip"))
+    assert [line["filename"] for line in lines] == [f"tray/{i}.png" for i in range(6)] + ["tray/broken.png"]
+    assert [line["predicted_species"] for line in lines[:6]] == [f"Shade {10 * i}" for i in range(6)]
+    assert lines[-1]["error"].startswith("Could not decode image")
+    # Six decodable images, at most four per forward pass.
+    assert sum(classifier.batch_sizes) == 6
+    assert max(classifier.batch_sizes) <= 4
+
+
+def test_tar_stream_reports_oversized_members(classifier, monkeypatch):
+    monkeypatch.setattr(classification_service, "MAX_IMAGE_BYTES", 1024)
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode="w:gz") as out:
+        for name, content in (("small.png", png(0)), ("large.png", np.random.bytes(4096))):
+            member = tarfile.TarInfo(name)
+            member.size = len(content)
+            out.addfile(member, io.BytesIO(content))
+
+    lines = classify(classification_service.iter_archive_images(ForwardOnly(data.getvalue()), "tray.tar.gz"))
+    assert lines[0]["predicted_species"] == "Shade 0"
+    assert lines[1] == {"filename": "large.png", "error": "Could not decode image: Image exceeds 1024 bytes."}
+
+
+def test_batch_stops_at_the_image_limit(classifier, monkeypatch):
+    monkeypatch.setattr(classification_service, "BATCH_MAX_IMAGES", 3)
+    monkeypatch.setattr(classification_service, "BATCH_CLASSIFY_SIZE", 2)
+    uploads = [(f"{i}.png", io.BytesIO(png(i))) for i in range(5)]
+
+    lines = classify(classification_service.iter_uploaded_images(uploads))
+    assert [line.get("filename") for line in lines] == ["0.png", "1.png", "2.png", None]
+    assert "Batch limit of 3 images reached" in lines[-1]["error"]
+    assert sum(classifier.batch_sizes) == 3
+    # The images that were never classified are still closed.
+    assert all(fileobj.closed for _, fileobj in uploads)
+
+
+def test_tray_chunks_share_forward_passes_with_single_uploads(classifier):
+    batcher = classification_service.otolith_batcher
+    pixels = [np.full((224, 224, 3), shade, dtype=np.uint8) for shade in (10, 20)]
+
+    async def together():
+        return await asyncio.gather(batcher.submit_many(pixels), batcher.submit(png(30)))
+
+    tray, single = asyncio.run(together())
+    assert [prediction["predicted_species"] for prediction, _ in tray] == ["Shade 10", "Shade 20"]
+    assert single["predicted_species"] == "Shade 30"
+    assert classifier.batch_sizes == [3]
@@ -0,0 +1,129 @@
+import asyncio
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from app.ml import backends
+from app.ml.classifier import BatchScheduler, OtolithClassifier
+
+IMAGES = np.zeros((1, 224, 224, 3), dtype=np.float32)
+
+
+class StubBackend:
+    embedding_dim = None
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+
+    def predict(self, images):
+        if self.fail:
+            raise RuntimeError("warm-up failed")
+        return np.tile([0.7, 0.3], (len(images), 1))
+
+
+def test_ready_only_after_a_forward_pass(monkeypatch):
+    classifier = OtolithClassifier()
+    monkeypatch.setattr(backends, "load_backend", lambda: StubBackend())
+    classifier.get_model_and_classes()
+    assert classifier.status["state"] == "loaded"
+    assert not classifier.ready
+
+    assert classifier.warm_up()
+    assert classifier.ready
+
+
+def test_failed_warm_up_clears_once_requests_succeed(monkeypatch):
+    backend = StubBackend(fail=True)
+    monkeypatch.setattr(backends, "load_backend", lambda: backend)
+    classifier = OtolithClassifier()
+    assert not classifier.warm_up()
+    assert classifier.status["state"] == "failed"
+    assert not classifier.ready
+
+    backend.fail = False
+    classifier.predict_batch(IMAGES)
+    assert classifier.ready
+    assert classifier.status["error"] is None
+
+
+def test_failed_load_is_reported_and_retried(monkeypatch):
+    def broken():
+        raise OSError("model file missing")
+
+    monkeypatch.setattr(backends, "load_backend", broken)
+    classifier = OtolithClassifier()
+    assert not classifier.warm_up()
+    assert classifier.status == {**classifier.status, "state": "failed", "error": "model file missing"}
+
+    # A later lazy load succeeds and the first served batch makes it ready.
+    monkeypatch.setattr(backends, "load_backend", lambda: StubBackend())
+    classifier.predict_batch(IMAGES)
+    assert classifier.ready
+
+
+def png(shade: int) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", (32, 32), (shade, shade, shade)).save(out, format="PNG")
+    return out.getvalue()
+
+
+class StubClassifier:
+    """
+    Answers each image with its brightness and records every forward pass.
+    """
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.batch_sizes = []
+
+    def classify_batch(self, images):
+        self.batch_sizes.append(len(images))
+        if self.fail:
+            raise RuntimeError("backend unavailable")
+        shades = [round(float(image.mean()) * 255) for image in images]
+        return [{"shade": shade} for shade in shades], np.array(shades, dtype=np.float32)[:, None]
+
+
+def run_concurrently(scheduler: BatchScheduler, shades, **kwargs) -> list:
+    async def submit_all():
+        return await asyncio.gather(
+            *(scheduler.submit(png(shade), **kwargs) for shade in shades), return_exceptions=True
+        )
+    return asyncio.run(submit_all())
+
+
+def scheduler_for(classifier, **kwargs) -> BatchScheduler:
+    return BatchScheduler(classifier, executor=ThreadPoolExecutor(1),
+                          preprocess_executor=ThreadPoolExecutor(4), **kwargs)
+
+
+def test_concurrent_requests_share_one_forward_pass():
+    classifier = StubClassifier()
+    scheduler = scheduler_for(classifier, max_batch_size=16, window_ms=200)
+
+    shades = [10, 20, 30, 40, 50]
+    results = run_concurrently(scheduler, shades, with_embedding=True)
+    assert classifier.batch_sizes == [5]
+    # Every caller gets its own row back, with its own embedding.
+    assert [prediction["shade"] for prediction, _ in results] == shades
+    assert [float(embedding[0]) for _, embedding in results] == shades
+    assert scheduler.stats()["mean_batch_size"] == 5.0
+
+
+def test_max_batch_size_splits_the_batch():
+    classifier = StubClassifier()
+    scheduler = scheduler_for(classifier, max_batch_size=2, window_ms=200)
+
+    results = run_concurrently(scheduler, [1, 2, 3, 4, 5])
+    assert [prediction["shade"] for prediction in results] == [1, 2, 3, 4, 5]
+    assert sorted(classifier.batch_sizes) == [1, 2, 2]
+
+
+def test_a_failed_forward_pass_fails_every_waiting_caller():
+    classifier = StubClassifier(fail=True)
+    scheduler = scheduler_for(classifier, max_batch_size=8, window_ms=200)
+
+    results = run_concurrently(scheduler, [1, 2, 3])
+    assert classifier.batch_sizes == [3]
+    assert all(isinstance(result, RuntimeError) and str(result) == "backend unavailable" for result in results)
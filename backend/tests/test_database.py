@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.orm import sessionmaker
+
+from app import database
+
+
+def test_pool_reports_checkouts_in_use_connections_and_timeouts(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "POOL_SIZE", 1)
+    monkeypatch.setattr(database, "MAX_OVERFLOW", 0)
+    monkeypatch.setattr(database, "POOL_TIMEOUT_SECONDS", 0.05)
+    engine = database.build_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        # The only connection is in use, so the next checkout times out.
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        stats = database.pool_stats(engine)
+        assert stats["in_use"] == 1
+        assert stats["overflow"] == 0
+
+    stats = database.pool_stats(engine)
+    assert stats["in_use"] == 0
+    assert stats["checkouts"] == 1
+    assert stats["connections_opened"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["wait_seconds_max"] >= 0.05
+    # The pool's own settings are reported, not the current defaults.
+    monkeypatch.setattr(database, "MAX_OVERFLOW", 7)
+    assert database.pool_stats(engine)["max_overflow"] == 0
+    engine.dispose()
+
+
+def test_without_statement_timeout_only_changes_that_session():
+    maker = sessionmaker(info={"statement_timeout_ms": 5000})
+    db = database.without_statement_timeout(maker())
+    assert db.info["statement_timeout_ms"] == 0
+    assert maker().info["statement_timeout_ms"] == 5000
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from app.core.embedding_index import EmbeddingIndex
+from app.ml.classifier import OtolithClassifier
+
+
+def test_search_ranks_by_cosine_similarity(tmp_path):
+    index = EmbeddingIndex(str(tmp_path / "embeddings"))
+    index.add("east", [1.0, 0.0, 0.0])
+    index.add("north-east", [1.0, 1.0, 0.0])
+    index.add("north", [0.0, 5.0, 0.0])
+    index.add("up", [0.0, 0.0, 1.0])
+
+    # Adding a key twice keeps the first embedding.
+    assert index.add("east", [0.0, 0.0, 1.0]) is False
+    assert len(index) == 4
+
+    results = index.search(np.array([2.0, 0.2, 0.0]), k=3)
+    assert [key for key, _ in results] == ["east", "north-east", "north"]
+    assert results[0][1] == pytest.approx(0.995, abs=1e-3)
+
+    # The query image itself can be excluded.
+    assert [key for key, _ in index.search([1.0, 0.0, 0.0], k=2, exclude={"east"})] == ["north-east", "north"]
+
+    with pytest.raises(ValueError):
+        index.add("wrong", [1.0, 0.0])
+
+
+def test_index_grows_and_persists(tmp_path):
+    path = str(tmp_path / "embeddings")
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 16)).astype(np.float32)
+
+    writer = EmbeddingIndex(path, initial_rows=4)
+    reader = EmbeddingIndex(path)
+    for i, vector in enumerate(vectors):
+        writer.add(f"image-{i}", vector)
+    assert writer.stats()["capacity"] == 64
+
+    # Another process (or a restart) sees every row without rebuilding.
+    for index in (reader, EmbeddingIndex(path)):
+        assert len(index) == 50
+        assert "image-7" in index
+        stored = index.get("image-7")
+        assert np.allclose(stored, vectors[7] / np.linalg.norm(vectors[7]), atol=1e-3)
+        assert index.search(vectors[7], k=1)[0][0] == "image-7"
+
+
+def test_in_memory_index_needs_no_files():
+    index = EmbeddingIndex(initial_rows=2)
+    for i in range(5):
+        index.add(f"image-{i}", np.eye(8)[i])
+    assert len(index) == 5
+    assert index.stats()["path"] is None
+    assert index.search(np.eye(8)[3], k=1) == [("image-3", pytest.approx(1.0, abs=1e-3))]
+
+
+def test_stored_index_is_reset_when_the_model_changes(tmp_path):
+    path = str(tmp_path / "embeddings")
+    EmbeddingIndex(path, fingerprint="keras:1000:1").add("old", [1.0, 0.0, 0.0])
+
+    # The same model reopens the stored vectors.
+    assert "old" in EmbeddingIndex(path, fingerprint="keras:1000:1")
+
+    # A retrained model starts from an empty index of its own dimension.
+    retrained = EmbeddingIndex(path, fingerprint="keras:1000:2")
+    assert len(retrained) == 0
+    retrained.add("new", [1.0, 0.0, 0.0, 0.0])
+    assert EmbeddingIndex(path, fingerprint="keras:1000:2").dim == 4
+
+
+class EmbeddingBackend:
+    embedding_dim = 4
+
+    def predict_with_embeddings(self, images):
+        probabilities = np.tile([[0.8, 0.2]], (len(images), 1)).astype(np.float32)
+        embeddings = np.arange(len(images) * 4, dtype=np.float32).reshape(len(images), 4)
+        return probabilities, embeddings
+
+
+def test_classifier_returns_embeddings_from_the_same_pass():
+    classifier = OtolithClassifier()
+    classifier._model = EmbeddingBackend()
+    classifier._class_names = ["Gadus_morhua", "Sardinella_longiceps"]
+
+    predictions, embeddings = classifier.classify_batch(np.zeros((2, 224, 224, 3), dtype=np.float32))
+    assert [p["predicted_species"] for p in predictions] == ["Gadus morhua", "Gadus morhua"]
+    assert embeddings.shape == (2, 4)
+    assert classifier.embedding_dim == 4
+    assert np.array_equal(classifier.embed(np.zeros((1, 224, 224, 3), dtype=np.float32)), [[0, 1, 2, 3]])
@@ -0,0 +1,53 @@
+import math
+import threading
+import time
+
+import pytest
+
+from app.core.executors import InstrumentedPool
+
+
+def test_thread_pool_counts_completed_failed_active_and_queued():
+    pool = InstrumentedPool("test", 1)
+    release = threading.Event()
+    blocked = pool.submit(release.wait)
+    waiting = [pool.submit(math.sqrt, 4.0), pool.submit(math.sqrt, -1.0)]
+    time.sleep(0.05)
+
+    stats = pool.stats()
+    assert (stats["in_flight"], stats["active"], stats["queued"]) == (3, 1, 2)
+
+    release.set()
+    assert blocked.result() is True
+    assert waiting[0].result() == 2.0
+    with pytest.raises(ValueError):
+        waiting[1].result()
+    pool.shutdown()
+
+    stats = pool.stats()
+    assert (stats["in_flight"], stats["active"], stats["queued"]) == (0, 0, 0)
+    assert (stats["completed"], stats["failed"]) == (2, 1)
+    # The two calls queued behind the blocked one waited for it.
+    assert stats["max_wait_ms"] >= 40
+    assert stats["mean_wait_ms"] > 0
+
+
+def test_process_pool_reports_what_it_can_measure():
+    pool = InstrumentedPool("test", 1, kind="process")
+    futures = [pool.submit(time.sleep, 0.2), pool.submit(math.sqrt, 9.0), pool.submit(math.sqrt, -1.0)]
+
+    stats = pool.stats()
+    assert stats["in_flight"] == 3
+    # Workers do not report when they start a call, so these are unknown.
+    assert stats["active"] is None and stats["queued"] is None
+    assert stats["mean_wait_ms"] is None and stats["max_wait_ms"] is None
+
+    assert futures[1].result() == 3.0
+    with pytest.raises(ValueError):
+        futures[2].result()
+    # Shutting down waits for the done-callbacks that update the counters.
+    pool.shutdown()
+
+    stats = pool.stats()
+    assert (stats["in_flight"], stats["completed"], stats["failed"]) == (0, 2, 1)
+    assert stats["mean_run_ms"] > 0
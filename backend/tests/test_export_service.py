@@ -0,0 +1,138 @@
+import io
+from types import SimpleNamespace
+
+import pytest
+
+from app import schemas
+from app.core import export_service
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+SPECIES = [(1, "Sardinella longiceps", "Indian Oil Sardine"), (2, "Rastrelliger kanagurta", None)]
+CSV = (
+    b"1,1,15.4989,73.8278,2025-05-21,28.5,35.1,0.4\n"
+    b"2,2,12.9716,74.856,2025-06-15,,,\n"
+    b"3,1,19.076,72.8777,2025-04-10,27.9,36,0.3\n"
+)
+
+
+def read(data: bytes, file_format: str):
+    if file_format == "arrow":
+        return pa.ipc.open_stream(data).read_all()
+    return pq.read_table(io.BytesIO(data))
+
+
+@pytest.mark.parametrize("file_format", ["arrow", "parquet"])
+def test_export_has_float_columns_and_dictionary_encoded_species(file_format):
+    data = b"".join(export_service.write_export(io.BufferedReader(io.BytesIO(CSV)), SPECIES, file_format))
+    table = read(data, file_format)
+
+    assert table.schema.field("latitude").type == pa.float64()
+    assert pa.types.is_dictionary(table.schema.field("scientific_name").type)
+    assert table.column("sighting_id").to_pylist() == [1, 2, 3]
+    assert table.column("longitude").to_pylist() == [73.8278, 74.856, 72.8777]
+    assert table.column("scientific_name").to_pylist() == [
+        "Sardinella longiceps", "Rastrelliger kanagurta", "Sardinella longiceps"
+    ]
+    assert table.column("common_name").to_pylist() == ["Indian Oil Sardine", None, "Indian Oil Sardine"]
+    assert table.column("sea_surface_temp_c").to_pylist() == [28.5, None, 27.9]
+    assert str(table.column("sighting_date")[0]) == "2025-05-21"
+
+
+def test_empty_export_is_a_valid_file():
+    for file_format in ("arrow", "parquet"):
+        data = b"".join(export_service.write_export(io.BufferedReader(io.BytesIO(b"")), SPECIES, file_format))
+        assert read(data, file_format).num_rows == 0
+
+
+class CopyCursor:
+    """
+    Writes the rows a `COPY ... TO STDOUT` would, in small pieces.
+    """
+    rows = b"".join(b"%d,%d,15.5,73.8,2025-05-21,28.5,,0.4\n" % (i, 1 + i % 2) for i in range(5000))
+
+    def copy_expert(self, sql, out):
+        assert sql.startswith("COPY (SELECT sightings.id")
+        for start in range(0, len(self.rows), 4096):
+            out.write(self.rows[start:start + 4096])
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    closed = False
+
+    def __init__(self):
+        self.info = {}
+
+    def in_transaction(self):
+        return False
+
+    def execute(self, query):
+        return SimpleNamespace(all=lambda: SPECIES)
+
+    cursor = CopyCursor
+
+    def connection(self):
+        return SimpleNamespace(connection=SimpleNamespace(cursor=self.cursor))
+
+    def close(self):
+        self.closed = True
+
+
+def test_stream_export_reads_copy_output_in_batches(monkeypatch):
+    monkeypatch.setattr(export_service, "EXPORT_BLOCK_BYTES", 16 * 1024)
+    db = FakeSession()
+    query = export_service.build_export_query(schemas.SightingFilters(species_id=1))
+    chunks = list(export_service.start_export(db, query, "arrow"))
+
+    reader = pa.ipc.open_stream(b"".join(chunks))
+    batches = list(reader)
+    assert len(batches) > 1
+    table = pa.Table.from_batches(batches)
+    assert table.num_rows == 5000
+    assert table.column("scientific_name").to_pylist()[:2] == ["Sardinella longiceps", "Rastrelliger kanagurta"]
+    assert db.closed
+
+
+class FailingCopyCursor(CopyCursor):
+    """
+    Fails after writing `fail_after` bytes, as a COPY cancelled part-way would.
+    """
+    fail_after = 0
+
+    def copy_expert(self, sql, out):
+        out.write(self.rows[:self.fail_after])
+        raise RuntimeError("canceling statement due to conflict with recovery")
+
+
+def test_copy_failing_at_the_start_raises_before_streaming():
+    db = FakeSession()
+    db.cursor = FailingCopyCursor
+    query = export_service.build_export_query(schemas.SightingFilters())
+
+    with pytest.raises(RuntimeError, match="conflict with recovery"):
+        export_service.start_export(db, query, "parquet")
+    assert db.closed
+
+
+@pytest.mark.parametrize("file_format", ["arrow", "parquet"])
+def test_copy_failing_mid_stream_never_completes_the_file(monkeypatch, file_format):
+    monkeypatch.setattr(export_service, "EXPORT_BLOCK_BYTES", 16 * 1024)
+    db = FakeSession()
+    db.cursor = type("Cursor", (FailingCopyCursor,), {"fail_after": 100 * 1024})
+    stream = export_service.start_export(db, export_service.build_export_query(schemas.SightingFilters()), file_format)
+
+    sent = []
+    with pytest.raises(RuntimeError, match="conflict with recovery"):
+        for chunk in stream:
+            sent.append(chunk)
+    assert sent
+    data = b"".join(sent)
+    if file_format == "arrow":
+        assert not data.endswith(b"\xff\xff\xff\xff\x00\x00\x00\x00")
+    else:
+        assert not data.endswith(b"PAR1") and data.startswith(b"PAR1")
+    assert db.closed
@@ -0,0 +1,95 @@
+import threading
+
+import numpy as np
+import pytest
+
+from app.ml import inference_server
+
+
+class MeanBackend:
+    """
+    A stand-in model: the "probabilities" are the mean pixel value and its complement.
+    """
+    def predict(self, images: np.ndarray) -> np.ndarray:
+        if not np.isfinite(images).all():
+            raise ValueError("non-finite input")
+        means = images.reshape(len(images), -1).mean(axis=1)
+        return np.stack([means, 1 - means], axis=1)
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = inference_server.InferenceServer(MeanBackend(), address=str(tmp_path / "inference.sock"), authkey=b"test")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    for _ in range(100):
+        if server._listener is not None:
+            break
+        threading.Event().wait(0.01)
+    yield server
+    server.close()
+
+
+def test_remote_backend_round_trip(server):
+    backend = inference_server.RemoteBackend(server.address, b"test", batch_size=2)
+
+    images = np.stack([np.full((224, 224, 3), value, dtype=np.float32) for value in (0.1, 0.5)])
+    np.testing.assert_allclose(backend.predict(images), [[0.1, 0.9], [0.5, 0.5]], rtol=1e-5)
+
+    # Batches larger than the segment get a new, larger segment.
+    images = np.full((5, 224, 224, 3), 0.25, dtype=np.float32)
+    np.testing.assert_allclose(backend.predict(images), [[0.25, 0.75]] * 5, rtol=1e-5)
+    assert server.batches_run == 2
+    assert server.images_run == 7
+    backend.close()
+
+
+def test_remote_backend_reports_server_errors(server):
+    backend = inference_server.RemoteBackend(server.address, b"test")
+
+    with pytest.raises(RuntimeError, match="non-finite input"):
+        backend.predict(np.full((1, 224, 224, 3), np.nan, dtype=np.float32))
+
+    # The connection stays usable after an error.
+    np.testing.assert_allclose(backend.predict(np.zeros((1, 224, 224, 3), dtype=np.float32)), [[0.0, 1.0]])
+    backend.close()
+
+
+def test_server_and_clients_refuse_to_run_without_an_authkey(tmp_path, monkeypatch):
+    monkeypatch.setattr(inference_server, "SERVER_AUTHKEY", None)
+    with pytest.raises(RuntimeError, match="OTOLITH_INFERENCE_AUTHKEY"):
+        inference_server.InferenceServer(MeanBackend(), address=str(tmp_path / "inference.sock"))
+    with pytest.raises(RuntimeError, match="OTOLITH_INFERENCE_AUTHKEY"):
+        inference_server.RemoteBackend(str(tmp_path / "inference.sock"), b"change-me")
+
+
+def test_threads_reconnect_after_close_and_counters_add_up(server):
+    backend = inference_server.RemoteBackend(server.address, b"test", batch_size=2)
+    images = np.full((2, 224, 224, 3), 0.5, dtype=np.float32)
+    ready, closed, errors = threading.Barrier(5), threading.Event(), []
+
+    def worker():
+        try:
+            backend.predict(images)
+            ready.wait()
+            # close() below frees this thread's channel; the next call reconnects.
+            closed.wait()
+            for _ in range(5):
+                np.testing.assert_allclose(backend.predict(images), [[0.5, 0.5]] * 2, rtol=1e-5)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    ready.wait()
+    backend.close()
+    closed.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert server.batches_run == 24
+    assert server.images_run == 48
+    backend.close()
+    backend.close()
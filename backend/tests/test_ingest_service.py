@@ -0,0 +1,126 @@
+import io
+from collections import namedtuple
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import ingest_service
+
+SpeciesRow = namedtuple("SpeciesRow", ["id", "scientific_name"])
+
+CSV = b"""\xef\xbb\xbfscientific_name,species_id,latitude,longitude,sighting_date,sea_surface_temp_c,salinity_psu,chlorophyll_mg_m3
+,1,15.4989,73.8278,2025-05-21,28.5,35.1,0.4
+Rastrelliger kanagurta,,12.9716,74.8560,2025-06-15,,,
+,1,95.0,73.0,2025-05-21,,,
+,7,15.0,73.0,2025-05-21,,,
+,1,15.0,73.0,21/05/2025,,,
+,1,15.0,73.0,2025-05-21,1000,,
+"""
+
+
+class FakeCursor:
+    def __init__(self, session):
+        self.session = session
+        self.rowcount = 0
+
+    def execute(self, sql):
+        if sql.strip().startswith("INSERT"):
+            self.rowcount = len(self.session.copied[-1].splitlines())
+
+    def copy_expert(self, sql, buffer):
+        if self.session.fail:
+            raise RuntimeError("COPY failed")
+        self.session.copied.append(buffer.read())
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    """
+    Stands in for a database session: records what is COPYed and committed.
+    """
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.copied = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.info = {}
+
+    def in_transaction(self):
+        return False
+
+    def query(self, *columns):
+        return self
+
+    def all(self):
+        return [SpeciesRow(1, "Sardinella longiceps"), SpeciesRow(2, "Rastrelliger kanagurta")]
+
+    def connection(self):
+        # `db.connection().connection` is the DBAPI connection.
+        return SimpleNamespace(connection=self)
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+def test_validate_row_accepts_ids_names_and_typed_values():
+    species_by_name = {"Rastrelliger kanagurta": 2}
+    assert ingest_service.validate_row(
+        {"scientific_name": "Rastrelliger kanagurta", "latitude": "12.5", "longitude": "74",
+         "sighting_date": "2025-06-15", "salinity_psu": ""},
+        {1, 2}, species_by_name
+    ) == (2, 74.0, 12.5, "2025-06-15", None, None, None)
+    # Parquet hands over typed values.
+    assert ingest_service.validate_row(
+        {"species_id": 1, "latitude": 15.0, "longitude": 73.0, "sighting_date": date(2025, 5, 21),
+         "sea_surface_temp_c": 28.5},
+        {1, 2}, species_by_name
+    ) == (1, 73.0, 15.0, "2025-05-21", 28.5, None, None)
+
+    with pytest.raises(ValueError):
+        ingest_service.validate_row({"species_id": "1", "latitude": "nan", "longitude": "73",
+                                     "sighting_date": "2025-05-21"}, {1}, {})
+
+
+def test_ingest_reports_per_chunk_errors_and_copies_valid_rows():
+    db = FakeSession()
+    chunks = ingest_service.iter_csv_chunks(io.BytesIO(CSV), chunk_size=4)
+    report = ingest_service.ingest_sightings(db, chunks)
+
+    assert report["rows_received"] == 6
+    assert report["rows_inserted"] == 2
+    assert report["rows_rejected"] == 4
+    assert [(c["rows"], c["inserted"], c["rejected"]) for c in report["chunks"]] == [(4, 2, 2), (2, 0, 2)]
+    assert [e["row"] for c in report["chunks"] for e in c["errors"]] == [3, 4, 5, 6]
+    assert "unknown species_id 7" in report["chunks"][0]["errors"][1]["error"]
+    assert db.commits == 1
+    assert report["rows_per_second"] > 0
+
+    # Missing measurements are COPYed as empty (NULL) fields.
+    assert db.copied[0].splitlines() == [
+        "1,73.8278,15.4989,2025-05-21,28.5,35.1,0.4",
+        "2,74.856,12.9716,2025-06-15,,,",
+    ]
+
+
+def test_a_failing_chunk_is_rolled_back_and_reported():
+    db = FakeSession(fail=True)
+    report = ingest_service.ingest_sightings(db, ingest_service.iter_csv_chunks(io.BytesIO(CSV)))
+    assert report["rows_inserted"] == 0
+    assert report["chunks"][0]["error"] == "COPY failed"
+    assert db.rollbacks == 1
+
+
+def test_detect_format():
+    assert ingest_service.detect_format("cruise.PARQUET") == "parquet"
+    assert ingest_service.detect_format("cruise.csv") == "csv"
+    with pytest.raises(ingest_service.IngestError):
+        ingest_service.detect_format("cruise.xlsx")
@@ -0,0 +1,220 @@
+import asyncio
+import http.server
+import json
+import threading
+import time
+
+import pytest
+
+from app.core import llm_service
+from app.core.cache import LRUCache
+
+
+FINDING = {"species_id": 1, "species_name": "Indian Oil Sardine", "variable": "salinity_psu", "correlation": 0.7312}
+
+
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(llm_service, "hypothesis_cache", LRUCache(maxsize=16))
+    monkeypatch.setattr(llm_service, "persistent_hypothesis_cache", None)
+
+
+def test_cache_key_ignores_noise_in_the_finding():
+    """
+    Findings that produce the same prompt share a key; anything that changes
+    the prompt does not.
+    """
+    key = llm_service.hypothesis_cache_key(FINDING)
+    assert llm_service.hypothesis_cache_key({**FINDING, "correlation": 0.7349, "staleness_seconds": 3}) == key
+    assert llm_service.hypothesis_cache_key({**FINDING, "correlation": 0.7451}) != key
+    assert llm_service.hypothesis_cache_key({**FINDING, "variable": "chlorophyll_mg_m3"}) != key
+
+
+def test_concurrent_identical_requests_make_one_upstream_call(monkeypatch):
+    fresh_cache(monkeypatch)
+    calls = []
+
+    async def slow_upstream(finding):
+        calls.append(finding)
+        await asyncio.sleep(0.2)
+        return "A cached hypothesis."
+
+    monkeypatch.setattr(llm_service, "_request_hypothesis", slow_upstream)
+
+    async def burst():
+        return await asyncio.gather(
+            *(llm_service.generate_hypothesis_from_finding(dict(FINDING)) for _ in range(8))
+        )
+
+    assert asyncio.run(burst()) == ["A cached hypothesis."] * 8
+    assert len(calls) == 1
+
+    # A later request is answered from the cache.
+    assert asyncio.run(llm_service.generate_hypothesis_from_finding(dict(FINDING))) == "A cached hypothesis."
+    assert len(calls) == 1
+
+
+def test_failures_are_not_cached(monkeypatch):
+    fresh_cache(monkeypatch)
+    responses = iter([None, "Recovered hypothesis."])
+
+    async def flaky_upstream(finding):
+        return next(responses)
+
+    monkeypatch.setattr(llm_service, "_request_hypothesis", flaky_upstream)
+
+    assert asyncio.run(llm_service.generate_hypothesis_from_finding(dict(FINDING))).startswith("Failed")
+    assert asyncio.run(llm_service.generate_hypothesis_from_finding(dict(FINDING))) == "Recovered hypothesis."
+
+
+# --- Tests against a local stub of the Gemini endpoint ---
+
+class StubGemini(http.server.ThreadingHTTPServer):
+    """
+    A local HTTP server that answers like the Gemini API. `script` is a list of
+    behaviours consumed one per request: an HTTP status code to fail with,
+    ("slow", seconds) to stall before answering, "bad_shape" for a 200 with
+    an unexpected body, or "ok".
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.script = []
+        self.requests = 0
+        self.client_ports = set()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/generate"
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        self.rfile.read(int(self.headers["Content-Length"]))
+        server.requests += 1
+        server.client_ports.add(self.client_address[1])
+        behaviour = server.script.pop(0) if server.script else "ok"
+
+        if isinstance(behaviour, tuple) and behaviour[0] == "slow":
+            time.sleep(behaviour[1])
+            behaviour = "ok"
+        if behaviour == "bad_shape":
+            status, body = 200, {"candidates": [{"content": None}]}
+        elif behaviour == "ok":
+            status, body = 200, {"candidates": [{"content": {"parts": [{"text": " Stub hypothesis. "}]}}]}
+        else:
+            status, body = behaviour, {"error": "stub failure"}
+
+        payload = json.dumps(body).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass # The client gave up (e.g. after a read timeout).
+
+
+@pytest.fixture
+def stub_gemini(monkeypatch):
+    server = StubGemini()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    monkeypatch.setattr(llm_service, "GEMINI_API_URL", server.url)
+    monkeypatch.setattr(llm_service, "LLM_READ_TIMEOUT_SECONDS", 0.5)
+    monkeypatch.setattr(llm_service, "LLM_BACKOFF_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(llm_service, "LLM_MAX_RETRIES", 2)
+    monkeypatch.setattr(
+        llm_service, "circuit_breaker", llm_service.CircuitBreaker(failure_threshold=2, reset_seconds=60)
+    )
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def request_hypotheses(count: int = 1) -> list:
+    async def run():
+        try:
+            return [await llm_service._request_hypothesis(dict(FINDING)) for _ in range(count)]
+        finally:
+            await llm_service.close_client()
+    return asyncio.run(run())
+
+
+def test_calls_reuse_one_keep_alive_connection(stub_gemini):
+    assert request_hypotheses(3) == ["Stub hypothesis."] * 3
+    assert stub_gemini.requests == 3
+    assert len(stub_gemini.client_ports) == 1
+
+
+def test_retries_server_errors_then_succeeds(stub_gemini):
+    stub_gemini.script = [503, 429]
+    assert request_hypotheses() == ["Stub hypothesis."]
+    assert stub_gemini.requests == 3
+    assert llm_service.circuit_breaker.state == "closed"
+
+
+def test_slow_upstream_is_bounded_by_the_read_timeout(stub_gemini):
+    stub_gemini.script = [("slow", 2)] * 3
+    start = time.monotonic()
+    assert request_hypotheses() == [None]
+    # Three attempts of ~0.5 s each, far less than three 2 s stalls.
+    assert time.monotonic() - start < 3
+
+
+def test_circuit_opens_after_repeated_failures(stub_gemini):
+    stub_gemini.script = [500] * 6
+    assert request_hypotheses(2) == [None, None]
+    assert llm_service.circuit_breaker.state == "open"
+
+    # While open, calls fail fast without reaching the upstream.
+    requests_before = stub_gemini.requests
+    assert request_hypotheses() == [None]
+    assert stub_gemini.requests == requests_before
+
+
+def test_client_errors_are_not_retried(stub_gemini):
+    stub_gemini.script = [400]
+    assert request_hypotheses() == [None]
+    assert stub_gemini.requests == 1
+    assert llm_service.circuit_breaker.state == "closed"
+
+
+def test_unexpected_error_in_half_open_trial_reopens_the_circuit(stub_gemini, monkeypatch):
+    breaker = llm_service.CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    monkeypatch.setattr(llm_service, "circuit_breaker", breaker)
+
+    # The trial gets a 200 whose body has an unexpected shape (a TypeError).
+    stub_gemini.script = ["bad_shape"]
+    assert request_hypotheses() == [None]
+    assert breaker.state == "open"
+
+    # After the reset interval the next trial goes through and closes it.
+    assert request_hypotheses() == ["Stub hypothesis."]
+    assert breaker.state == "closed"
+
+
+def test_client_error_in_half_open_trial_neither_closes_nor_trips_the_circuit(stub_gemini, monkeypatch):
+    breaker = llm_service.CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    breaker.record_failure()
+    breaker.opened_at -= 60
+    monkeypatch.setattr(llm_service, "circuit_breaker", breaker)
+
+    stub_gemini.script = [400]
+    assert request_hypotheses() == [None]
+    assert (breaker.state, breaker.failures) == ("open", 1)
+
+    # No failure was recorded, so the next call is another trial right away,
+    # and only its 2xx reply closes the circuit.
+    assert request_hypotheses() == ["Stub hypothesis."]
+    assert breaker.state == "closed"
@@ -0,0 +1,16 @@
+from app.core import prediction_cache
+from app.ml import backends, calibration
+
+
+def test_key_covers_the_model_weights_and_calibration(monkeypatch):
+    monkeypatch.setattr(backends, "model_fingerprint", lambda: "keras:1000:2000")
+    monkeypatch.setattr(calibration, "temperature", lambda: 1.0)
+    key = prediction_cache.prediction_key("ab" * 32)
+
+    monkeypatch.setattr(backends, "model_fingerprint", lambda: "keras:1000:3000")
+    retrained = prediction_cache.prediction_key("ab" * 32)
+    monkeypatch.setattr(calibration, "temperature", lambda: 1.5)
+    recalibrated = prediction_cache.prediction_key("ab" * 32)
+
+    assert len({key, retrained, recalibrated}) == 3
+
@@ -0,0 +1,75 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from app.ml import preprocessing
+
+TESTS_DIR = os.path.dirname(__file__)
+
+
+def read_test_image(name: str) -> bytes:
+    with open(os.path.join(TESTS_DIR, name), "rb") as f:
+        return f.read()
+
+
+def reference_preprocess(image_bytes: bytes) -> np.ndarray:
+    """
+    The original preprocessing: full decode, bicubic resize, float32 / 255.
+    """
+    img = Image.open(io.BytesIO(image_bytes)).convert('RGB').resize((224, 224))
+    return np.asarray(img, dtype=np.float32) / 255.0
+
+
+def large_jpeg() -> bytes:
+    # A smooth gradient, so reduced-size decoding should barely change it.
+    x = np.linspace(0, 255, 1600, dtype=np.float32)
+    pixels = np.stack([np.add.outer(x[:1200] / 2, x / 2)] * 3, axis=-1).astype(np.uint8)
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, "JPEG", quality=95)
+    return out.getvalue()
+
+
+def test_preprocess_shape_and_range():
+    for name in ("test_image.jpg", "test_image.png"):
+        array = preprocessing.preprocess(read_test_image(name))
+        assert array.shape == (224, 224, 3)
+        assert array.dtype == np.float32
+        assert 0.0 <= array.min() and array.max() <= 1.0
+
+
+def test_preprocess_matches_reference():
+    """
+    Draft decoding and the reducing resize stay close to the original path.
+    """
+    for image_bytes in (read_test_image("test_image.jpg"), read_test_image("test_image.png"), large_jpeg()):
+        diff = np.abs(preprocessing.preprocess(image_bytes) - reference_preprocess(image_bytes))
+        assert diff.mean() < 0.01
+
+
+def test_preprocess_batch_reports_undecodable_images():
+    images = [read_test_image("test_image.png"), b"not an image", read_test_image("test_image.jpg")]
+    buffer = preprocessing.BatchBuffer(2)
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        batch, indices, errors = preprocessing.preprocess_batch(images, executor, buffer)
+
+    assert batch.shape == (2, 224, 224, 3)
+    assert indices == [0, 2]
+    assert list(errors) == [1]
+    np.testing.assert_array_equal(batch[0], preprocessing.preprocess(images[0]))
+    np.testing.assert_array_equal(batch[1], preprocessing.preprocess(images[2]))
+
+
+def test_batch_buffer_is_reused_and_grows():
+    pixels = preprocessing.decode_and_resize(read_test_image("test_image.png"))
+    buffer = preprocessing.BatchBuffer(2)
+
+    first = buffer.fill([pixels, pixels])
+    second = buffer.fill([pixels])
+    assert np.shares_memory(first, second)
+
+    grown = buffer.fill([pixels] * 3)
+    assert grown.shape == (3, 224, 224, 3)
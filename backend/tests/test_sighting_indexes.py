@@ -0,0 +1,90 @@
+import json
+from datetime import date, datetime, timezone
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from app import models, schemas
+from app.core import sightings_service
+from app.database import engine
+
+# These tests need the PostGIS database (e.g. the docker-compose `db`
+# service) migrated to head; they are skipped anywhere else.
+
+
+@pytest.fixture(scope="module")
+def connection():
+    if engine.dialect.name != "postgresql":
+        pytest.skip("EXPLAIN tests need PostgreSQL with PostGIS.")
+    try:
+        conn = engine.connect()
+    except Exception as e:
+        pytest.skip(f"PostGIS is not reachable: {e}")
+    try:
+        if conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'postgis'")).first() is None:
+            pytest.skip("The PostGIS extension is not installed.")
+        models.Base.metadata.create_all(conn, tables=[models.Species.__table__, models.Sighting.__table__])
+        conn.commit()
+        yield conn
+    finally:
+        conn.close()
+
+
+def used_indexes(conn, query) -> set:
+    """
+    Returns the names of the indexes PostgreSQL plans to use for `query`.
+    Sequential scans are discouraged (enable_seqscan = off), so the planner
+    picks an index whenever one can serve the filter, even on small tables.
+    """
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    conn.rollback()  # SET LOCAL needs a transaction of its own.
+    with conn.begin():
+        conn.execute(text("SET LOCAL enable_seqscan = off"))
+        plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+
+    names, nodes = set(), [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if "Index Name" in node:
+            names.add(node["Index Name"])
+        nodes.extend(node.get("Plans", []))
+    return names
+
+
+def filtered(**filters):
+    return sightings_service.apply_sighting_filters(
+        select(models.Sighting.id), schemas.SightingFilters(**filters)
+    )
+
+
+def test_indexes_exist(connection):
+    rows = connection.execute(
+        text("SELECT indexname FROM pg_indexes WHERE tablename = 'sightings'")
+    ).scalars()
+    expected = {index.name for index in models.Sighting.__table__.indexes}
+    missing = expected - set(rows)
+    assert not missing, f"Missing indexes {missing}; run `alembic upgrade head`."
+
+
+def test_bbox_filter_uses_the_spatial_index(connection):
+    assert "ix_sightings_location" in used_indexes(connection, filtered(bbox="72.0,8.0,78.0,20.0"))
+
+
+def test_species_filters_use_the_btree_index(connection):
+    assert "ix_sightings_species_id_sighting_date" in used_indexes(connection, filtered(species_id=1))
+    assert "ix_sightings_species_id_sighting_date" in used_indexes(
+        connection, filtered(species_id=1, start_date=date(2024, 1, 1), end_date=date(2024, 12, 31))
+    )
+
+
+def test_date_range_uses_an_index(connection):
+    indexes = used_indexes(connection, filtered(start_date=date(2024, 1, 1), end_date=date(2024, 3, 31)))
+    assert indexes & {"ix_sightings_sighting_date_brin", "ix_sightings_species_id_sighting_date"}
+
+
+def test_incremental_refresh_uses_the_created_at_brin_index(connection):
+    watermark = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    query = select(models.Sighting.species_id).where(models.Sighting.created_at > watermark)
+    assert "ix_sightings_created_at_brin" in used_indexes(connection, query)
@@ -0,0 +1,34 @@
+import json
+from collections import namedtuple
+from datetime import date
+from typing import List
+
+from pydantic import TypeAdapter
+
+from app import schemas
+from app.core import sightings_service
+
+Row = namedtuple("Row", [
+    "id", "latitude", "longitude", "sighting_date", "sea_surface_temp_c", "salinity_psu",
+    "chlorophyll_mg_m3", "species_id", "scientific_name", "common_name", "description", "habitat",
+])
+ROWS = [
+    Row(1, 15.4989, 73.8278, date(2025, 5, 21), 28.5, 35.1, 0.4,
+        1, "Sardinella longiceps", "Indian Oil Sardine", "A small pelagic fish.", "Coastal"),
+    Row(2, 12.9716, 74.856, date(2025, 6, 15), None, None, None,
+        2, "Rastrelliger kanagurta", "Indian Mackerel", None, None),
+    Row(3, 19.076, 72.8777, date(2025, 4, 10), 27.9, 36.0, 0.3,
+        1, "Sardinella longiceps", "Indian Oil Sardine", "A small pelagic fish.", "Coastal"),
+]
+
+
+def test_fast_json_matches_the_response_model():
+    """
+    The orjson path must produce exactly what response_model would.
+    """
+    adapter = TypeAdapter(List[schemas.Sighting])
+    expected = adapter.dump_python(
+        adapter.validate_python([sightings_service.sighting_row_to_dict(row) for row in ROWS]), mode="json"
+    )
+    assert json.loads(sightings_service.encode_sightings_json(ROWS)) == expected
+    assert sightings_service.encode_sightings_json([]) == b"[]"
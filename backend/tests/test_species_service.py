@@ -0,0 +1,92 @@
+import gzip
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.core import species_service
+
+SPECIES = [
+    SimpleNamespace(id=i, scientific_name=f"Species {i}", common_name=f"Fish {i}",
+                    description="A pelagic fish of the Arabian Sea. " * 3, habitat="Coastal")
+    for i in range(1, 41)
+]
+
+
+class FakeQuery:
+    def __init__(self, session, columns):
+        self.session = session
+        self.columns = columns
+
+    def one(self):
+        self.session.probes += 1
+        return (len(self.session.rows), self.session.updated_at, len(self.session.rows))
+
+    def order_by(self, *args):
+        return self
+
+    def all(self):
+        self.session.loads += 1
+        return self.session.rows
+
+
+class FakeSession:
+    """
+    Answers the version probe and the species query of the catalogue.
+    """
+    def __init__(self, rows):
+        self.rows = rows
+        self.updated_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self.probes = 0
+        self.loads = 0
+
+    def query(self, *columns):
+        return FakeQuery(self, columns)
+
+
+@pytest.fixture(autouse=True)
+def fresh_catalogue():
+    species_service.invalidate()
+    yield
+    species_service.invalidate()
+
+
+def test_catalogue_is_serialised_once_and_rebuilt_on_change():
+    db = FakeSession(list(SPECIES))
+    status, body, headers = species_service.catalogue_response(db)
+    assert status == 200
+    assert json.loads(body)[0] == {"id": 1, "scientific_name": "Species 1", "common_name": "Fish 1",
+                                   "description": SPECIES[0].description, "habitat": "Coastal"}
+    assert species_service.catalogue_response(db)[1] is body
+    assert db.loads == 1
+
+    # An edited species has a newer updated_at, which changes the version
+    # (once the probe interval has passed).
+    db.rows[0] = SimpleNamespace(**{**vars(SPECIES[0]), "common_name": "Oil Sardine"})
+    db.updated_at = datetime(2025, 2, 1, tzinfo=timezone.utc)
+    species_service._version_probe.clear()
+    status, _, changed = species_service.catalogue_response(db)
+    assert db.loads == 2
+    assert changed["ETag"] != headers["ETag"]
+
+
+def test_conditional_get_and_content_negotiation():
+    db = FakeSession(SPECIES)
+    status, body, headers = species_service.catalogue_response(db, accept_encoding="gzip, deflate")
+    assert status == 200
+    assert headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(body))[-1]["id"] == 40
+
+    status, body, _ = species_service.catalogue_response(db, if_none_match=f'W/{headers["ETag"]}')
+    assert status == 304 and body == b""
+    assert species_service.catalogue_response(db, if_none_match='"stale"')[0] == 200
+
+
+def test_choose_encoding():
+    available = {"identity", "gzip", "br"}
+    assert species_service.choose_encoding(None, available) == "identity"
+    assert species_service.choose_encoding("gzip, br", available) == "br"
+    assert species_service.choose_encoding("br;q=0.5, gzip", available) == "gzip"
+    assert species_service.choose_encoding("br;q=0, *", {"identity", "gzip"}) == "gzip"
+    assert species_service.choose_encoding("gzip;q=0", available) == "identity"
@@ -0,0 +1,45 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models
+from app.core.upload_queue import UploadJob, UploadQueue
+
+DIGEST = "ab" * 32
+
+
+def make_queue():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    models.Species.__table__.create(engine)
+    models.Otolith.__table__.create(engine)
+    return UploadQueue(sessionmaker(bind=engine))
+
+
+def test_status_falls_back_to_an_exact_digest_lookup():
+    queue = make_queue()
+    otolith_id = queue._record_otolith(UploadJob(DIGEST, f"review/{DIGEST}.png", b"", "image/png", None))
+
+    status = queue.status(DIGEST)
+    assert status["status"] == "stored"
+    assert status["otolith_id"] == otolith_id
+    # Wildcards (or anything but a hex digest) never reach the database.
+    assert queue.status("%") is None
+    assert queue.status("a" * 63 + "_") is None
+
+
+def test_concurrent_record_of_the_same_image_reuses_the_row(monkeypatch):
+    queue = make_queue()
+    job = UploadJob(DIGEST, f"review/{DIGEST}.png", b"", "image/png", None)
+    first_id = queue._record_otolith(job)
+
+    # Both uploads passed the existence check before either had committed:
+    # the insert hits the unique minio_path and the row is looked up again.
+    find, calls = UploadQueue._find_otolith, []
+
+    def racing_find(db, object_name):
+        calls.append(object_name)
+        return None if len(calls) == 1 else find(db, object_name)
+
+    monkeypatch.setattr(UploadQueue, "_find_otolith", staticmethod(racing_find))
+    assert queue._record_otolith(job) == first_id
+    assert len(calls) == 2
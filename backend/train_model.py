@@ -1,10 +1,19 @@
 # 1. Import all necessary libraries
 import tensorflow as tf
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 from tensorflow.keras.applications import MobileNetV2
 from tensorflow.keras.layers import Dense, GlobalAveragePooling2D
 from tensorflow.keras.models import Model
+import argparse
+import hashlib
+import json
+import math
 import os
+import random
+import time
+
+import numpy as np
+
+from app.ml import backends, calibration, preprocessing
 
 # --- Configuration ---
 # 2. Define the configuration variables for our training process.
@@ -13,84 +22,297 @@ IMG_SIZE = (224, 224)
 BATCH_SIZE = 8 # Small batch size for a small dataset
 NUM_EPOCHS = 15 # Number of times to train on the full dataset
 MODEL_SAVE_PATH = 'app/ml/otolith_classifier_model.h5'
+# Number of dataset images used to calibrate the int8 quantization ranges.
+CALIBRATION_SAMPLES = 100
+# The validation split is drawn per species with a fixed seed, so every run
+# (and --calibrate-only) sees exactly the same split.
+VALIDATION_SPLIT = 0.2
+SEED = 1337
+# Decoded, resized images are cached here after the first epoch.
+CACHE_DIR = '.cache/tfdata'
+SHUFFLE_BUFFER = 1024
+AUTOTUNE = tf.data.AUTOTUNE
+
+def split_dataset(dataset_path: str = DATASET_PATH, validation_split: float = VALIDATION_SPLIT,
+                  seed: int = SEED) -> tuple:
+    """
+    Lists the dataset (one sub-folder per species, in alphabetical order) and
+    splits every species' files into training and validation sets.
+
+    Returns (class_names, (train_paths, train_labels), (val_paths, val_labels)).
+    """
+    class_names = sorted(
+        name for name in os.listdir(dataset_path) if os.path.isdir(os.path.join(dataset_path, name))
+    )
+    rng = random.Random(seed)
+    train, validation = ([], []), ([], [])
+    for label, class_name in enumerate(class_names):
+        class_dir = os.path.join(dataset_path, class_name)
+        paths = sorted(os.path.join(class_dir, name) for name in os.listdir(class_dir))
+        rng.shuffle(paths)
+        n_val = min(len(paths) - 1, math.ceil(len(paths) * validation_split)) if len(paths) > 1 else 0
+        for subset, subset_paths in ((validation, paths[:n_val]), (train, paths[n_val:])):
+            subset[0].extend(subset_paths)
+            subset[1].extend([label] * len(subset_paths))
+    return class_names, train, validation
+
+def cache_path(name: str, paths: list) -> str:
+    """
+    A cache file name tied to the exact files and image size, so a changed
+    dataset never reads stale cached images.
+    """
+    fingerprint = hashlib.sha256()
+    for path in paths:
+        fingerprint.update(f"{path}:{os.path.getmtime(path)}\n".encode())
+    fingerprint.update(str(IMG_SIZE).encode())
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, f"{name}-{fingerprint.hexdigest()[:16]}")
+
+def decode_and_resize(path, label):
+    """
+    Reads and decodes one image (any format, any channel count) and resizes
+    it to IMG_SIZE, kept as uint8 so the cache stays small.
+    """
+    image = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    image = tf.image.resize(image, IMG_SIZE, method="bicubic", antialias=True)
+    return tf.cast(tf.clip_by_value(tf.round(image), 0, 255), tf.uint8), label
+
+class RandomShear(tf.keras.layers.Layer):
+    """
+    A random shear about the image centre, the same transform as
+    ImageDataGenerator(shear_range=...): the angle is drawn per image, in
+    degrees, from [-shear_range, shear_range]. Keras 2.12 has no shear layer.
+    """
+    def __init__(self, shear_range: float, seed: int = None, **kwargs):
+        super().__init__(**kwargs)
+        self.shear_range = shear_range
+        if seed is None:
+            self._rng = tf.random.Generator.from_non_deterministic_state()
+        else:
+            self._rng = tf.random.Generator.from_seed(seed)
+
+    def call(self, images, training=True):
+        if not training:
+            return images
+        batch_size = tf.shape(images)[0]
+        height, width = tf.shape(images)[1], tf.shape(images)[2]
+        shear = self._rng.uniform([batch_size], -self.shear_range, self.shear_range) * (math.pi / 180)
+
+        # Maps each output pixel (x, y) to the input pixel it is read from:
+        # x' = cos(s) (x - cx) + cx, y' = y - sin(s) (x - cx).
+        cx = tf.cast(width, tf.float32) / 2
+        cos, sin = tf.cos(shear), tf.sin(shear)
+        zeros, ones = tf.zeros_like(shear), tf.ones_like(shear)
+        transforms = tf.stack([cos, zeros, cx - cos * cx, -sin, ones, sin * cx, zeros, zeros], axis=1)
+        return tf.raw_ops.ImageProjectiveTransformV3(
+            images=images,
+            transforms=transforms,
+            output_shape=tf.stack([height, width]),
+            fill_value=0.0,
+            interpolation="BILINEAR",
+            fill_mode="NEAREST",
+        )
+
+def build_augmentation() -> tf.keras.Sequential:
+    """
+    Random augmentations applied on whole batches (training only). They match
+    the ImageDataGenerator settings used before the tf.data pipeline.
+    """
+    return tf.keras.Sequential([
+        tf.keras.layers.RandomRotation(20 / 360, fill_mode="nearest", seed=SEED),
+        tf.keras.layers.RandomTranslation(0.2, 0.2, fill_mode="nearest", seed=SEED),
+        RandomShear(0.2, seed=SEED),
+        tf.keras.layers.RandomZoom(0.2, fill_mode="nearest", seed=SEED),
+        tf.keras.layers.RandomFlip("horizontal", seed=SEED),
+    ], name="augmentation")
+
+def build_dataset(paths: list, labels: list, num_classes: int, batch_size: int, name: str,
+                  training: bool) -> tf.data.Dataset:
+    """
+    The input pipeline: parallel decode and resize, an on-disk cache of the
+    resized images, shuffling, batching, vectorised augmentation,
+    normalisation to [0, 1] and prefetching.
+    """
+    dataset = tf.data.Dataset.from_tensor_slices((paths, tf.one_hot(labels, num_classes)))
+    dataset = dataset.map(decode_and_resize, num_parallel_calls=AUTOTUNE)
+    dataset = dataset.cache(cache_path(name, paths))
+    if training:
+        dataset = dataset.shuffle(min(len(paths), SHUFFLE_BUFFER), seed=SEED, reshuffle_each_iteration=True)
+    dataset = dataset.batch(batch_size)
+
+    augmentation = build_augmentation() if training else None
+    def normalise(images, labels):
+        images = tf.cast(images, tf.float32)
+        if augmentation is not None:
+            images = augmentation(images, training=True)
+        return images / 255.0, labels
+
+    return dataset.map(normalise, num_parallel_calls=AUTOTUNE).prefetch(AUTOTUNE)
 
-def train():
+class ThroughputReport(tf.keras.callbacks.Callback):
+    """
+    Prints and records the training throughput of every epoch in images/s.
+    """
+    def __init__(self, images_per_epoch: int):
+        super().__init__()
+        self.images_per_epoch = images_per_epoch
+        self.throughput = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._started = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        images_per_second = self.images_per_epoch / (time.perf_counter() - self._started)
+        self.throughput.append(images_per_second)
+        if logs is not None:
+            logs["images_per_second"] = images_per_second
+        print(f"--- Epoch {epoch + 1}: {images_per_second:.1f} images/s ---")
+
+def train(batch_size: int = BATCH_SIZE, epochs: int = NUM_EPOCHS, mixed_precision: bool = False):
     """
     This function handles the entire model training process.
     """
     print("--- Starting Model Training ---")
+    tf.keras.utils.set_random_seed(SEED)
+    if mixed_precision:
+        # float16 compute on GPUs with tensor cores; weights stay float32.
+        tf.keras.mixed_precision.set_global_policy("mixed_float16")
 
-    # 3. Set up the data augmentation and loading pipeline.
-    #    ImageDataGenerator is a powerful tool for loading and augmenting images.
-    train_datagen = ImageDataGenerator(
-        rescale=1./255,         # Normalize pixel values to be between 0 and 1
-        validation_split=0.2,   # Use 20% of the data for validation
-        rotation_range=20,      # Randomly rotate images
-        width_shift_range=0.2,  # Randomly shift images horizontally
-        height_shift_range=0.2, # Randomly shift images vertically
-        shear_range=0.2,        # Apply shear transformations
-        zoom_range=0.2,         # Randomly zoom in on images
-        horizontal_flip=True,   # Randomly flip images horizontally
-        fill_mode='nearest'
-    )
+    # 3. Split the dataset deterministically and build the input pipelines.
+    class_names, (train_paths, train_labels), (val_paths, val_labels) = split_dataset()
+    num_classes = len(class_names)
+    print(f"Found {len(train_paths)} training and {len(val_paths)} validation images in {num_classes} classes.")
+    train_dataset = build_dataset(train_paths, train_labels, num_classes, batch_size, "train", training=True)
+    validation_dataset = build_dataset(val_paths, val_labels, num_classes, batch_size, "validation", training=False)
 
-    # 4. Create the training data generator.
-    train_generator = train_datagen.flow_from_directory(
-        DATASET_PATH,
-        target_size=IMG_SIZE,
-        batch_size=BATCH_SIZE,
-        class_mode='categorical', # For multi-class classification
-        subset='training'       # Specify this is the training set
-    )
-
-    # 5. Create the validation data generator.
-    validation_generator = train_datagen.flow_from_directory(
-        DATASET_PATH,
-        target_size=IMG_SIZE,
-        batch_size=BATCH_SIZE,
-        class_mode='categorical',
-        subset='validation'     # Specify this is the validation set
-    )
-    
-    # 6. Load the pre-trained MobileNetV2 model.
+    # 4. Load the pre-trained MobileNetV2 model.
     #    'include_top=False' means we don't include the final classification layer.
     base_model = MobileNetV2(weights='imagenet', include_top=False, input_shape=(224, 224, 3))
 
-    # 7. Freeze the layers of the base model.
+    # 5. Freeze the layers of the base model.
     #    We don't want to re-train the expert knowledge.
     for layer in base_model.layers:
         layer.trainable = False
 
-    # 8. Add our custom classification layers on top.
+    # 6. Add our custom classification layers on top.
     x = base_model.output
     x = GlobalAveragePooling2D()(x)
     x = Dense(128, activation='relu')(x)
     # The final output layer must have as many neurons as we have classes.
-    num_classes = len(train_generator.class_indices)
-    predictions = Dense(num_classes, activation='softmax')(x)
+    # It stays float32 under mixed precision so the softmax is computed stably.
+    predictions = Dense(num_classes, activation='softmax', dtype='float32')(x)
 
-    # 9. Create the final model.
+    # 7. Create the final model.
     model = Model(inputs=base_model.input, outputs=predictions)
 
-    # 10. Compile the model.
+    # 8. Compile the model.
     model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
 
     print("--- Model Compiled. Starting Training ---")
-    
-    # 11. Train the model.
+
+    # 9. Train the model, reporting the input pipeline's throughput per epoch.
+    throughput = ThroughputReport(len(train_paths))
     model.fit(
-        train_generator,
-        epochs=NUM_EPOCHS,
-        validation_data=validation_generator
+        train_dataset,
+        epochs=epochs,
+        validation_data=validation_dataset,
+        callbacks=[throughput]
     )
+    print(f"--- Training Complete ({np.mean(throughput.throughput):.1f} images/s on average). Saving Model ---")
 
-    print("--- Training Complete. Saving Model ---")
-
-    # 12. Save the trained model to the specified path.
+    # 10. Save the trained model to the specified path.
     model.save(MODEL_SAVE_PATH)
     print(f"Model saved to {MODEL_SAVE_PATH}")
 
+    # 11. Fit the confidence calibration on the validation split.
+    fit_calibration(model)
+
+    # 12. Export the TFLite artefacts the API can serve instead of the .h5.
+    export_tflite(model)
+
+def fit_calibration(model):
+    """
+    Fits the temperature used to calibrate confidence scores on the
+    validation split, preprocessed exactly as the API preprocesses uploads,
+    and writes it to calibration.json.
+    """
+    _, _, (val_paths, val_labels) = split_dataset()
+    images = []
+    for path in val_paths:
+        with open(path, "rb") as f:
+            images.append(preprocessing.preprocess(f.read()))
+
+    probabilities = model.predict(np.stack(images), verbose=0)
+    result = calibration.fit_calibration(probabilities, np.asarray(val_labels))
+    with open(calibration.CALIBRATION_PATH, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Calibration saved to {calibration.CALIBRATION_PATH}: {result}")
+
+def calibration_images(limit: int = CALIBRATION_SAMPLES) -> list:
+    """
+    Draws a fixed random sample of dataset images, preprocessed exactly as the
+    API preprocesses uploads.
+    """
+    paths = [
+        os.path.join(root, name)
+        for root, _, names in os.walk(DATASET_PATH)
+        for name in sorted(names)
+    ]
+    random.Random(0).shuffle(paths)
+    images = []
+    for path in paths[:limit]:
+        with open(path, "rb") as f:
+            images.append(preprocessing.preprocess(f.read()))
+    return images
+
+def export_tflite(model):
+    """
+    Converts the trained model to a float16 and a full-integer (int8) TFLite
+    model, next to the .h5 file.
+    """
+    # 1. Float16 weights: half the size, float32 compute on CPU.
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.target_spec.supported_types = [tf.float16]
+    fp16_path = backends.artefact_path("tflite-fp16")
+    with open(fp16_path, "wb") as f:
+        f.write(converter.convert())
+    print(f"Float16 TFLite model saved to {fp16_path}")
+
+    # 2. Int8 weights and activations, with ranges calibrated on real images.
+    samples = calibration_images()
+    def representative_dataset():
+        for image in samples:
+            yield [image[None].astype("float32")]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.int8
+    converter.inference_output_type = tf.int8
+    int8_path = backends.artefact_path("tflite-int8")
+    with open(int8_path, "wb") as f:
+        f.write(converter.convert())
+    print(f"Int8 TFLite model saved to {int8_path} (calibrated on {len(samples)} images)")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the otolith classifier and export it.")
+    parser.add_argument("--export-only", action="store_true",
+                        help="Skip training; export TFLite models from the saved .h5.")
+    parser.add_argument("--calibrate-only", action="store_true",
+                        help="Skip training; refit the confidence calibration of the saved .h5.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--epochs", type=int, default=NUM_EPOCHS)
+    parser.add_argument("--mixed-precision", action="store_true",
+                        help="Train with float16 compute (for GPUs with tensor cores).")
+    args = parser.parse_args()
+
     # Ensure the target directory for the model exists.
     os.makedirs(os.path.dirname(MODEL_SAVE_PATH), exist_ok=True)
-    train()
\ No newline at end of file
+    if args.export_only:
+        export_tflite(tf.keras.models.load_model(MODEL_SAVE_PATH))
+    elif args.calibrate_only:
+        fit_calibration(tf.keras.models.load_model(MODEL_SAVE_PATH))
+    else:
+        train(args.batch_size, args.epochs, args.mixed_precision)